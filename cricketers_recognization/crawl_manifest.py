@@ -0,0 +1,130 @@
+import argparse
+import sqlite3
+import threading
+import time
+
+MANIFEST_PATH = "players/crawl.sqlite"
+DEFAULT_TTL = 7 * 24 * 3600
+# Tries a URL gets before a failure (network error, HTTP error) is final
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    player TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    discovered_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    player TEXT NOT NULL,
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    path TEXT,
+    size INTEGER,
+    content_type TEXT,
+    reason TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    PRIMARY KEY (player, url)
+);
+"""
+
+# Statuses a URL can end in; only 'pending' and 'failed' (below MAX_ATTEMPTS) are tried again
+STATUSES = ('pending', 'downloaded', 'duplicate', 'not_image', 'too_small', 'too_large', 'failed')
+
+class CrawlManifest:
+    """
+    Persistent record of the crawl, per player (keyed by folder name): the
+    URLs discovered by each search, and for every URL its download status,
+    size, content type and failure reason. An interrupted run picks up the
+    pending URLs where it stopped, URLs that failed are retried on later
+    runs until they have been tried max_attempts times, and searches
+    younger than ttl seconds are reused instead of launching a browser.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=MANIFEST_PATH, ttl=DEFAULT_TTL, max_attempts=MAX_ATTEMPTS):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def cached_urls(self, player):
+        """The URLs of player's last search if it is younger than ttl, else None."""
+        with self._lock:
+            row = self.db.execute("SELECT discovered_at FROM searches WHERE player = ?", (player,)).fetchone()
+            if row is None or time.time() - row[0] > self.ttl:
+                return None
+            return [url for url, in self.db.execute(
+                "SELECT url FROM urls WHERE player = ? ORDER BY position", (player,))]
+
+    def record_search(self, player, query, urls):
+        """Store a search's URLs; URLs already known keep their status."""
+        with self._lock:
+            start = self.db.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM urls WHERE player = ?",
+                                    (player,)).fetchone()[0]
+            self.db.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?)", (player, query, time.time()))
+            self.db.executemany("INSERT OR IGNORE INTO urls (player, url, position) VALUES (?, ?, ?)",
+                                [(player, url, start + i) for i, url in enumerate(urls)])
+            self.db.commit()
+
+    def pending_urls(self, player):
+        """
+        player's URLs still worth trying, in discovery order: those not
+        tried yet, and those that failed fewer than max_attempts times.
+        """
+        with self._lock:
+            return [url for url, in self.db.execute(
+                "SELECT url FROM urls WHERE player = ? AND (status = 'pending' "
+                "OR (status = 'failed' AND attempts < ?)) ORDER BY position", (player, self.max_attempts))]
+
+    def mark(self, player, url, status, path=None, size=None, content_type=None, reason=None):
+        """Record the outcome of one download attempt."""
+        assert status in STATUSES, status
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO urls (player, url, position, status, path, size, content_type, reason, attempts, updated_at) "
+                "VALUES (?, ?, (SELECT COALESCE(MAX(position) + 1, 0) FROM urls WHERE player = ?), ?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (player, url) DO UPDATE SET status = excluded.status, path = excluded.path, "
+                "size = excluded.size, content_type = excluded.content_type, reason = excluded.reason, "
+                "attempts = attempts + 1, updated_at = excluded.updated_at",
+                (player, url, player, status, path, size, content_type, reason, time.time()),
+            )
+            self.db.commit()
+
+    def summary(self):
+        """{player: {status: count}} over every URL in the manifest."""
+        with self._lock:
+            summary = {}
+            for player, status, count in self.db.execute(
+                    "SELECT player, status, COUNT(*) FROM urls GROUP BY player, status ORDER BY player"):
+                summary.setdefault(player, {})[status] = count
+            return summary
+
+    def forget(self, player):
+        """Drop player's cached search so the next run searches again; URL statuses are kept."""
+        with self._lock:
+            self.db.execute("DELETE FROM searches WHERE player = ?", (player,))
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the resumable crawl manifest.")
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="URL counts per player and status")
+    forget_parser = subparsers.add_parser('forget', help="search again for these players on the next run")
+    forget_parser.add_argument('players', nargs='+', help="player folder names")
+
+    args = parser.parse_args()
+    manifest = CrawlManifest(args.manifest)
+    if args.command == 'forget':
+        for player in args.players:
+            manifest.forget(player)
+    else:
+        for player, counts in manifest.summary().items():
+            print(player, " ".join(f"{status}={counts.get(status, 0)}" for status in STATUSES))
+    manifest.close()
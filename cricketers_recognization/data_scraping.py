@@ -1,26 +1,50 @@
 import os
-import requests
-import time
 import urllib.parse
 import re
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 from urllib.parse import urlparse
-import hashlib
-import random
+from concurrent.futures import ThreadPoolExecutor
+from downloader import HostRateLimiter, ImageDownloader, get_file_extension
+from driver_pool import DriverPool
+from image_index import ImageIndex
+from crawl_manifest import CrawlManifest
+
+IMAGE_ATTRIBUTES = ['src', 'data-src', 'data-original', 'data-lazy-src']
+
+# Every attribute of every <img> in one round-trip; src is read as a
+# property so relative URLs come back absolute, like get_attribute does
+EXTRACT_IMAGE_ATTRIBUTES_JS = """
+const attrs = arguments[0];
+return Array.from(document.querySelectorAll(arguments[1]),
+                  img => attrs.map(a => a === 'src' ? img.src : img.getAttribute(a)));
+"""
+IMAGE_COUNT_JS = "return document.images.length;"
+
+def image_count_above(count):
+    """WebDriverWait condition: the page has more than count images."""
+    return lambda driver: driver.execute_script(IMAGE_COUNT_JS) > count
 
 class PlayerImageScraper:
-    def __init__(self, base_folder="players/images"):
+    def __init__(self, base_folder="players/images", download_workers=16, per_host_rate=2.0, browsers=3,
+                 search_ttl=7 * 24 * 3600, max_side=256, image_format='.jpg'):
         self.base_folder = base_folder
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        # Content and perceptual hashes of every image already scraped; only new
+        # or changed files are hashed, and duplicates are rejected before download
+        self.index = ImageIndex(base_folder)
+        print(f"Image index: {self.index.sync()}")
+        # Discovered URLs and every download outcome, so interrupted runs resume
+        # and recent searches are not repeated
+        self.manifest = CrawlManifest(os.path.join(os.path.dirname(base_folder) or ".", "crawl.sqlite"), ttl=search_ttl)
+        # Downloads run concurrently, each image host with its own politeness budget;
+        # images are validated and stored as JPEGs no larger than max_side
+        self.downloader = ImageDownloader(workers=download_workers, rate=per_host_rate, max_side=max_side,
+                                          image_format=image_format, index=self.index, manifest=self.manifest)
+        self.session = self.downloader.session
+        # Google searches are the most likely to get blocked: one every 5 seconds
+        self.search_limiter = HostRateLimiter(rate=0.2, concurrency=1)
         
         # Setup Chrome options for better scraping
         self.chrome_options = Options()
@@ -31,6 +55,8 @@ class PlayerImageScraper:
         self.chrome_options.add_argument("--window-size=1920,1080")
         self.chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         self.chrome_options.add_experimental_option('useAutomationExtension', False)
+        # Browsers are started once and reused for every player
+        self.driver_pool = DriverPool(self.chrome_options, size=browsers)
         
     def create_player_folder(self, player_name):
         """Create a folder for the player if it doesn't exist"""
@@ -44,184 +70,125 @@ class PlayerImageScraper:
         
         return folder_path, folder_name
     
-    def get_google_image_urls(self, search_query, max_images=15):
+    def get_google_image_urls(self, search_query, max_images=15, timeout=10):
         """Scrape Google Images for image URLs using the specific format"""
-        # Setup Chrome driver with webdriver-manager
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=self.chrome_options)
-        
         try:
-            # Create the Google Images search URL with the specific format
-            # Using the exact format from your example: "player_name cricketer single photos"
-            encoded_query = urllib.parse.quote(search_query)
-            search_url = f"https://www.google.com/search?q={encoded_query}&udm=2&sxsrf=AE3TifMgahni9Ls-NXtYbgR3xdDy0owB_w&biw=1470&bih=798&dpr=2"
-            
-            print(f"Searching: {search_url}")
+            with self.driver_pool.driver() as driver:
+                return self._search_image_urls(driver, search_query, max_images, timeout)
+        except Exception as e:
+            print(f"Error scraping Google Images: {e}")
+            return []
+    
+    def _search_image_urls(self, driver, search_query, max_images, timeout):
+        # Create the Google Images search URL with the specific format
+        # Using the exact format from your example: "player_name cricketer single photos"
+        encoded_query = urllib.parse.quote(search_query)
+        search_url = f"https://www.google.com/search?q={encoded_query}&udm=2&sxsrf=AE3TifMgahni9Ls-NXtYbgR3xdDy0owB_w&biw=1470&bih=798&dpr=2"
+        
+        print(f"Searching: {search_url}")
+        with self.search_limiter.slot(urlparse(search_url).netloc):
             driver.get(search_url)
+        
+        # Wait for images to load
+        WebDriverWait(driver, timeout).until(image_count_above(0))
+        
+        # Scroll to load more images, until a scroll stops adding any
+        for i in range(5):
+            count = driver.execute_script(IMAGE_COUNT_JS)
+            if count >= max_images * 3:
+                break
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            try:
+                WebDriverWait(driver, timeout / 2, poll_frequency=0.2).until(image_count_above(count))
+                continue
+            except TimeoutException:
+                pass
+            # Try to click "Show more results" if available
+            show_more = driver.find_elements(By.XPATH, "//input[@value='Show more results']")
+            if not show_more:
+                break
+            driver.execute_script("arguments[0].click();", show_more[0])
+            try:
+                WebDriverWait(driver, timeout, poll_frequency=0.2).until(image_count_above(count))
+            except TimeoutException:
+                break
+        
+        # Find all image elements
+        image_attributes = driver.execute_script(EXTRACT_IMAGE_ATTRIBUTES_JS, IMAGE_ATTRIBUTES, "img")
+        print(f"Found {len(image_attributes)} image elements")
+        
+        image_urls = []
+        for values in image_attributes:
+            # Get the image URL from different possible attributes
+            img_url = next((url for url in values if url and url.startswith('http') and 'base64' not in url), None)
             
-            # Wait for images to load
-            time.sleep(3)
-            
-            # Scroll to load more images
-            for i in range(5):
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
-                # Try to click "Show more results" if available
-                try:
-                    show_more = driver.find_element(By.XPATH, "//input[@value='Show more results']")
-                    driver.execute_script("arguments[0].click();", show_more)
-                    time.sleep(3)
-                except:
-                    pass
-            
-            # Find all image elements
-            image_elements = driver.find_elements(By.CSS_SELECTOR, "img")
-            print(f"Found {len(image_elements)} image elements")
-            
-            image_urls = []
-            for img in image_elements:
-                try:
-                    # Get the image URL from different possible attributes
-                    img_url = None
+            if img_url:
+                # Filter out unwanted URLs (like icons, logos, etc.)
+                if any(skip in img_url.lower() for skip in ['logo', 'icon', 'button', 'arrow', 'googlelogo']):
+                    continue
                     
-                    # Try different attributes where the image URL might be stored
-                    for attr in ['src', 'data-src', 'data-original', 'data-lazy-src']:
-                        url = img.get_attribute(attr)
-                        if url and url.startswith('http') and 'base64' not in url:
-                            img_url = url
-                            break
+                # Filter out very small images by checking URL patterns
+                if any(small in img_url for small in ['=s16', '=s32', '=s48', '=w16', '=w32', '=w48', '=h16', '=h32', '=h48']):
+                    continue
+                
+                # Modify URL to get larger image if possible
+                if '=s' in img_url or '=w' in img_url or '=h' in img_url:
+                    # Replace small size parameters with larger ones
+                    img_url = re.sub(r'=s\d+', '=s400', img_url)
+                    img_url = re.sub(r'=w\d+', '=w400', img_url)
+                    img_url = re.sub(r'=h\d+', '=h400', img_url)
+                
+                if img_url not in image_urls:
+                    image_urls.append(img_url)
+                    print(f"Found image URL: {img_url[:100]}...")
                     
-                    if img_url:
-                        # Filter out unwanted URLs (like icons, logos, etc.)
-                        if any(skip in img_url.lower() for skip in ['logo', 'icon', 'button', 'arrow', 'googlelogo']):
-                            continue
-                            
-                        # Filter out very small images by checking URL patterns
-                        if any(small in img_url for small in ['=s16', '=s32', '=s48', '=w16', '=w32', '=w48', '=h16', '=h32', '=h48']):
+                    if len(image_urls) >= max_images:
+                        break
+        
+        # If we didn't find enough images, try clicking on images to get high-res versions
+        if len(image_urls) < max_images:
+            print("Trying to get high-resolution images by clicking...")
+            try:
+                clickable_images = driver.find_elements(By.CSS_SELECTOR, "div[data-ri] img, a img")
+                for i, img in enumerate(clickable_images[:10]):
+                    try:
+                        count = driver.execute_script(IMAGE_COUNT_JS)
+                        driver.execute_script("arguments[0].click();", img)
+                        # Wait for the high-res image to appear
+                        try:
+                            WebDriverWait(driver, timeout / 2, poll_frequency=0.2).until(image_count_above(count))
+                        except TimeoutException:
                             continue
                         
-                        # Modify URL to get larger image if possible
-                        if '=s' in img_url or '=w' in img_url or '=h' in img_url:
-                            # Replace small size parameters with larger ones
-                            img_url = re.sub(r'=s\d+', '=s400', img_url)
-                            img_url = re.sub(r'=w\d+', '=w400', img_url)
-                            img_url = re.sub(r'=h\d+', '=h400', img_url)
-                        
-                        if img_url not in image_urls:
-                            image_urls.append(img_url)
-                            print(f"Found image URL: {img_url[:100]}...")
-                            
-                            if len(image_urls) >= max_images:
+                        # Look for the high-res image that appears
+                        high_res_srcs = driver.execute_script(EXTRACT_IMAGE_ATTRIBUTES_JS, ['src'], "img[src*='http']")
+                        for (hr_url,) in high_res_srcs:
+                            if (hr_url and hr_url.startswith('http') and 
+                                hr_url not in image_urls and 
+                                'base64' not in hr_url and
+                                len(hr_url) > 50):  # Longer URLs usually mean higher res
+                                image_urls.append(hr_url)
+                                print(f"Found high-res image: {hr_url[:100]}...")
                                 break
-                                
-                except Exception as e:
-                    continue
-            
-            # If we didn't find enough images, try clicking on images to get high-res versions
-            if len(image_urls) < max_images:
-                print("Trying to get high-resolution images by clicking...")
-                try:
-                    clickable_images = driver.find_elements(By.CSS_SELECTOR, "div[data-ri] img, a img")
-                    for i, img in enumerate(clickable_images[:10]):
-                        try:
-                            driver.execute_script("arguments[0].click();", img)
-                            time.sleep(2)
-                            
-                            # Look for the high-res image that appears
-                            high_res_imgs = driver.find_elements(By.CSS_SELECTOR, "img[src*='http']")
-                            for hr_img in high_res_imgs:
-                                hr_url = hr_img.get_attribute('src')
-                                if (hr_url and hr_url.startswith('http') and 
-                                    hr_url not in image_urls and 
-                                    'base64' not in hr_url and
-                                    len(hr_url) > 50):  # Longer URLs usually mean higher res
-                                    image_urls.append(hr_url)
-                                    print(f"Found high-res image: {hr_url[:100]}...")
-                                    break
+                        
+                        if len(image_urls) >= max_images:
+                            break
                             
-                            if len(image_urls) >= max_images:
-                                break
-                                
-                        except Exception as e:
-                            continue
-                except Exception as e:
-                    print(f"Error getting high-res images: {e}")
-            
-            print(f"Total URLs found: {len(image_urls)}")
-            return image_urls[:max_images]
-            
-        except Exception as e:
-            print(f"Error scraping Google Images: {e}")
-            return []
-        finally:
-            driver.quit()
+                    except Exception as e:
+                        continue
+            except Exception as e:
+                print(f"Error getting high-res images: {e}")
+        
+        print(f"Total URLs found: {len(image_urls)}")
+        return image_urls[:max_images]
     
     def download_image(self, url, folder_path, index):
         """Download an image from URL and save it to the specified folder"""
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Referer': 'https://www.google.com/',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8'
-            }
-            
-            response = self.session.get(url, headers=headers, timeout=15, stream=True)
-            response.raise_for_status()
-            
-            # Check if it's actually an image
-            content_type = response.headers.get('content-type', '')
-            if not any(img_type in content_type.lower() for img_type in ['image/', 'jpeg', 'jpg', 'png', 'webp']):
-                return False
-            
-            # Create filename
-            url_hash = hashlib.md5(url.encode()).hexdigest()[:10]
-            file_extension = self.get_file_extension(content_type, url)
-            filename = f"{index:02d}_{url_hash}{file_extension}"
-            
-            file_path = os.path.join(folder_path, filename)
-            
-            # Don't download if file already exists
-            if os.path.exists(file_path):
-                return True
-            
-            # Download and save
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            # Verify the file was downloaded and has reasonable content
-            if os.path.getsize(file_path) > 2048:  # At least 2KB
-                print(f"Downloaded: {filename} ({os.path.getsize(file_path)} bytes)")
-                return True
-            else:
-                # Remove small/corrupted files
-                os.remove(file_path)
-                return False
-                
-        except Exception as e:
-            print(f"Error downloading image from {url}: {e}")
-            return False
+        return self.downloader.download(url, folder_path, index) is not None
     
     def get_file_extension(self, content_type, url):
         """Get appropriate file extension"""
-        if 'jpeg' in content_type or 'jpg' in content_type:
-            return '.jpg'
-        elif 'png' in content_type:
-            return '.png'
-        elif 'webp' in content_type:
-            return '.webp'
-        elif 'gif' in content_type:
-            return '.gif'
-        else:
-            # Try to get from URL
-            if '.png' in url.lower():
-                return '.png'
-            elif '.webp' in url.lower():
-                return '.webp'
-            elif '.gif' in url.lower():
-                return '.gif'
-            else:
-                return '.jpg'
+        return get_file_extension(content_type, url)
     
     def scrape_player_images(self, player_name, max_images=10):
         """Scrape and download images for a single player"""
@@ -231,46 +198,47 @@ class PlayerImageScraper:
         folder_path, folder_name = self.create_player_folder(player_name)
         
         # Check existing images
-        existing_images = [f for f in os.listdir(folder_path) 
-                          if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif'))]
+        existing_count = self.index.count(folder_name)
         
-        if len(existing_images) >= max_images:
-            print(f"Player {player_name} already has {len(existing_images)} images. Skipping...")
+        if existing_count >= max_images:
+            print(f"Player {player_name} already has {existing_count} images. Skipping...")
             return
         
-        needed_images = max_images - len(existing_images)
+        needed_images = max_images - existing_count
         print(f"Need {needed_images} more images for {player_name}")
         
-        # Create the exact search query format you specified
-        search_query = f"{player_name} cricketer mugshot"
-        print(f"Search query: {search_query}")
-        
-        # Get image URLs from Google Images
-        image_urls = self.get_google_image_urls(search_query, max_images=max_images * 2)  # Get more than needed
+        # Reuse a recent search for this player instead of launching a browser
+        image_urls = self.manifest.cached_urls(folder_name)
+        if image_urls is None:
+            # Create the exact search query format you specified
+            search_query = f"{player_name} cricketer mugshot"
+            print(f"Search query: {search_query}")
+            
+            # Get image URLs from Google Images
+            image_urls = self.get_google_image_urls(search_query, max_images=max_images * 2)  # Get more than needed
+            
+            if not image_urls:
+                print(f"No images found for {player_name}")
+                return
+            self.manifest.record_search(folder_name, search_query, image_urls)
+            print(f"Found {len(image_urls)} image URLs for {player_name}")
+        else:
+            print(f"Using {len(image_urls)} cached image URLs for {player_name}")
         
-        if not image_urls:
-            print(f"No images found for {player_name}")
+        # URLs already downloaded or rejected in an earlier run are not tried again;
+        # failed ones are, up to crawl_manifest.MAX_ATTEMPTS tries
+        pending_urls = self.manifest.pending_urls(folder_name)
+        if not pending_urls:
+            print(f"No untried URLs left for {player_name}; run `python crawl_manifest.py forget {folder_name}` to search again")
             return
         
-        print(f"Found {len(image_urls)} image URLs for {player_name}")
-        
-        # Download images
-        downloaded_count = len(existing_images)
-        for i, url in enumerate(image_urls):
-            if downloaded_count >= max_images:
-                break
-            
-            print(f"Downloading image {downloaded_count + 1}/{max_images} for {player_name}")
-            
-            if self.download_image(url, folder_path, downloaded_count + 1):
-                downloaded_count += 1
-            
-            # Add delay between downloads to be respectful
-            time.sleep(random.uniform(1, 3))
+        # Download images concurrently; failures are replaced by the next candidate URL
+        print(f"Downloading {needed_images} images for {player_name}")
+        saved = self.downloader.download_until(pending_urls, folder_path, needed_images,
+                                               start_index=existing_count + 1)
         
-        total_images = len([f for f in os.listdir(folder_path) 
-                           if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif'))])
-        print(f"Successfully downloaded {downloaded_count - len(existing_images)} new images")
+        total_images = self.index.count(folder_name)
+        print(f"Successfully downloaded {len(saved)} new images")
         print(f"Total images for {player_name}: {total_images}")
 
 def read_players_from_file(file_path="players.txt"):
@@ -283,7 +251,7 @@ def read_players_from_file(file_path="players.txt"):
         print(f"Players file {file_path} not found!")
         return []
 
-def main():
+def main(player_workers=3):
     print("Cricket Player Image Scraper")
     print("=" * 50)
     
@@ -297,14 +265,14 @@ def main():
     print(f"Found {len(players)} players to scrape images for")
     
     # Initialize scraper
-    scraper = PlayerImageScraper()
+    scraper = PlayerImageScraper(browsers=player_workers)
     
     # Create base directory
     if not os.path.exists(scraper.base_folder):
         os.makedirs(scraper.base_folder)
     
-    # Scrape images for each player
-    for i, player in enumerate(players, 1):
+    def scrape(numbered_player):
+        i, player = numbered_player
         print(f"\n{'='*60}")
         print(f"Progress: {i}/{len(players)} - {player}")
         print(f"{'='*60}")
@@ -313,12 +281,15 @@ def main():
             scraper.scrape_player_images(player, max_images=20)
         except Exception as e:
             print(f"Error processing {player}: {e}")
-        
-        # Add delay between players to avoid being blocked
-        if i < len(players):
-            wait_time = random.uniform(5, 10)
-            print(f"Waiting {wait_time:.1f} seconds before next player...")
-            time.sleep(wait_time)
+    
+    # Scrape several players at once; the search and per-host rate limits
+    # replace the fixed waits between players
+    with ThreadPoolExecutor(max_workers=player_workers) as executor:
+        list(executor.map(scrape, enumerate(players, 1)))
+    scraper.downloader.close()
+    scraper.driver_pool.close()
+    scraper.manifest.close()
+    print(f"Download stats: {scraper.downloader.stats}")
     
     print("\n" + "="*60)
     print("Image scraping completed!")
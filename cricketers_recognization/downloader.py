@@ -0,0 +1,386 @@
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from image_index import image_hashes
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IMAGE_TYPES = ['image/', 'jpeg', 'jpg', 'png', 'webp']
+
+def get_file_extension(content_type, url):
+    """Get appropriate file extension"""
+    if 'jpeg' in content_type or 'jpg' in content_type:
+        return '.jpg'
+    elif 'png' in content_type:
+        return '.png'
+    elif 'webp' in content_type:
+        return '.webp'
+    elif 'gif' in content_type:
+        return '.gif'
+    else:
+        # Try to get from URL
+        if '.png' in url.lower():
+            return '.png'
+        elif '.webp' in url.lower():
+            return '.webp'
+        elif '.gif' in url.lower():
+            return '.gif'
+        else:
+            return '.jpg'
+
+class HostRateLimiter:
+    """
+    Per-host politeness budget: for each host, at most `rate` requests are
+    started per second and at most `concurrency` are in flight. Requests to
+    different hosts never wait on each other. overrides maps a host to its
+    own (rate, concurrency).
+    """
+
+    def __init__(self, rate=2.0, concurrency=4, overrides=None):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.overrides = overrides or {}
+        self._lock = threading.Lock()
+        self._next_start = {}
+        self._semaphores = {}
+
+    def _budget(self, host):
+        return self.overrides.get(host, (self.rate, self.concurrency))
+
+    @contextmanager
+    def slot(self, host):
+        """Hold one of host's request slots, waiting for its turn first."""
+        rate, concurrency = self._budget(host)
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(concurrency))
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(self._next_start.get(host, now), now)
+                self._next_start[host] = start + (1.0 / rate if rate else 0.0)
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+    def penalize(self, host, seconds):
+        """Push host's next request at least seconds into the future, e.g. after a 429."""
+        with self._lock:
+            self._next_start[host] = max(self._next_start.get(host, 0.0), time.monotonic() + seconds)
+
+class ImageDownloader:
+    """
+    Download images on a bounded thread pool through one pooled session.
+    Each host gets its own rate limit instead of global sleeps, and
+    connection errors, timeouts and 429/5xx responses are retried with
+    exponential backoff (honouring Retry-After).
+    Each body is buffered in memory up to max_bytes and must decode as an
+    image of at least min_side pixels before anything is written. With
+    max_side and/or image_format ('.jpg', '.png' or '.webp') set, images are
+    shrunk and re-encoded on the way in, so training never pays to decode
+    multi-megabyte originals. Files go to a .part file and are renamed.
+    With an ImageIndex, each image is hashed in memory first and exact or
+    near duplicates of indexed images are rejected before touching disk.
+    With a CrawlManifest, every outcome is recorded for resuming.
+    """
+
+    def __init__(self, workers=16, rate=2.0, per_host_concurrency=4, retries=3, backoff=0.5, timeout=15,
+                 min_bytes=2048, max_bytes=20 * 1024 * 1024, min_side=64, max_side=None, image_format=None,
+                 quality=90, limiter=None, session=None, index=None, manifest=None):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.min_side = min_side
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+        self.index = index
+        self.manifest = manifest
+        self.limiter = limiter or HostRateLimiter(rate, per_host_concurrency)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Referer': 'https://www.google.com/',
+            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+        })
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._stats_lock = threading.Lock()
+        self.stats = {'downloaded': 0, 'existing': 0, 'duplicates': 0, 'failed': 0, 'retries': 0, 'bytes': 0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _get(self, url):
+        """GET url within its host's budget, retrying transient failures. Returns the open response."""
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            try:
+                with self.limiter.slot(host):
+                    response = self.session.get(url, timeout=self.timeout, stream=True)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError:
+                        # Give the streamed connection back to the pool
+                        response.close()
+                        raise
+                    return response
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                    self.limiter.penalize(host, delay)
+                response.close()
+            self._count('retries')
+            time.sleep(delay)
+
+    def download(self, url, folder_path, index):
+        """
+        Download one image into folder_path as {index:02d}_{url hash}{ext}.
+        Returns the file path, or None if it failed or was not an image.
+        The outcome is recorded in the manifest under the folder's name.
+        """
+        content_type = size = None
+        try:
+            status, path, size, content_type, reason = self._download(url, folder_path, index)
+        except Exception as e:
+            # One bad URL (a malformed header, an odd redirect, a decoder error)
+            # must not abort a crawl of thousands; it is recorded and skipped
+            print(f"Error downloading image from {url}: {e}")
+            status, path, reason = 'failed', None, f"{type(e).__name__}: {e}"
+        self._count({'downloaded': 'downloaded', 'existing': 'existing', 'duplicate': 'duplicates'}.get(status, 'failed'))
+        if status == 'downloaded':
+            self._count('bytes', size)
+        if self.manifest is not None:
+            self.manifest.mark(os.path.basename(folder_path), url, 'downloaded' if status == 'existing' else status,
+                               path, size, content_type, reason)
+        return path
+
+    def _download(self, url, folder_path, index):
+        """Returns (status, path, size, content type, reason)."""
+        response = self._get(url)
+        with response:
+            # Check if it's actually an image
+            content_type = response.headers.get('content-type', '')
+            if not any(img_type in content_type.lower() for img_type in IMAGE_TYPES):
+                return 'not_image', None, None, content_type, f"content type {content_type!r}"
+
+            url_hash = hashlib.md5(url.encode()).hexdigest()[:10]
+            extension = self.image_format or get_file_extension(content_type, url)
+            filename = f"{index:02d}_{url_hash}{extension}"
+            file_path = os.path.join(folder_path, filename)
+            if os.path.exists(file_path):
+                return 'existing', file_path, os.path.getsize(file_path), content_type, None
+
+            declared = response.headers.get('content-length', '')
+            if declared.isdigit() and int(declared) > self.max_bytes:
+                return 'too_large', None, int(declared), content_type, f"{declared} bytes declared"
+            data = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                data += chunk
+                if len(data) > self.max_bytes:
+                    return 'too_large', None, len(data), content_type, f"over {self.max_bytes} bytes"
+
+        size = len(data)
+        if size <= self.min_bytes:
+            return 'too_small', None, size, content_type, f"only {size} bytes"
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return 'not_image', None, size, content_type, "does not decode as an image"
+        height, width = image.shape[:2]
+        if min(height, width) < self.min_side:
+            return 'too_small', None, size, content_type, f"only {width}x{height} pixels"
+
+        data, image = self._normalize(bytes(data), image)
+        hashes = None
+        if self.index is not None:
+            hashes = image_hashes(data, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+            duplicate = self.index.claim(file_path, hashes, url)
+            if duplicate is not None:
+                print(f"Skipped duplicate of {duplicate}: {url[:100]}")
+                return 'duplicate', None, size, content_type, f"duplicate of {duplicate}"
+        try:
+            part_path = file_path + '.part'
+            with open(part_path, 'wb') as f:
+                f.write(data)
+            os.replace(part_path, file_path)
+        except Exception:
+            if hashes is not None:
+                self.index.remove(file_path)
+            raise
+        if hashes is not None:
+            self.index.refresh(file_path)
+        print(f"Downloaded: {filename} ({size} -> {len(data)} bytes)" if len(data) != size
+              else f"Downloaded: {filename} ({size} bytes)")
+        return 'downloaded', file_path, len(data), content_type, None
+
+    def _normalize(self, data, image):
+        """Shrink to max_side and re-encode as image_format if configured. Returns (bytes, image)."""
+        height, width = image.shape[:2]
+        resize = self.max_side and max(height, width) > self.max_side
+        if resize:
+            scale = self.max_side / max(height, width)
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        if not resize and not self.image_format:
+            return data, image
+        params = {
+            '.jpg': [cv2.IMWRITE_JPEG_QUALITY, self.quality],
+            '.webp': [cv2.IMWRITE_WEBP_QUALITY, self.quality],
+        }
+        ok, encoded = cv2.imencode(self.image_format or '.jpg', image, params.get(self.image_format or '.jpg', []))
+        if not ok:
+            raise OSError(f"Could not encode image as {self.image_format}")
+        return encoded.tobytes(), image
+
+    def download_until(self, urls, folder_path, needed, start_index=1):
+        """
+        Download candidate urls concurrently until `needed` succeed, keeping
+        at most `needed` downloads in flight and replacing each failure with
+        the next candidate. Returns the paths that were saved.
+        """
+        candidates = iter(enumerate(urls, start_index))
+        pending, saved = set(), []
+
+        def submit_next():
+            for index, url in candidates:
+                pending.add(self.executor.submit(self.download, url, folder_path, index))
+                return
+
+        for _ in range(needed):
+            submit_next()
+        while pending:
+            done = next(as_completed(pending))
+            pending.discard(done)
+            if done.result():
+                saved.append(done.result())
+            elif len(saved) + len(pending) < needed:
+                submit_next()
+        return saved
+
+    def download_many(self, jobs):
+        """Download every (url, folder_path, index) job. Returns paths (or None) in job order."""
+        futures = [self.executor.submit(self.download, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+def _serve_standin(images, flaky_every=4, delay=0.05):
+    """
+    Start a local HTTP server standing in for image hosts: /img/<n> returns
+    a 480x640 JPEG after `delay` seconds, and the first request for
+    every flaky_every-th path fails with 503. Returns the server, already
+    serving.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    counter = {'requests': 0}
+    seen = set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                counter['requests'] += 1
+                flaky = flaky_every and self.path not in seen and zlib.crc32(self.path.encode()) % flaky_every == 0
+                seen.add(self.path)
+            time.sleep(delay)
+            if flaky:
+                self.send_response(503)
+                self.send_header('Retry-After', '0')
+                self.end_headers()
+                return
+            name = self.path.rsplit('/', 1)[-1]
+            if not name.isdigit() or int(name) >= images:
+                self.send_error(404)
+                return
+            noise = np.random.default_rng(int(name)).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+            body = cv2.imencode('.jpg', noise)[1].tobytes()
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.counter = counter
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def self_check(images=40, workers=16, rate=50.0):
+    """Download from a local stand-in server sequentially, concurrently, and concurrently with re-encoding."""
+    import tempfile
+
+    for label, n, options in [('sequential', 1, {}), ('concurrent', workers, {}),
+                              ('normalized', workers, {'max_side': 256, 'image_format': '.jpg'})]:
+        server = _serve_standin(images)
+        urls = [f"http://127.0.0.1:{server.server_port}/img/{i}" for i in range(images)]
+        urls.append(f"http://127.0.0.1:{server.server_port}/img/missing")
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                downloader = ImageDownloader(workers=n, rate=rate, per_host_concurrency=n, backoff=0.01, **options)
+                start = time.perf_counter()
+                paths = downloader.download_many([(url, folder, i) for i, url in enumerate(urls)])
+                elapsed = time.perf_counter() - start
+                downloader.close()
+                saved = sum(path is not None for path in paths)
+                print(f"{label:>10}: {saved}/{len(urls)} saved in {elapsed:.2f}s, {downloader.stats}")
+                assert saved == images, "every stand-in image should download despite the 503s"
+        finally:
+            server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent, rate-limited image downloader.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = subparsers.add_parser('fetch', help="download every URL listed in a file")
+    fetch_parser.add_argument('urls', help="text file with one URL per line")
+    fetch_parser.add_argument('folder')
+    fetch_parser.add_argument('--workers', type=int, default=16)
+    fetch_parser.add_argument('--rate', type=float, default=2.0, help="requests per second per host")
+
+    check_parser = subparsers.add_parser('selfcheck', help="download from a local stand-in server")
+    check_parser.add_argument('--images', type=int, default=40)
+    check_parser.add_argument('--workers', type=int, default=16)
+
+    args = parser.parse_args()
+    if args.command == 'selfcheck':
+        self_check(args.images, args.workers)
+    else:
+        with open(args.urls) as f:
+            urls = [line.strip() for line in f if line.strip()]
+        os.makedirs(args.folder, exist_ok=True)
+        downloader = ImageDownloader(workers=args.workers, rate=args.rate)
+        downloader.download_many([(url, args.folder, i) for i, url in enumerate(urls, 1)])
+        downloader.close()
+        print(downloader.stats)
@@ -0,0 +1,98 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+class DriverPool:
+    """
+    A pool of long-lived headless Chrome instances shared across players.
+    chromedriver is resolved once and browsers are started lazily, up to
+    size of them. A browser is replaced after max_uses searches, or as soon
+    as it raises a WebDriverException other than a timeout (it may have
+    crashed). Safe to use from several threads.
+    """
+
+    def __init__(self, options, size=3, max_uses=50):
+        self.options = options
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._driver_path = None
+        self._uses = {}
+
+    def _service(self):
+        with self._lock:
+            if self._driver_path is None:
+                self._driver_path = ChromeDriverManager().install()
+            return Service(self._driver_path)
+
+    def _take(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                break
+            # Poll, so a slot freed by a discarded browser is noticed too
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        try:
+            driver = webdriver.Chrome(service=self._service(), options=self.options)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        self._uses[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver):
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def driver(self):
+        """Borrow a browser for one search, waiting if all of them are busy."""
+        driver = self._take()
+        try:
+            yield driver
+        except TimeoutException:
+            # A page that never loaded, not a broken browser
+            self._idle.put(driver)
+            raise
+        except WebDriverException:
+            self._discard(driver)
+            raise
+        except BaseException:
+            self._idle.put(driver)
+            raise
+        self._uses[id(driver)] += 1
+        if self._uses[id(driver)] >= self.max_uses:
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def close(self):
+        """Quit every idle browser."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
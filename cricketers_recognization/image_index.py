@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+INDEX_NAME = 'index.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    player TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    ahash INTEGER NOT NULL,
+    phash INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256);
+CREATE INDEX IF NOT EXISTS images_player ON images (player);
+"""
+
+def _pack_bits(bits):
+    """64 booleans -> a signed 64-bit int, the widest integer SQLite stores."""
+    return int(np.packbits(bits.reshape(-1)).view('>i8')[0])
+
+def average_hash(gray):
+    """aHash: 8x8 thumbnail, one bit per pixel brighter than the mean."""
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return _pack_bits(small > small.mean())
+
+def perceptual_hash(gray):
+    """pHash: low 8x8 frequencies of the 32x32 DCT, one bit per coefficient above the median."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    return _pack_bits(low > np.median(low.reshape(-1)[1:]))
+
+def image_hashes(data, gray=None):
+    """
+    Content and perceptual hashes of encoded image bytes, or None if they
+    do not decode as an image. Pass gray if the image is already decoded.
+    """
+    if gray is None:
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    return {
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'ahash': average_hash(gray),
+        'phash': perceptual_hash(gray),
+    }
+
+def hamming(hashes, value):
+    """Bit distance from value to every hash in an int64 array."""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.int64), np.int64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+class ImageIndex:
+    """
+    Persistent SQLite index of every image under root (one folder per
+    player): content hash, aHash and pHash, plus size and mtime so sync()
+    only re-hashes files that are new or changed. Perceptual hashes are
+    also kept in memory for near-duplicate search. Safe to share between
+    threads.
+    """
+
+    def __init__(self, root="players/images", path=None, max_phash_distance=6, max_ahash_distance=10):
+        self.root = root
+        self.max_phash_distance = max_phash_distance
+        self.max_ahash_distance = max_ahash_distance
+        if path is None:
+            os.makedirs(root, exist_ok=True)
+            path = os.path.join(root, INDEX_NAME)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._load_hashes()
+
+    def _load_hashes(self):
+        rows = self.db.execute("SELECT path, ahash, phash FROM images").fetchall()
+        self._paths = [row[0] for row in rows]
+        self._ahashes = np.array([row[1] for row in rows], dtype=np.int64)
+        self._phashes = np.array([row[2] for row in rows], dtype=np.int64)
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _insert(self, relative, hashes, size, mtime_ns, url=None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (relative, relative.split('/')[0], hashes['sha256'], hashes['ahash'], hashes['phash'], size, mtime_ns, url),
+        )
+        self._paths.append(relative)
+        self._ahashes = np.append(self._ahashes, np.int64(hashes['ahash']))
+        self._phashes = np.append(self._phashes, np.int64(hashes['phash']))
+
+    def _find_duplicate(self, hashes):
+        row = self.db.execute("SELECT path FROM images WHERE sha256 = ?", (hashes['sha256'],)).fetchone()
+        if row:
+            return row[0]
+        if len(self._phashes):
+            near = ((hamming(self._phashes, hashes['phash']) <= self.max_phash_distance)
+                    & (hamming(self._ahashes, hashes['ahash']) <= self.max_ahash_distance))
+            if near.any():
+                return self._paths[int(np.argmax(near))]
+        return None
+
+    def find_duplicate(self, hashes):
+        """The indexed path that is an exact or near copy of hashes, or None."""
+        with self._lock:
+            return self._find_duplicate(hashes)
+
+    def claim(self, path, hashes, url=None):
+        """
+        Reserve path for a new image unless it duplicates one already
+        indexed. Returns the existing duplicate's path, or None once path is
+        recorded. Check and insert are atomic, so concurrent downloads of
+        the same photo cannot both get through.
+        """
+        with self._lock:
+            duplicate = self._find_duplicate(hashes)
+            if duplicate is None:
+                self._insert(self._relative(path), hashes, 0, 0, url)
+                self.db.commit()
+            return duplicate
+
+    def refresh(self, path):
+        """Record path's size and mtime after it has been written."""
+        stat = os.stat(path)
+        with self._lock:
+            self.db.execute("UPDATE images SET size = ?, mtime_ns = ? WHERE path = ?",
+                            (stat.st_size, stat.st_mtime_ns, self._relative(path)))
+            self.db.commit()
+
+    def remove(self, path):
+        with self._lock:
+            self.db.execute("DELETE FROM images WHERE path = ?", (self._relative(path),))
+            self.db.commit()
+            self._load_hashes()
+
+    def count(self, player):
+        """Number of indexed images in a player's folder."""
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM images WHERE player = ?", (player,)).fetchone()[0]
+
+    def sync(self):
+        """
+        Bring the index up to date with the files under root: hash new or
+        changed images, forget deleted ones. Unchanged files are only
+        stat'ed. Returns counts of added, updated, removed and unreadable.
+        """
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'unreadable': 0}
+        with self._lock:
+            known = {path: (size, mtime_ns) for path, size, mtime_ns
+                     in self.db.execute("SELECT path, size, mtime_ns FROM images")}
+            seen = set()
+            for player in os.scandir(self.root):
+                if not player.is_dir():
+                    continue
+                for entry in os.scandir(player.path):
+                    if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    relative = f"{player.name}/{entry.name}"
+                    seen.add(relative)
+                    stat = entry.stat()
+                    if known.get(relative) == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    with open(entry.path, 'rb') as f:
+                        hashes = image_hashes(f.read())
+                    if hashes is None:
+                        counts['unreadable'] += 1
+                        continue
+                    counts['updated' if relative in known else 'added'] += 1
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, "
+                        "(SELECT url FROM images WHERE path = ?))",
+                        (relative, player.name, hashes['sha256'], hashes['ahash'], hashes['phash'],
+                         stat.st_size, stat.st_mtime_ns, relative),
+                    )
+            for relative in set(known) - seen:
+                self.db.execute("DELETE FROM images WHERE path = ?", (relative,))
+                counts['removed'] += 1
+            self.db.commit()
+            self._load_hashes()
+        return counts
+
+    def duplicate_groups(self):
+        """Lists of indexed paths that are exact or near copies of each other."""
+        with self._lock:
+            groups, assigned = [], set()
+            for i, path in enumerate(self._paths):
+                if i in assigned:
+                    continue
+                near = ((hamming(self._phashes, self._phashes[i]) <= self.max_phash_distance)
+                        & (hamming(self._ahashes, self._ahashes[i]) <= self.max_ahash_distance))
+                members = [j for j in np.flatnonzero(near) if j not in assigned]
+                if len(members) > 1:
+                    assigned.update(members)
+                    groups.append([self._paths[j] for j in members])
+            return groups
+
+    def close(self):
+        self.db.close()
+
+def find_split_leaks(train_dir, validation_dir, max_phash_distance=6, max_ahash_distance=10):
+    """(validation image, train image) pairs that are exact or near copies across the split."""
+    train = ImageIndex(train_dir, path=':memory:', max_phash_distance=max_phash_distance,
+                       max_ahash_distance=max_ahash_distance)
+    train.sync()
+    leaks = []
+    for player in sorted(os.listdir(validation_dir)):
+        folder = os.path.join(validation_dir, player)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            with open(os.path.join(folder, name), 'rb') as f:
+                hashes = image_hashes(f.read())
+            duplicate = hashes and train.find_duplicate(hashes)
+            if duplicate:
+                leaks.append((f"{player}/{name}", duplicate))
+    train.close()
+    return leaks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content and perceptual hash index of the scraped player images.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sync_parser = subparsers.add_parser('sync', help="index new or changed images")
+    sync_parser.add_argument('--root', default="players/images")
+
+    dups_parser = subparsers.add_parser('dups', help="list groups of duplicate images")
+    dups_parser.add_argument('--root', default="players/images")
+
+    leaks_parser = subparsers.add_parser('leaks', help="find validation images duplicated in the training set")
+    leaks_parser.add_argument('train_dir', nargs='?', default="players/train")
+    leaks_parser.add_argument('validation_dir', nargs='?', default="players/validation")
+
+    args = parser.parse_args()
+    if args.command == 'leaks':
+        leaks = find_split_leaks(args.train_dir, args.validation_dir)
+        for validation_path, train_path in leaks:
+            print(f"{validation_path}\t{train_path}")
+        print(f"{len(leaks)} validation images also appear in the training set")
+    else:
+        index = ImageIndex(args.root)
+        print(index.sync())
+        if args.command == 'dups':
+            groups = index.duplicate_groups()
+            for group in groups:
+                print("\t".join(group))
+            print(f"{len(groups)} groups of duplicates")
+        index.close()
@@ -0,0 +1,67 @@
+import numpy as np
+
+def _scaled(units, width):
+    return max(1, int(round(units * width)))
+
+def build_catdog_model(width=1.0, input_size=256):
+    """
+    The CNN from cat_dogs_classification.ipynb. width scales every layer's
+    units, so small stand-ins keep the same structure and layer types.
+    """
+    import keras
+    from keras.layers import BatchNormalization, Conv2D, Dense, Dropout, Flatten, MaxPool2D
+
+    model = keras.Sequential([keras.Input(shape=(input_size, input_size, 3))])
+    for filters in (32, 64, 128, 256):
+        model.add(Conv2D(_scaled(filters, width), kernel_size=(3, 3), padding='valid', activation='relu'))
+        model.add(BatchNormalization())
+        model.add(MaxPool2D(pool_size=(2, 2), strides=2, padding='valid'))
+    model.add(Flatten())
+    for units in (256, 128, 64):
+        model.add(Dense(units=_scaled(units, width), activation='relu'))
+        model.add(Dropout(0.5))
+    model.add(Dense(units=1, activation='sigmoid'))
+    return model
+
+def build_emotion_model(width=1.0, input_size=48):
+    """The CNN from emotion_detection.ipynb, with the same width scaling."""
+    import keras
+    from keras.layers import BatchNormalization, Conv2D, Dense, Dropout, Flatten, MaxPool2D
+
+    model = keras.Sequential([keras.Input(shape=(input_size, input_size, 1))])
+    for filters in (32, 64, 128):
+        model.add(Conv2D(_scaled(filters, width), kernel_size=(3, 3), padding='same', activation='relu'))
+        model.add(BatchNormalization())
+        model.add(MaxPool2D(pool_size=(2, 2), strides=2, padding='valid'))
+    model.add(Flatten())
+    model.add(Dense(units=_scaled(128, width), activation='relu'))
+    model.add(Dropout(0.5))
+    model.add(Dense(units=7, activation='softmax'))
+    return model
+
+BUILDERS = {
+    'catdog': build_catdog_model,
+    'emotion': build_emotion_model,
+}
+
+def build_standin_model(name, width=0.25, seed=0):
+    """
+    A randomly initialized stand-in for a served model. BatchNorm statistics
+    are randomized too, so exported-weight and runtime comparisons exercise
+    every parameter rather than identity normalization.
+    """
+    import keras
+
+    keras.utils.set_random_seed(seed)
+    model = BUILDERS[name](width=width)
+    rng = np.random.default_rng(seed)
+    for layer in model.layers:
+        if isinstance(layer, keras.layers.BatchNormalization):
+            gamma, beta, mean, variance = layer.get_weights()
+            layer.set_weights([
+                rng.uniform(0.5, 1.5, gamma.shape).astype(gamma.dtype),
+                rng.normal(0, 0.1, beta.shape).astype(beta.dtype),
+                rng.normal(0, 0.1, mean.shape).astype(mean.dtype),
+                rng.uniform(0.5, 1.5, variance.shape).astype(variance.dtype),
+            ])
+    return model
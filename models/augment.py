@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+class Augmenter:
+    """
+    Random shear, zoom and horizontal flip applied to whole batches inside
+    the input pipeline, replacing ImageDataGenerator.flow(save_to_dir=...)
+    so no augmented copies are ever written. Parameters mean what they mean
+    for ImageDataGenerator: shear_range is an angle in degrees, zoom_range
+    z samples each axis from [1 - z, 1 + z], and edges are filled with the
+    nearest pixel. The transforms for a batch are sampled together, and
+    each image is warped once with its combined shear/zoom/flip matrix.
+    The same seed gives the same sequence of batches.
+    """
+
+    def __init__(self, shear_range=0.2, zoom_range=0.2, horizontal_flip=True, seed=None, workers=None):
+        self.shear_range = shear_range
+        self.zoom_range = zoom_range
+        self.horizontal_flip = horizontal_flip
+        self.rng = np.random.default_rng(seed)
+        self.workers = workers
+
+    def sample(self, n, height, width):
+        """Sample n inverse affine matrices (output -> input pixel), shape (n, 2, 3)."""
+        shear = np.deg2rad(self.rng.uniform(-self.shear_range, self.shear_range, n))
+        zx, zy = (self.rng.uniform(1 - self.zoom_range, 1 + self.zoom_range, (2, n))
+                  if self.zoom_range else np.ones((2, n)))
+        flip = np.where(self.rng.random(n) < 0.5, -1.0, 1.0) if self.horizontal_flip else np.ones(n)
+
+        # Same composition as ImageDataGenerator: shear, then zoom, about the centre
+        a = np.empty((n, 2, 2))
+        a[:, 0, 0] = zx * flip
+        a[:, 0, 1] = -np.sin(shear) * zy
+        a[:, 1, 0] = 0.0
+        a[:, 1, 1] = np.cos(shear) * zy
+        center = np.array([(width - 1) / 2.0, (height - 1) / 2.0])
+        matrices = np.empty((n, 2, 3))
+        matrices[:, :, :2] = a
+        matrices[:, :, 2] = center - a @ center
+        return matrices
+
+    def __call__(self, images, out=None):
+        """
+        Augment a (n, height, width[, channels]) batch of any dtype and
+        return it (in out if given, which may be images itself).
+        """
+        n, height, width = images.shape[:3]
+        matrices = self.sample(n, height, width)
+        if out is None:
+            out = np.empty_like(images)
+
+        def warp(i):
+            source, target = images[i], out[i]
+            squeeze = target.ndim == 3 and target.shape[2] == 1
+            warped = cv2.warpAffine(source[..., 0] if squeeze else source, matrices[i], (width, height),
+                                    flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+            target[...] = warped[..., None] if squeeze else warped
+
+        if self.workers == 1 or n <= 1:
+            for i in range(n):
+                warp(i)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(warp, range(n)))
+        return out
@@ -0,0 +1,137 @@
+import argparse
+import dataclasses
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from augment import Augmenter
+from bench_preprocess import make_sample_jpeg
+from packed_dataset import PackedDataset, pack_directory
+from preprocess import PreprocessSpec, Preprocessor
+
+def make_tree(root, classes, per_class, width, height):
+    """A class-per-folder tree of photo-like JPEGs."""
+    for c in range(classes):
+        folder = os.path.join(root, f"class_{c}")
+        os.makedirs(folder, exist_ok=True)
+        for i in range(per_class):
+            with open(os.path.join(folder, f"{i:04d}.jpg"), 'wb') as f:
+                f.write(make_sample_jpeg(width, height, seed=c * per_class + i))
+
+def tree_bytes(root):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(root) for name in names)
+
+def tree_files(root):
+    return sorted(os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names)
+
+def pregenerate(source, output, spec, copies, seed):
+    """
+    The notebook's approach: every image, resized to the model input, plus
+    copies augmented JPEGs of it written next to it.
+    """
+    shutil.copytree(source, output)
+    augmenter = Augmenter(seed=seed, workers=1)
+    preprocessor = Preprocessor(spec)
+    for path in tree_files(source):
+        image = preprocessor(path)
+        stem = os.path.splitext(os.path.join(output, os.path.relpath(path, source)))[0]
+        for k, copy in enumerate(augmenter(np.repeat(image, copies, axis=0))):
+            # cv2.imwrite expects BGR, so RGB copies would be saved with red and blue swapped
+            if spec.color_order == 'RGB':
+                copy = cv2.cvtColor(copy, cv2.COLOR_RGB2BGR)
+            cv2.imwrite(f"{stem}_aug_{k}.jpeg", copy)
+
+def decode_epoch(root, spec, batch_size, workers):
+    """One epoch over a JPEG tree: decode and resize every file, as image_dataset_from_directory does."""
+    files = tree_files(root)
+    preprocessor = Preprocessor(spec, capacity=batch_size, workers=workers)
+    for start in range(0, len(files), batch_size):
+        preprocessor.batch(files[start:start + batch_size])
+    return len(files)
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 3)
+
+def run(classes=4, per_class=50, copies=10, size=224, width=640, height=480, batch_size=32, workers=8, seed=0):
+    # The cricketer notebooks' input; the pre-generation pass stays uint8 to write JPEGs
+    spec = PreprocessSpec(size=size, channels=3, color_order='RGB', scale=1 / 255.0)
+    jpeg_spec = dataclasses.replace(spec, scale=1.0, dtype='uint8')
+    root = tempfile.mkdtemp(prefix='bench_augment_')
+    try:
+        source = os.path.join(root, 'train')
+        make_tree(source, classes, per_class, width, height)
+        originals = classes * per_class
+
+        generated = os.path.join(root, 'train_augmented')
+        _, generate_s = timed(pregenerate, source, generated, jpeg_spec, copies, seed)
+        samples, pregenerated_epoch_s = timed(decode_epoch, generated, spec, batch_size, workers)
+
+        packed_path = os.path.join(root, 'packed')
+        _, pack_s = timed(pack_directory, source, packed_path, spec, workers=workers)
+        dataset = PackedDataset(packed_path)
+        augmenter = Augmenter(seed=seed, workers=workers)
+
+        def packed_epochs(n):
+            for epoch in range(n):
+                for _ in dataset.batches(batch_size, seed=seed + epoch, augment=augmenter):
+                    pass
+
+        # Warm the page cache, as every epoch after the first is
+        packed_epochs(1)
+        _, packed_epoch_s = timed(packed_epochs, 1)
+        # As many augmented samples as one pre-generated epoch holds
+        _, packed_same_samples_s = timed(packed_epochs, copies + 1)
+
+        return {
+            'images': originals,
+            'copies_per_image': copies,
+            'input': f"{width}x{height} jpeg -> {size}x{size}x3",
+            'source_bytes': tree_bytes(source),
+            'pregenerated': {
+                'disk_bytes': tree_bytes(generated),
+                'files': samples,
+                'generate_s': generate_s,
+                'epoch_s': pregenerated_epoch_s,
+            },
+            'on_the_fly': {
+                'disk_bytes': tree_bytes(packed_path),
+                'files': len(os.listdir(packed_path)),
+                'pack_s': pack_s,
+                'epoch_s': packed_epoch_s,
+                f'{copies + 1}_epochs_s': packed_same_samples_s,
+            },
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generated augmented JPEGs against on-the-fly augmentation of a packed dataset.")
+    parser.add_argument('--classes', type=int, default=4)
+    parser.add_argument('--per-class', type=int, default=50)
+    parser.add_argument('--copies', type=int, default=10, help="augmented copies per image (the notebook writes 100)")
+    parser.add_argument('--size', type=int, default=224)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--json', action='store_true', help="print raw JSON")
+    args = parser.parse_args()
+
+    report = run(args.classes, args.per_class, args.copies, args.size,
+                 batch_size=args.batch_size, workers=args.workers)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        pre, fly = report['pregenerated'], report['on_the_fly']
+        print(f"{report['images']} images ({report['input']}, {report['source_bytes']:,} bytes), "
+              f"{report['copies_per_image']} augmented copies each")
+        print(f"{'approach':<14} {'disk bytes':>14} {'files':>7} {'prepare s':>10} {'epoch s':>8}")
+        print(f"{'pregenerated':<14} {pre['disk_bytes']:>14,} {pre['files']:>7} {pre['generate_s']:>10} {pre['epoch_s']:>8}")
+        print(f"{'on the fly':<14} {fly['disk_bytes']:>14,} {fly['files']:>7} {fly['pack_s']:>10} {fly['epoch_s']:>8}")
+        print(f"On the fly, {report['copies_per_image'] + 1} epochs (as many augmented samples as one "
+              f"pregenerated epoch): {fly[str(report['copies_per_image'] + 1) + '_epochs_s']}s")
@@ -0,0 +1,90 @@
+import argparse
+import io
+import json
+import statistics
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from preprocess import Preprocessor
+
+def legacy_emotion_upload(data):
+    """The emotion app's original upload-tab chain."""
+    img_array = np.array(Image.open(io.BytesIO(data)))
+    img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+    test_img = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
+    test_img = cv2.resize(test_img, (48, 48))
+    test_input = test_img.reshape((1, 48, 48, 1))
+    return test_input.astype('float32') / 255.0
+
+def legacy_emotion_camera(data):
+    """The emotion app's original camera-tab chain."""
+    img_array = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    test_img = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
+    test_img = cv2.resize(test_img, (48, 48))
+    test_input = test_img.reshape((1, 48, 48, 1))
+    return test_input.astype('float32') / 255.0
+
+def legacy_catdog(data):
+    """The cat/dog app's original chain."""
+    img_array = np.array(Image.open(io.BytesIO(data)))
+    img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+    test_img = cv2.resize(img_array, (256, 256))
+    return test_img.reshape((1, 256, 256, 3))
+
+def make_sample_jpeg(width=1280, height=960, seed=0):
+    """A photo-like JPEG: smooth gradients plus noise, so it compresses realistically."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    image = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+def measure(fn, data, repeats):
+    """Median latency in ms and peak transient allocation in KB for one image."""
+    fn(data)  # warm up caches and buffers
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'median_ms': round(statistics.median(timings), 3), 'peak_alloc_kb': round(peak / 1024, 1)}
+
+def run(width=1280, height=960, repeats=50):
+    data = make_sample_jpeg(width, height)
+    emotion = Preprocessor('emotion')
+    catdog = Preprocessor('catdog')
+    cases = {
+        'emotion_upload_legacy': legacy_emotion_upload,
+        'emotion_camera_legacy': legacy_emotion_camera,
+        'emotion_preprocess': emotion,
+        'catdog_legacy': legacy_catdog,
+        'catdog_preprocess': catdog,
+    }
+    results = {name: measure(fn, data, repeats) for name, fn in cases.items()}
+    return {'image': f"{width}x{height} jpeg ({len(data):,} bytes)", 'repeats': repeats, 'results': results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-image preprocessing latency and allocations, before and after.")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=960)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--json', action='store_true', help="print raw JSON")
+    args = parser.parse_args()
+
+    report = run(args.width, args.height, args.repeats)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Image: {report['image']}, {report['repeats']} repeats")
+        print(f"{'case':<24} {'median ms':>10} {'peak alloc KB':>14}")
+        for name, r in report['results'].items():
+            print(f"{name:<24} {r['median_ms']:>10} {r['peak_alloc_kb']:>14}")
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from bench_preprocess import make_sample_jpeg
+from preprocess import INTERPOLATIONS, SPECS, Preprocessor
+
+BATCH_SIZES = (1, 8, 32, 64)
+LOADERS = ('pickle', 'parts', 'archive', 'exported')
+
+def _median_ms(fn, repeats):
+    fn()  # warm up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 4)
+
+def _percentiles(latencies_ms):
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3)}
+
+def write_artifacts(model, directory):
+    """Save one model in every format the apps can load. Returns loader -> paths."""
+    from model_archive import compress_file_to_archive
+    from model_store import export_model
+    from model_utils import compress_file_into_two_parts
+
+    pickle_path = os.path.join(directory, 'model.pkl')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump(model, f)
+    parts = [os.path.join(directory, 'model_part1.pkl.gz'), os.path.join(directory, 'model_part2.pkl.gz')]
+    with contextlib.redirect_stdout(io.StringIO()):
+        compress_file_into_two_parts(pickle_path, *parts)
+        compress_file_to_archive(pickle_path, os.path.join(directory, 'model_archive'), chunk_size=4 * 1024 * 1024)
+        export_model(model, os.path.join(directory, 'exported'))
+    return {
+        'pickle': [pickle_path],
+        'parts': parts,
+        'archive': [os.path.join(directory, 'model_archive')],
+        'exported': [os.path.join(directory, 'exported')],
+    }
+
+def measure_load(loader, paths):
+    """
+    Cold-start one loader in this (fresh) process: time to import Keras,
+    time to load the model, and peak RSS afterwards.
+    """
+    from model_utils import _peak_rss_mb
+
+    start = time.perf_counter()
+    import keras  # noqa: F401 -- every loader pays for this on a cold start
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if loader == 'pickle':
+        with open(paths[0], 'rb') as f:
+            pickle.load(f)
+    elif loader == 'parts':
+        from model_utils import load_model_from_parts
+        load_model_from_parts(*paths)
+    elif loader == 'archive':
+        from model_archive import load_model_from_archive
+        load_model_from_archive(paths[0])
+    elif loader == 'exported':
+        from model_store import load_exported_model
+        load_exported_model(paths[0])
+    load_s = time.perf_counter() - start
+    return {'import_s': round(import_s, 3), 'load_s': round(load_s, 3), 'peak_rss_mb': round(_peak_rss_mb(), 1)}
+
+def bench_cold_start(models, directory):
+    results = {}
+    for name, model in models.items():
+        model_dir = os.path.join(directory, name)
+        os.makedirs(model_dir)
+        artifacts = write_artifacts(model, model_dir)
+        results[name] = {}
+        for loader in LOADERS:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'measure-load', loader, *artifacts[loader]],
+                check=True, capture_output=True, text=True, env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3'),
+            ).stdout
+            results[name][loader] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+def bench_preprocessing(repeats):
+    """Per-stage latency of the app preprocessing path on a 1280x960 JPEG."""
+    data = make_sample_jpeg()
+    results = {}
+    for name, spec in SPECS.items():
+        flag = cv2.IMREAD_GRAYSCALE if spec.channels == 1 else cv2.IMREAD_COLOR
+        decoded = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        resized = cv2.resize(decoded, (spec.size, spec.size), interpolation=INTERPOLATIONS[spec.interpolation])
+        out = np.empty(resized.shape, dtype=spec.dtype)
+        swap = spec.channels == 3 and spec.color_order != 'BGR'
+        preprocessor = Preprocessor(spec)
+        results[name] = {
+            'decode_ms': _median_ms(lambda: cv2.imdecode(np.frombuffer(data, np.uint8), flag), repeats),
+            'resize_ms': _median_ms(lambda: cv2.resize(decoded, (spec.size, spec.size), dst=resized,
+                                                       interpolation=INTERPOLATIONS[spec.interpolation]), repeats),
+            'normalize_ms': _median_ms(lambda: np.multiply(resized[..., ::-1] if swap else resized, spec.scale,
+                                                           out=out, casting='unsafe'), repeats),
+            'total_ms': _median_ms(lambda: preprocessor(data), repeats),
+        }
+    return results
+
+def bench_throughput(models, repeats):
+    """Images per second through predict_on_batch at several batch sizes."""
+    results = {}
+    for name, model in models.items():
+        spec = SPECS[name]
+        rng = np.random.default_rng(0)
+        results[name] = {
+            'predict_call_batch1_ms': _median_ms(
+                lambda: model.predict(rng.random((1,) + spec.shape, dtype=np.float32), verbose=0), repeats),
+        }
+        for batch_size in BATCH_SIZES:
+            batch = rng.random((batch_size,) + spec.shape, dtype=np.float32)
+            ms = _median_ms(lambda: model.predict_on_batch(batch), repeats)
+            results[name][f'batch{batch_size}'] = {'batch_ms': ms, 'images_per_s': round(batch_size / ms * 1000, 1)}
+    return results
+
+async def _load_test(model, spec, clients, requests_per_client, max_batch_size, max_wait_ms):
+    from server import DynamicBatcher
+
+    batcher = DynamicBatcher(model, spec.shape, spec.dtype, max_batch_size, max_wait_ms)
+    batcher.start()
+    model_input = np.random.default_rng(0).random(spec.shape, dtype=np.float32).astype(spec.dtype)
+    latencies = []
+
+    async def client():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            await batcher.predict(model_input)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await batcher.predict(model_input)  # warm up
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    await batcher.stop()
+    result = _percentiles(latencies)
+    result.update({'requests_per_s': round(len(latencies) / elapsed, 1), 'mean_batch_size': stats['mean_batch_size']})
+    return result
+
+def bench_concurrency(models, clients, requests_per_client):
+    """Latency percentiles under concurrent load, with and without dynamic batching."""
+    results = {}
+    for name, model in models.items():
+        results[name] = {
+            'unbatched': asyncio.run(_load_test(model, SPECS[name], clients, requests_per_client, 1, 0)),
+            'batched': asyncio.run(_load_test(model, SPECS[name], clients, requests_per_client, 32, 5)),
+        }
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], check=True, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(width=0.25, repeats=20, clients=16, requests_per_client=20, skip=()):
+    """Run every benchmark section not in skip and return the JSON-ready report."""
+    from architectures import BUILDERS, build_standin_model
+    import keras
+
+    models = {name: build_standin_model(name, width=width) for name in BUILDERS}
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'keras': keras.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': {'width': width, 'repeats': repeats, 'clients': clients, 'requests_per_client': requests_per_client},
+        },
+    }
+    if 'cold_start' not in skip:
+        with tempfile.TemporaryDirectory() as directory:
+            report['cold_start'] = bench_cold_start(models, directory)
+    if 'preprocessing' not in skip:
+        report['preprocessing'] = bench_preprocessing(repeats)
+    if 'throughput' not in skip:
+        report['throughput'] = bench_throughput(models, repeats)
+    if 'concurrency' not in skip:
+        report['concurrency'] = bench_concurrency(models, clients, requests_per_client)
+    return report
+
+def _flatten(data, prefix=''):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(old_report, new_report):
+    """Print every metric present in both reports with its new/old ratio."""
+    old = _flatten({k: v for k, v in old_report.items() if k != 'meta'})
+    new = _flatten({k: v for k, v in new_report.items() if k != 'meta'})
+    print(f"{'metric':<58} {'old':>10} {'new':>10} {'new/old':>8}")
+    for name in sorted(set(old) & set(new)):
+        ratio = f"{new[name] / old[name]:.2f}" if old[name] else '-'
+        print(f"{name:<58} {old[name]:>10} {new[name]:>10} {ratio:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU benchmarks for model loading, preprocessing and inference.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="run the benchmarks on generated stand-in models")
+    run_parser.add_argument('--width', type=float, default=0.25, help="stand-in width relative to the real models")
+    run_parser.add_argument('--repeats', type=int, default=20)
+    run_parser.add_argument('--clients', type=int, default=16)
+    run_parser.add_argument('--requests-per-client', type=int, default=20)
+    run_parser.add_argument('--skip', nargs='*', default=[],
+                            choices=['cold_start', 'preprocessing', 'throughput', 'concurrency'])
+    run_parser.add_argument('--output', help="write the JSON report here as well")
+
+    compare_parser = subparsers.add_parser('compare', help="compare two JSON reports, e.g. from two commits")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+
+    measure_parser = subparsers.add_parser('measure-load', help=argparse.SUPPRESS)
+    measure_parser.add_argument('loader', choices=LOADERS)
+    measure_parser.add_argument('paths', nargs='+')
+
+    args = parser.parse_args()
+    if args.command == 'measure-load':
+        print(json.dumps(measure_load(args.loader, args.paths)))
+    elif args.command == 'compare':
+        with open(args.old) as f_old, open(args.new) as f_new:
+            compare(json.load(f_old), json.load(f_new))
+    else:
+        report = run(args.width, args.repeats, args.clients, args.requests_per_client, set(args.skip))
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text)
+        print(text)
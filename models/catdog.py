@@ -1,10 +1,9 @@
 import streamlit as st
-import cv2
-import numpy as np
 from PIL import Image
-import pickle
-from model_utils import load_model_from_parts
-import os
+from catdog_inference import classify_batch, find_catdog_artifact, load_catdog_spec
+from model_store import model_backend
+from prediction_cache import artifact_version, default_cache
+from warmup import MODELS, ModelWarmup
 
 # Page configuration
 st.set_page_config(
@@ -14,29 +13,39 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load the trained model
+# Load and warm up the trained model once per server process, in the background
 @st.cache_resource
+def start_warmup():
+    """Load the fastest artifact available (see load_catdog_model) and trace it with a blank image."""
+    return ModelWarmup({'catdog': MODELS['catdog']}, batch_sizes=(1,)).start()
+
+warmup = start_warmup()
+
 def load_model():
-    """Load the model from compressed parts or fallback to regular pickle file."""
     try:
-        # First try to load from compressed parts
-        if os.path.exists('model_part1.pkl.gz') and os.path.exists('model_part2.pkl.gz'):
-            st.info("🔄 Loading model from compressed parts (first time may take a moment)...")
-            model = load_model_from_parts('model_part1.pkl.gz', 'model_part2.pkl.gz')
-            st.success("✅ Model loaded successfully from compressed parts!")
-            return model
-        # Fallback to regular pickle file
-        elif os.path.exists('model.pkl'):
-            model = pickle.load(open('model.pkl', 'rb'))
-            return model
-        else:
-            raise FileNotFoundError("No model files found")
+        with st.spinner("🔄 Loading model (first time may take a moment)..."):
+            return warmup.get('catdog')[0]
     except Exception as e:
         st.error(f"Error loading model: {str(e)}")
         st.error("Please ensure model files are present in the directory.")
+        # Forget the failed warm-up so the next rerun loads again
+        start_warmup.clear()
         st.stop()
 
+@st.cache_resource
+def load_spec():
+    """Preprocessing contract stored with the model, defaulting to the training pipeline."""
+    return load_catdog_spec()
+
+@st.cache_resource
+def load_cache():
+    """Predictions shared by every session, persisted if PREDICTION_CACHE names a file."""
+    return default_cache()
+
 model = load_model()
+spec = load_spec()
+cache = load_cache()
+model_version = artifact_version(find_catdog_artifact(), spec, model_backend())
 
 # Sidebar with model description
 with st.sidebar:
@@ -70,6 +79,11 @@ with st.sidebar:
     """)
     
     st.markdown("---")
+    status = warmup.status()['models']['catdog']
+    st.caption(f"Model loaded in {status['load_s']:.2f}s, warmed up in {sum(status['warmup_ms'].values()):.0f} ms")
+    stats = cache.stats()
+    st.caption(f"Prediction cache: {stats['hit_rate'] * 100:.0f}% hit rate "
+               f"({stats['hits']} hits, {stats['misses']} misses, {stats['size']} cached)")
     st.markdown("**Made with ❤️ using Streamlit**")
 
 # Main content area
@@ -91,23 +105,15 @@ if uploaded_file is not None:
     
     with col2:
         with st.spinner('🔍 Analyzing image...'):
-            # Convert PIL image to numpy array
-            img_array = np.array(image)
-            
-            # Convert RGB to BGR (if needed for OpenCV)
-            if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-            
-            # Preprocess the image exactly as in your example
-            test_img = cv2.resize(img_array, (256, 256))
-            test_input = test_img.reshape((1, 256, 256, 3))
-            
-            # Make prediction
-            prediction = model.predict(test_input)
+            # Decode, resize to 256x256, scale as in training and run through the model,
+            # unless this exact image was already classified by the same model
+            prediction = cache.get_or_compute(
+                uploaded_file.getvalue(), model_version,
+                lambda data: float(classify_batch([data], model=model, spec=spec)[0]))
             
             # Get the predicted class (0 for cat, 1 for dog)
             # Round to nearest integer to handle values like 0.99999
-            predicted_class = round(prediction[0][0])
+            predicted_class = round(prediction)
             
             # Display the result
             st.subheader("🎯 Prediction Results")
@@ -120,11 +126,11 @@ if uploaded_file is not None:
                 st.balloons()
             
             # Show confidence and raw prediction
-            confidence = abs(prediction[0][0] - 0.5) * 200
+            confidence = abs(prediction - 0.5) * 200
             st.metric("Confidence Level", f"{confidence:.1f}%")
             
             # Raw prediction value
-            st.info(f"**Raw Prediction Value**: {prediction[0][0]:.6f}")
+            st.info(f"**Raw Prediction Value**: {prediction:.6f}")
             
             # Add a fun interpretation
             if confidence > 80:
@@ -0,0 +1,131 @@
+import argparse
+import os
+import pickle
+
+import numpy as np
+
+from model_archive import is_archive, load_model_from_archive
+from model_store import is_exported_model, load_exported_model, model_backend
+from model_utils import load_model_from_parts
+from numpy_runtime import NumpyModel
+from preprocess import Preprocessor, load_contract, shared_preprocessor
+from tflite_export import TFLiteModel
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+def find_catdog_artifact(backend=None):
+    """
+    Return the path of the cat/dog model artifact to use, fastest to load
+    first: quantized TFLite model, exported weights store, chunked archive,
+    legacy two-part split, model.pkl. The backend (default: MODEL_BACKEND)
+    narrows the choice: tflite and numpy only accept their own artifact,
+    keras skips the TFLite one. Returns None if there is none.
+    """
+    backend = backend or model_backend()
+    if backend in ('auto', 'tflite') and os.path.exists('catdog.tflite'):
+        return 'catdog.tflite'
+    if backend == 'tflite':
+        return None
+    if is_exported_model('catdog_model'):
+        return 'catdog_model'
+    if backend == 'numpy':
+        return None
+    if is_archive('model_archive'):
+        return 'model_archive'
+    if os.path.exists('model_part1.pkl.gz') and os.path.exists('model_part2.pkl.gz'):
+        return 'model_part1.pkl.gz'
+    if os.path.exists('model.pkl'):
+        return 'model.pkl'
+    return None
+
+def load_catdog_model(backend=None):
+    """Load the cat/dog model from the artifact find_catdog_artifact picks."""
+    backend = backend or model_backend()
+    artifact = find_catdog_artifact(backend)
+    if artifact == 'catdog.tflite':
+        return TFLiteModel(artifact)
+    if artifact == 'catdog_model':
+        return NumpyModel(artifact) if backend == 'numpy' else load_exported_model(artifact)
+    if artifact == 'model_archive':
+        return load_model_from_archive(artifact)
+    if artifact == 'model_part1.pkl.gz':
+        return load_model_from_parts('model_part1.pkl.gz', 'model_part2.pkl.gz')
+    if artifact == 'model.pkl':
+        with open(artifact, 'rb') as f:
+            return pickle.load(f)
+    raise FileNotFoundError(f"No model files found for the {backend} backend")
+
+def load_catdog_spec():
+    """
+    The preprocessing contract stored with the model artifact, or the
+    training notebook's pipeline (RGB, bilinear, divided by 255) if none is.
+    """
+    return load_contract(find_catdog_artifact(), default='catdog')
+
+def prepare_batch(images, spec=None, workers=None, source_order='BGR', preprocessor=None):
+    """
+    Decode and resize images into one (N, 256, 256, 3) batch following
+    the preprocessing contract. Each resize writes straight into a reused
+    buffer, channel order, cast and scaling happen in one fused pass, and
+    decoding runs on a thread pool since OpenCV releases the GIL.
+    source_order is the channel order of array inputs. Pass a Preprocessor
+    to reuse its buffer and pool, or the calling thread's shared one is
+    used; either way the batch is only valid until its next call.
+    """
+    preprocessor = preprocessor or shared_preprocessor(spec or load_catdog_spec(), workers)
+    batch, _ = preprocessor.batch(images, source_order=source_order)
+    return batch
+
+def predict_batch(model, batch, batch_size=32):
+    """
+    Run a prepared batch through the model in micro-batches of batch_size.
+    Uses predict_on_batch, which skips the per-call dataset and callback
+    setup that model.predict does. Returns an (N,) array of dog probabilities.
+    """
+    probabilities = np.empty(len(batch), dtype=np.float32)
+    for start in range(0, len(batch), batch_size):
+        output = model.predict_on_batch(batch[start:start + batch_size])
+        probabilities[start:start + batch_size] = np.asarray(output).reshape(-1)
+    return probabilities
+
+def classify_batch(images, model=None, spec=None, batch_size=32, workers=None, source_order='BGR',
+                   preprocessor=None):
+    """
+    Classify many images at once.
+    images may be file paths, encoded bytes, or arrays of any size in
+    source_order channel order.
+    Returns an (N,) array of probabilities: 0.0 = cat, 1.0 = dog.
+    """
+    if model is None:
+        model = load_catdog_model()
+    batch = prepare_batch(images, spec=spec, workers=workers, source_order=source_order, preprocessor=preprocessor)
+    return predict_batch(model, batch, batch_size=batch_size)
+
+def _iter_image_paths(inputs):
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label a folder of images as cat or dog.")
+    parser.add_argument('inputs', nargs='+', help="image files or folders")
+    parser.add_argument('--batch-size', type=int, default=32, help="images per model call")
+    parser.add_argument('--chunk', type=int, default=1024, help="images decoded into memory at a time")
+    parser.add_argument('--workers', type=int, help="decode threads")
+    args = parser.parse_args()
+
+    model = load_catdog_model()
+    # One preprocessor for the whole run, so every chunk reuses its buffer and decode threads
+    preprocessor = Preprocessor(load_catdog_spec(), capacity=args.chunk, workers=args.workers)
+    paths = list(_iter_image_paths(args.inputs))
+    print("path\tprobability\tlabel")
+    for start in range(0, len(paths), args.chunk):
+        chunk = paths[start:start + args.chunk]
+        probabilities = classify_batch(chunk, model=model, batch_size=args.batch_size, preprocessor=preprocessor)
+        for path, p in zip(chunk, probabilities):
+            print(f"{path}\t{p:.6f}\t{'dog' if round(float(p)) == 1 else 'cat'}")
@@ -0,0 +1,113 @@
+import streamlit as st
+import csv
+import io
+from cricketer_inference import (display_name, load_cricketer_classes, load_cricketer_model, load_cricketer_spec,
+                                 predict_cricketers)
+from warmup import ModelWarmup, served_batch_sizes
+
+# Page configuration
+st.set_page_config(
+    page_title="Cricketer Recognition",
+    page_icon="🏏",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# Load and warm up the trained model once per server process, in the background
+@st.cache_resource
+def start_warmup():
+    """Load the exported weights store (or cricketer.pkl) and trace it at every batch size up to 32."""
+    return ModelWarmup({'cricketer': (load_cricketer_model, load_cricketer_spec)},
+                       batch_sizes=served_batch_sizes(32)).start()
+
+warmup = start_warmup()
+
+def load_model():
+    try:
+        with st.spinner("🔄 Loading model (first time may take a moment)..."):
+            return warmup.get('cricketer')[0]
+    except Exception as e:
+        st.error(f"Error loading model: {str(e)}")
+        st.error("Train one with `python feature_cache.py train` or place cricketer.pkl in this directory.")
+        # Forget the failed warm-up so the next rerun loads again
+        start_warmup.clear()
+        st.stop()
+
+@st.cache_resource
+def load_spec():
+    """Preprocessing contract stored with the model, defaulting to the training pipeline."""
+    return load_cricketer_spec()
+
+@st.cache_resource
+def load_classes():
+    """Player names stored with the model, defaulting to the notebook's 26 players."""
+    return load_cricketer_classes()
+
+model = load_model()
+spec = load_spec()
+classes = load_classes()
+
+# Sidebar with model information
+with st.sidebar:
+    st.header("🏏 Model Information")
+    st.markdown(f"""
+    ### About This Model
+
+    **Architecture**: VGG16 (ImageNet) with a Dense(256) / Dense({len(classes)}) head
+
+    **Input**: RGB images (224×224 pixels)
+
+    **Players**: {len(classes)} cricketers, mostly from the Nepal national team
+
+    **How it works**:
+    1. Resizes every uploaded image to 224×224
+    2. Feeds them through the network together
+    3. Ranks the players by probability
+    """)
+    top_k = st.slider("Players to show per image", 1, min(10, len(classes)), 3)
+
+    st.markdown("---")
+    status = warmup.status()['models']['cricketer']
+    st.caption(f"Model loaded in {status['load_s']:.2f}s, warmed up in {sum(status['warmup_ms'].values()):.0f} ms")
+    st.markdown("**Made with ❤️ using Streamlit**")
+
+st.title('🏏 Cricketer Recognition')
+st.markdown("### *Upload photos and find out which player is in them*")
+st.markdown("---")
+
+uploaded_files = st.file_uploader("📁 Choose images...", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+
+if uploaded_files:
+    with st.spinner(f'🔍 Recognizing {len(uploaded_files)} images...'):
+        # One preprocessing pass and one model call per batch of 32, not per image
+        results, decoded = predict_cricketers([f.getvalue() for f in uploaded_files], model=model, spec=spec,
+                                              classes=classes, k=top_k, workers=8)
+    matches = dict(zip(decoded, results))
+
+    failed = [f.name for i, f in enumerate(uploaded_files) if i not in matches]
+    if failed:
+        st.warning(f"Could not read {len(failed)} file(s): {', '.join(failed)}")
+
+    rows = []
+    for i, uploaded in enumerate(uploaded_files):
+        if i not in matches:
+            continue
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.image(uploaded.getvalue(), caption=uploaded.name, width=220)
+        with col2:
+            best, score = matches[i][0]
+            st.success(f"**{display_name(best)}** ({score * 100:.1f}%)")
+            for player, score in matches[i]:
+                st.progress(float(score), text=f"{display_name(player)}: {score * 100:.1f}%")
+        rows.append({'File': uploaded.name, **{
+            f'Player {rank}': f"{display_name(player)} ({score * 100:.1f}%)"
+            for rank, (player, score) in enumerate(matches[i], 1)}})
+
+    if len(rows) > 1:
+        csv_buffer = io.StringIO()
+        writer = csv.DictWriter(csv_buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+        st.download_button("⬇️ Download results (CSV)", csv_buffer.getvalue(),
+                           file_name="cricketer_results.csv", mime="text/csv")
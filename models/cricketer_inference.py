@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from catdog_inference import IMAGE_EXTENSIONS
+from model_store import is_exported_model, load_exported_model
+from preprocess import load_contract, shared_preprocessor
+
+# Folder names of players/train in the order image_dataset_from_directory
+# labels them, as listed in transfer_learning.ipynb
+CRICKETERS = [
+    'aakash_chand', 'aasif_sheikh', 'ab_de_villiers', 'anil_sah', 'avinash_bohara', 'basanta_regmi',
+    'bhim_sharki', 'bibek_yadav', 'dev_khanal', 'dipendra_airee', 'gulsan_jha', 'gyanendra_malla',
+    'karan_kc', 'kushal_bhurtel', 'kushal_malla', 'lalit_rajbanshi', 'lokesh_bam', 'nandan_yadav',
+    'paras_khadka', 'pratis_gc', 'rijan_dhakal', 'rohit_paudel', 'sandeep_lamichhane', 'sharad_vesawkar',
+    'sompal_kami', 'virat_kohli',
+]
+CLASSES_NAME = 'classes.json'
+
+def display_name(player):
+    """'paras_khadka' -> 'Paras Khadka'."""
+    return player.replace('_', ' ').title()
+
+def find_cricketer_artifact():
+    """
+    Return the path of the cricketer model artifact to use: the exported
+    weights store written by feature_cache.py if present, else
+    cricketer.pkl (the notebook's pickle). Returns None if there is none.
+    """
+    if is_exported_model('cricketer_model'):
+        return 'cricketer_model'
+    if os.path.exists('cricketer.pkl'):
+        return 'cricketer.pkl'
+    return None
+
+def load_cricketer_model():
+    """Load the cricketer model from the artifact find_cricketer_artifact picks."""
+    artifact = find_cricketer_artifact()
+    if artifact == 'cricketer_model':
+        return load_exported_model(artifact)
+    if artifact == 'cricketer.pkl':
+        with open(artifact, 'rb') as f:
+            return pickle.load(f)
+    raise FileNotFoundError("No cricketer model files found")
+
+def load_cricketer_spec():
+    """The preprocessing contract stored with the model, or the training defaults (224 RGB / 255)."""
+    return load_contract(find_cricketer_artifact(), default='cricketer')
+
+def load_cricketer_classes():
+    """Class names stored with the exported model, or the notebook's 26 players."""
+    artifact = find_cricketer_artifact()
+    if artifact and os.path.isfile(os.path.join(artifact, CLASSES_NAME)):
+        with open(os.path.join(artifact, CLASSES_NAME)) as f:
+            return json.load(f)
+    return CRICKETERS
+
+def top_k(probabilities, classes, k=5):
+    """The k most likely (player, score) pairs of each row, best first."""
+    k = min(k, probabilities.shape[1])
+    top = np.argsort(-probabilities, axis=1)[:, :k]
+    return [[(classes[i], float(row[i])) for i in indices] for row, indices in zip(probabilities, top)]
+
+def predict_cricketers(images, model=None, spec=None, classes=None, k=5, batch_size=32, workers=None):
+    """
+    Recognize the player in many images at once.
+    images may be file paths, encoded bytes, or BGR arrays.
+    Returns the top-k (player, score) pairs of each image that decoded,
+    and the indices of those images.
+    """
+    if model is None:
+        model = load_cricketer_model()
+    classes = classes or load_cricketer_classes()
+    preprocessor = shared_preprocessor(spec or load_cricketer_spec(), workers)
+    batch, decoded = preprocessor.batch(images, skip_errors=True)
+    probabilities = np.empty((len(batch), len(classes)), dtype=np.float32)
+    for start in range(0, len(batch), batch_size):
+        probabilities[start:start + batch_size] = model.predict_on_batch(batch[start:start + batch_size])
+    return top_k(probabilities, classes, k), decoded
+
+def iter_image_paths(inputs):
+    """Image files under inputs (files or folders), lazily, so huge folders are never listed in full."""
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recognize the cricketer in images; writes one JSON line per image.")
+    parser.add_argument('inputs', nargs='+', help="image files or folders")
+    parser.add_argument('--k', type=int, default=5, help="players per image")
+    parser.add_argument('--batch-size', type=int, default=32, help="images per model call")
+    parser.add_argument('--chunk', type=int, default=256, help="images decoded into memory at a time")
+    parser.add_argument('--workers', type=int, help="decode threads")
+    parser.add_argument('--output', help="JSONL file (default: stdout)")
+    args = parser.parse_args()
+
+    model = load_cricketer_model()
+    spec = load_cricketer_spec()
+    classes = load_cricketer_classes()
+    out = open(args.output, 'w') if args.output else sys.stdout
+    count = failed = 0
+    for chunk in _chunks(iter_image_paths(args.inputs), args.chunk):
+        results, decoded = predict_cricketers(chunk, model=model, spec=spec, classes=classes, k=args.k,
+                                              batch_size=args.batch_size, workers=args.workers)
+        matches = dict(zip(decoded, results))
+        for i, path in enumerate(chunk):
+            if i in matches:
+                record = {'path': path, 'predictions': [
+                    {'player': display_name(player), 'label': player, 'score': round(score, 6)}
+                    for player, score in matches[i]]}
+            else:
+                record = {'path': path, 'error': "could not decode image"}
+                failed += 1
+            out.write(json.dumps(record) + "\n")
+        out.flush()
+        count += len(chunk)
+    if args.output:
+        out.close()
+    print(f"{count} images, {failed} unreadable", file=sys.stderr)
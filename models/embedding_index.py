@@ -0,0 +1,353 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from face_detection import FaceDetector, crop
+from feature_cache import backbone_fingerprint, build_vgg16
+from packed_dataset import IMAGE_EXTENSIONS
+from preprocess import Preprocessor, decode, get_spec
+
+INDEX_VERSION = 1
+VECTORS_NAME = 'vectors.bin'
+LABELS_NAME = 'labels.bin'
+CENTROIDS_NAME = 'centroids.bin'
+INDEX_NAME = 'embedding_index.json'
+INDEX_ROOT = "embeddings"
+# Gallery rows scored per matrix product, bounding memory to queries x BLOCK floats
+BLOCK = 65536
+
+def normalize(vectors):
+    """L2-normalize rows, so a dot product is the cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+class Embedder:
+    """
+    Face embeddings from the frozen VGG16 backbone: the largest detected
+    face (or the whole image if none is found) is cropped, resized with the
+    cricketer spec, and its 7x7x512 feature map average-pooled into one
+    L2-normalized 512-d vector. No classifier head is involved, so new
+    players need no training.
+    """
+
+    def __init__(self, backbone=None, detector=None, margin=0.2, spec='cricketer', batch_size=32, workers=8):
+        self.backbone = backbone if backbone is not None else build_vgg16()
+        self.detector = detector
+        self.margin = margin
+        self.spec = get_spec(spec)
+        self.batch_size = batch_size
+        self.preprocessor = Preprocessor(self.spec, capacity=batch_size, workers=workers)
+        self.fingerprint = backbone_fingerprint(self.backbone, self.spec)
+        self.dim = int(self.backbone.output_shape[-1])
+
+    def _face(self, image):
+        image = decode(image, self.spec)
+        if self.detector is not None:
+            boxes = self.detector.detect(image)
+            if boxes:
+                image = crop(image, boxes[0], self.margin)
+        return image
+
+    def embed(self, images):
+        """
+        Embed paths, encoded bytes or BGR arrays. Returns the (m, dim)
+        vectors and the indices of the m images that decoded.
+        """
+        vectors, kept = [], []
+        images = list(images)
+        for offset in range(0, len(images), self.batch_size):
+            faces, indices = [], []
+            for i, image in enumerate(images[offset:offset + self.batch_size], offset):
+                try:
+                    faces.append(self._face(image))
+                    indices.append(i)
+                except ValueError:
+                    continue
+            if not faces:
+                continue
+            batch, _ = self.preprocessor.batch(faces)
+            features = np.asarray(self.backbone.predict_on_batch(batch))
+            vectors.append(normalize(features.mean(axis=(1, 2))))
+            kept.extend(indices)
+        if not vectors:
+            return np.empty((0, self.dim), dtype=np.float32), []
+        return np.concatenate(vectors), kept
+
+class EmbeddingIndex:
+    """
+    A gallery of labelled embeddings on disk: vectors.bin (float32, one
+    row per image) and labels.bin (int32 player ids), both append-only,
+    plus embedding_index.json with the player names and the fingerprint
+    of the embedder that produced them. Adding a player appends rows and
+    never rewrites existing ones.
+
+    Search is an exact, blocked matrix product by default. For large
+    galleries, train_ivf() clusters the vectors into nlist cells
+    (spherical k-means) and approximate searches only score the nprobe
+    cells nearest each query. New rows join their nearest existing cell.
+    """
+
+    def __init__(self, path=INDEX_ROOT, dim=None, fingerprint=None):
+        self.path = path
+        index_path = os.path.join(path, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+            if self.index.get('version') != INDEX_VERSION:
+                raise ValueError(f"Unsupported embedding index version: {self.index.get('version')}")
+            if fingerprint and self.index['fingerprint'] != fingerprint:
+                raise ValueError(f"{path} was built with a different embedder ({self.index['fingerprint']})")
+        else:
+            if dim is None:
+                raise ValueError(f"{path} has no index yet; pass dim to create one")
+            os.makedirs(path, exist_ok=True)
+            self.index = {'version': INDEX_VERSION, 'dim': dim, 'fingerprint': fingerprint, 'count': 0,
+                          'players': [], 'sources': [], 'nlist': 0, 'nprobe': 0}
+            self._save_index()
+        self.dim = self.index['dim']
+        self._load()
+
+    def _load(self, assign=True):
+        count = self.index['count']
+        if count:
+            self.vectors = np.memmap(os.path.join(self.path, VECTORS_NAME), dtype='<f4', mode='r',
+                                     shape=(count, self.dim))
+            self.labels = np.fromfile(os.path.join(self.path, LABELS_NAME), dtype='<i4', count=count)
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=np.float32)
+            self.labels = np.empty(0, dtype=np.int32)
+        self.centroids = None
+        self.assignments = None
+        if self.index['nlist']:
+            self.centroids = np.fromfile(os.path.join(self.path, CENTROIDS_NAME), dtype='<f4').reshape(-1, self.dim)
+            if assign:
+                self.assignments = self._assign(self.vectors)
+
+    def _save_index(self):
+        path = os.path.join(self.path, INDEX_NAME)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(path + '.tmp', path)
+
+    def __len__(self):
+        return self.index['count']
+
+    @property
+    def players(self):
+        return self.index['players']
+
+    def add(self, player, vectors, sources=None):
+        """Append one player's vectors (normalized here), creating the player if new."""
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        if player not in self.players:
+            self.players.append(player)
+        label = self.players.index(player)
+        count = self.index['count']
+        # Truncating first drops rows a crashed add wrote before it could save
+        # the index, so both files stay in step with count
+        with open(os.path.join(self.path, VECTORS_NAME), 'ab') as f:
+            f.truncate(count * self.dim * 4)
+            f.write(vectors.astype('<f4').tobytes())
+        with open(os.path.join(self.path, LABELS_NAME), 'ab') as f:
+            f.truncate(count * 4)
+            f.write(np.full(len(vectors), label, dtype='<i4').tobytes())
+        self.index['count'] += len(vectors)
+        self.index['sources'].extend(sources or [None] * len(vectors))
+        self._save_index()
+        assignments = self.assignments
+        self._load(assign=False)
+        if self.centroids is not None:
+            # New rows join their nearest cell; existing assignments are kept
+            self.assignments = np.concatenate([assignments, self._assign(vectors)])
+
+    def _assign(self, vectors):
+        """Nearest centroid of every vector, computed in blocks."""
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), BLOCK):
+            assignments[start:start + BLOCK] = np.argmax(vectors[start:start + BLOCK] @ self.centroids.T, axis=1)
+        return assignments
+
+    def train_ivf(self, nlist=None, nprobe=None, iterations=10, seed=0):
+        """
+        Cluster the gallery into nlist cells (default about 4 * sqrt(rows))
+        for approximate search. Rows are not moved or rewritten.
+        """
+        if not len(self):
+            raise ValueError(f"{self.path} is empty; add players before training the IVF")
+        vectors = np.asarray(self.vectors)
+        nlist = min(len(vectors), nlist or max(1, int(4 * np.sqrt(len(vectors)))))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            # Empty cells keep their old centroid
+            filled = np.bincount(assignments, minlength=nlist) > 0
+            centroids[filled] = normalize(sums[filled])
+        centroids.astype('<f4').tofile(os.path.join(self.path, CENTROIDS_NAME))
+        self.index['nlist'] = nlist
+        self.index['nprobe'] = nprobe or max(1, nlist // 8)
+        self._save_index()
+        self._load()
+
+    def _candidates(self, query, nprobe):
+        cells = np.argpartition(-(self.centroids @ query), min(nprobe, len(self.centroids)) - 1)[:nprobe]
+        return np.flatnonzero(np.isin(self.assignments, cells))
+
+    def search(self, queries, k=5, approximate=False, nprobe=None):
+        """
+        The k most similar gallery rows of each query by cosine similarity:
+        (scores, rows), both (queries, k), best first; rows are -1 where the
+        gallery (or the probed cells) hold fewer than k vectors.
+        """
+        queries = normalize(queries).reshape(-1, self.dim)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        if approximate and self.centroids is not None:
+            nprobe = nprobe or self.index['nprobe']
+            for q, query in enumerate(queries):
+                candidates = self._candidates(query, nprobe)
+                sims = np.asarray(self.vectors[candidates]) @ query
+                top = np.argsort(-sims)[:k]
+                scores[q, :len(top)], rows[q, :len(top)] = sims[top], candidates[top]
+            return scores, rows
+
+        for start in range(0, len(self), BLOCK):
+            sims = queries @ np.asarray(self.vectors[start:start + BLOCK]).T
+            merged_scores = np.concatenate([scores, sims], axis=1)
+            merged_rows = np.concatenate([rows, np.broadcast_to(np.arange(start, start + sims.shape[1]), sims.shape)],
+                                         axis=1)
+            top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(merged_scores, top, axis=1)
+            rows = np.take_along_axis(merged_rows, top, axis=1)
+        order = np.argsort(-scores, axis=1)
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+    def recognize(self, queries, k=5, approximate=False, nprobe=None):
+        """
+        The top-k players for each query, scored by their most similar
+        gallery image: a list of [(player, score), ...] per query.
+        """
+        queries = normalize(queries).reshape(-1, self.dim)
+        players = len(self.players)
+        if not len(self):
+            return [[] for _ in queries]
+        if approximate and self.centroids is not None:
+            results = []
+            scores, rows = self.search(queries, max(k * 20, 50), True, nprobe)
+            for query_scores, query_rows in zip(scores, rows):
+                best = {}
+                for score, row in zip(query_scores, query_rows):
+                    if row >= 0:
+                        player = self.players[self.labels[row]]
+                        best.setdefault(player, float(score))
+                results.append(list(best.items())[:k])
+            return results
+
+        best = np.full((len(queries), players), -np.inf, dtype=np.float32)
+        for start in range(0, len(self), BLOCK):
+            sims = queries @ np.asarray(self.vectors[start:start + BLOCK]).T
+            # Per-player maxima with one reduceat over the block's rows grouped by player
+            order = np.argsort(self.labels[start:start + BLOCK], kind='stable')
+            labels, starts = np.unique(self.labels[start:start + BLOCK][order], return_index=True)
+            best[:, labels] = np.maximum(best[:, labels], np.maximum.reduceat(sims[:, order], starts, axis=1))
+        top = np.argsort(-best, axis=1)[:, :k]
+        return [[(self.players[label], float(best[q, label])) for label in top[q] if np.isfinite(best[q, label])]
+                for q in range(len(queries))]
+
+def player_images(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+def build_gallery(index, embedder, train_dir, players=None):
+    """
+    Embed and add every player folder of train_dir not yet in the index
+    (or only those named in players). Returns {player: images added}.
+    """
+    added = {}
+    for player in sorted(os.listdir(train_dir)):
+        folder = os.path.join(train_dir, player)
+        if not os.path.isdir(folder) or (players is None and player in index.players) \
+                or (players is not None and player not in players):
+            continue
+        paths = player_images(folder)
+        vectors, kept = embedder.embed(paths)
+        if len(vectors):
+            index.add(player, vectors, [os.path.relpath(paths[i], train_dir) for i in kept])
+        added[player] = len(vectors)
+        print(f"{player}: {len(vectors)} of {len(paths)} images")
+    return added
+
+def evaluate(index, embedder, validation_dir, k=5, approximate=False):
+    """Top-1 and top-k accuracy over a class-per-folder validation set, and search time per query."""
+    queries, truth = [], []
+    for player in sorted(os.listdir(validation_dir)):
+        folder = os.path.join(validation_dir, player)
+        if os.path.isdir(folder) and player in index.players:
+            vectors, kept = embedder.embed(player_images(folder))
+            queries.append(vectors)
+            truth.extend([player] * len(kept))
+    queries = np.concatenate(queries) if queries else np.empty((0, index.dim), dtype=np.float32)
+    start = time.perf_counter()
+    results = index.recognize(queries, k, approximate)
+    elapsed = time.perf_counter() - start
+    top1 = sum(bool(r) and r[0][0] == t for r, t in zip(results, truth))
+    topk = sum(t in [player for player, _ in r] for r, t in zip(results, truth))
+    return {
+        'queries': len(truth),
+        'top1': round(top1 / max(len(truth), 1), 4),
+        f'top{k}': round(topk / max(len(truth), 1), 4),
+        'search_ms_per_query': round(elapsed * 1000 / max(len(truth), 1), 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recognize cricketers by nearest-neighbour search over face embeddings.")
+    parser.add_argument('--index', default=INDEX_ROOT, help="index directory")
+    parser.add_argument('--weights', default='imagenet', help="VGG16 weights: 'imagenet', a file, or 'none'")
+    parser.add_argument('--no-faces', action='store_true', help="embed whole images instead of detected faces")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="add every player folder not in the index yet")
+    build_parser.add_argument('train_dir', nargs='?', default="players/train")
+
+    add_parser = subparsers.add_parser('add', help="add (or extend) one player from a folder of images")
+    add_parser.add_argument('player')
+    add_parser.add_argument('folder')
+
+    ivf_parser = subparsers.add_parser('ivf', help="cluster the gallery for approximate search")
+    ivf_parser.add_argument('--nlist', type=int)
+    ivf_parser.add_argument('--nprobe', type=int)
+
+    query_parser = subparsers.add_parser('query', help="top-k players for images")
+    query_parser.add_argument('images', nargs='+')
+    query_parser.add_argument('--k', type=int, default=5)
+    query_parser.add_argument('--approximate', action='store_true')
+
+    evaluate_parser = subparsers.add_parser('evaluate', help="accuracy on a validation set")
+    evaluate_parser.add_argument('validation_dir', nargs='?', default="players/validation")
+    evaluate_parser.add_argument('--k', type=int, default=5)
+    evaluate_parser.add_argument('--approximate', action='store_true')
+
+    args = parser.parse_args()
+    embedder = Embedder(build_vgg16(None if args.weights == 'none' else args.weights),
+                        detector=None if args.no_faces else FaceDetector())
+    index = EmbeddingIndex(args.index, embedder.dim, embedder.fingerprint)
+    if args.command == 'build':
+        build_gallery(index, embedder, args.train_dir)
+    elif args.command == 'add':
+        paths = player_images(args.folder)
+        vectors, kept = embedder.embed(paths)
+        index.add(args.player, vectors, [paths[i] for i in kept])
+    elif args.command == 'ivf':
+        index.train_ivf(args.nlist, args.nprobe)
+        print(f"{index.index['nlist']} cells, probing {index.index['nprobe']}")
+    elif args.command == 'query':
+        vectors, kept = embedder.embed(args.images)
+        for i, matches in zip(kept, index.recognize(vectors, args.k, args.approximate)):
+            print(args.images[i], " ".join(f"{player}={score:.3f}" for player, score in matches))
+    else:
+        print(json.dumps(evaluate(index, embedder, args.validation_dir, args.k, args.approximate), indent=2))
+    print(f"Index {args.index}: {len(index)} vectors, {len(index.players)} players")
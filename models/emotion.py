@@ -1,13 +1,25 @@
 import streamlit as st
 import cv2
 import numpy as np
-from PIL import Image
-import pickle
+import csv
+import io
+import os
+import tempfile
+from emotion_inference import EMOTIONS, find_emotion_artifact, load_emotion_spec, predict_faces_batch
+from emotion_video import VideoEmotionPipeline, annotate
+from face_detection import FaceDetector, draw_boxes
+from model_store import model_backend
+from prediction_cache import artifact_version, default_cache
+from warmup import MODELS, ModelWarmup, served_batch_sizes
 
 # Define emotion labels
+EMOTION_EMOJIS = {
+    'Angry': '😠', 'Disgust': '🤢', 'Fear': '😨', 'Happy': '😊',
+    'Neutral': '😐', 'Sad': '😢', 'Surprise': '😲'
+}
+
 def label(num):
-    labels = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
-    return labels[num]
+    return EMOTIONS[num]
 
 # Page configuration
 st.set_page_config(
@@ -17,17 +29,44 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load the trained model
+# Load and warm up the trained model once per server process, in the background
 @st.cache_resource
+def start_warmup():
+    """Load the model and trace it at every batch size predict_faces_batch sends, up to 64 faces."""
+    return ModelWarmup({'emotion': MODELS['emotion']}, batch_sizes=served_batch_sizes(64)).start()
+
+warmup = start_warmup()
+
 def load_model():
     try:
-        model = pickle.load(open('emotion.pkl', 'rb'))
-        return model
-    except FileNotFoundError:
-        st.error("Error: emotion.pkl not found. Please ensure the model file is in the same directory.")
+        # Prefers the exported store, whose weights are memory-mapped
+        with st.spinner("🔄 Loading model (first time may take a moment)..."):
+            return warmup.get('emotion')[0]
+    except Exception as e:
+        st.error(f"Error loading model: {e}")
+        st.error("Please ensure emotion.pkl or emotion_model/ is in the same directory.")
+        # Forget the failed warm-up so the next rerun loads again
+        start_warmup.clear()
         st.stop()
 
+@st.cache_resource
+def load_spec():
+    """Preprocessing contract stored with the model, defaulting to the training pipeline."""
+    return load_emotion_spec()
+
+@st.cache_resource
+def load_detector():
+    """Haar face detector bundled with OpenCV; photos are downscaled before detection."""
+    return FaceDetector(max_side=640)
+
+@st.cache_resource
+def load_cache():
+    """Face predictions shared by every session, persisted if PREDICTION_CACHE names a file."""
+    return default_cache()
+
 model = load_model()
+spec = load_spec()
+cache = load_cache()
 
 # Sidebar with model information
 with st.sidebar:
@@ -50,9 +89,10 @@ with st.sidebar:
     
     **How it works**:
     1. Converts uploaded image to grayscale
-    2. Resizes to 48×48 pixels
-    3. Feeds through neural network
-    4. Predicts emotion category
+    2. Finds every face and crops it
+    3. Resizes each face to 48×48 pixels
+    4. Feeds all faces through the neural network together
+    5. Predicts an emotion for each face
     
     **Tips for best results**:
     - Use clear face images
@@ -60,6 +100,14 @@ with st.sidebar:
     - Face should be clearly visible
     """)
     
+    st.markdown("---")
+    detect_faces = st.checkbox("Detect and crop faces", value=True,
+                               help="Analyze each face separately instead of the whole image")
+    detector = load_detector() if detect_faces else None
+    # Results depend on the detector settings as well as on the model
+    model_version = artifact_version(find_emotion_artifact(), spec, model_backend(),
+                                     detector.max_side if detector else None)
+    
     st.markdown("---")
     st.markdown("""
     ### Dataset Information
@@ -69,6 +117,11 @@ with st.sidebar:
     """)
     
     st.markdown("---")
+    status = warmup.status()['models']['emotion']
+    st.caption(f"Model loaded in {status['load_s']:.2f}s, warmed up in {sum(status['warmup_ms'].values()):.0f} ms")
+    stats = cache.stats()
+    st.caption(f"Prediction cache: {stats['hit_rate'] * 100:.0f}% hit rate "
+               f"({stats['hits']} hits, {stats['misses']} misses, {stats['size']} cached)")
     st.markdown("**Made with ❤️ using Streamlit**")
 
 # Main content area
@@ -86,80 +139,57 @@ with st.expander("📋 Click here for instructions"):
 
 st.markdown("---")
 
+def show_face_results(image_bytes, caption):
+    """Detect faces in one image, predict all of them in one batch and render the results."""
+    with st.spinner('🔍 Analyzing...'):
+        faces = cache.get_or_compute(image_bytes, model_version,
+                                     lambda data: predict_faces_batch([data], detector, model, spec)[0])
+    if faces is None:
+        st.error("Could not read this image.")
+        return
+    
+    # Create columns for better layout
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        boxes = [face['box'] for face in faces if face['box'] is not None]
+        if boxes:
+            labels = [f"{i + 1}: {label(face['probabilities'].argmax())}" for i, face in enumerate(faces)]
+            image = draw_boxes(image, boxes, labels)
+        st.image(image, channels="BGR", caption=caption, width=300)
+    
+    with col2:
+        if detector is not None and faces[0]['box'] is None:
+            st.info("No face found, so the whole image was analyzed.")
+        for i, face in enumerate(faces):
+            predicted_emotion = label(face['probabilities'].argmax())
+            confidence = face['probabilities'].max() * 100
+            emotion_emoji = EMOTION_EMOJIS.get(predicted_emotion, '😐')
+            
+            # Display prediction result
+            st.markdown("### 🎯 Prediction" if len(faces) == 1 else f"### 🎯 Face {i + 1}")
+            st.success(f"{emotion_emoji} **{predicted_emotion}**")
+            st.metric("Confidence", f"{confidence:.1f}%")
+    
+    # Show horizontal probability bars below the image
+    st.markdown("### 📊 All Emotions")
+    for i, face in enumerate(faces):
+        if len(faces) > 1:
+            st.markdown(f"**Face {i + 1}**")
+        probabilities = face['probabilities'] * 100
+        for emotion, prob in zip(EMOTIONS, probabilities):
+            emoji = EMOTION_EMOJIS[emotion]
+            st.progress(float(prob)/100, text=f"{emoji} {emotion}: {prob:.1f}%")
+
 # Create tabs for different input methods
-tab1, tab2 = st.tabs(["📁 Upload Image", "📷 Use Camera"])
+tab1, tab2, tab3, tab4 = st.tabs(["📁 Upload Image", "📷 Use Camera", "📚 Batch Upload", "🎥 Video"])
 
 with tab1:
     uploaded_file = st.file_uploader("Choose an image file...", type=["jpg", "jpeg", "png"])
     
     if uploaded_file is not None:
-        # Create columns for better layout
-        col1, col2 = st.columns([2, 1])
-        
-        with col1:
-            # Read and display the image
-            image = Image.open(uploaded_file)
-            st.image(image, caption='Your uploaded image', width=300)
-        
-        with col2:
-            with st.spinner('🔍 Analyzing...'):
-                # Convert PIL image to numpy array
-                img_array = np.array(image)
-                
-                # Convert to grayscale if it's a color image
-                if len(img_array.shape) == 3:
-                    # Convert RGB to BGR for OpenCV
-                    img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-                    # Convert to grayscale
-                    test_img = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
-                else:
-                    test_img = img_array
-                
-                # Resize to 48x48 as required by the model
-                test_img = cv2.resize(test_img, (48, 48))
-                
-                # Reshape for model input
-                test_input = test_img.reshape((1, 48, 48, 1))
-                
-                # Normalize pixel values (if your model expects normalized input)
-                test_input = test_input.astype('float32') / 255.0
-                
-                # Make prediction
-                prediction = model.predict(test_input)
-                predicted_emotion_index = prediction[0].argmax()
-                predicted_emotion = label(predicted_emotion_index)
-                confidence = prediction[0][predicted_emotion_index] * 100
-                
-                # Create emotion emoji mapping
-                emotion_emojis = {
-                    'Angry': '😠',
-                    'Disgust': '🤢',
-                    'Fear': '😨',
-                    'Happy': '😊',
-                    'Neutral': '😐',
-                    'Sad': '😢',
-                    'Surprise': '😲'
-                }
-                
-                emotion_emoji = emotion_emojis.get(predicted_emotion, '😐')
-                
-                # Display prediction result
-                st.markdown("### 🎯 Prediction")
-                st.success(f"{emotion_emoji} **{predicted_emotion}**")
-                st.metric("Confidence", f"{confidence:.1f}%")
-        
-        # Show horizontal probability bars below the image
-        st.markdown("### 📊 All Emotions")
-        emotions = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
-        probabilities = prediction[0] * 100
-        emotion_emojis = {
-            'Angry': '😠', 'Disgust': '🤢', 'Fear': '😨', 'Happy': '😊',
-            'Neutral': '😐', 'Sad': '😢', 'Surprise': '😲'
-        }
-        
-        for emotion, prob in zip(emotions, probabilities):
-            emoji = emotion_emojis[emotion]
-            st.progress(float(prob)/100, text=f"{emoji} {emotion}: {prob:.1f}%")
+        show_face_results(uploaded_file.getvalue(), 'Your uploaded image')
 
 with tab2:
     st.subheader("📷 Take a Photo")
@@ -171,69 +201,101 @@ with tab2:
     camera_picture = st.camera_input("Take a picture", disabled=not enable_camera)
     
     if camera_picture is not None:
-        # Create columns for better layout
-        col1, col2 = st.columns([2, 1])
+        show_face_results(camera_picture.getvalue(), 'Your captured image')
+
+with tab3:
+    st.subheader("📚 Analyze Many Images at Once")
+    
+    uploaded_files = st.file_uploader("Choose image files...", type=["jpg", "jpeg", "png"],
+                                      accept_multiple_files=True, key="batch_upload")
+    top_k = st.slider("Emotions to show per face", 1, len(EMOTIONS), 3)
+    
+    if uploaded_files:
+        with st.spinner(f'🔍 Analyzing {len(uploaded_files)} images...'):
+            # Decode and find faces on a thread pool, then run every face not cached yet through the model together
+            results = cache.get_many([f.getvalue() for f in uploaded_files], model_version,
+                                     lambda images: predict_faces_batch(images, detector, model, spec, workers=8))
         
-        with col1:
-            st.image(camera_picture, caption='Your captured image', width=300)
+        failed = [f.name for f, faces in zip(uploaded_files, results) if faces is None]
+        if failed:
+            st.warning(f"Could not read {len(failed)} file(s): {', '.join(failed)}")
         
-        with col2:
-            with st.spinner('🔍 Analyzing...'):
-                # Read image file buffer as bytes
-                bytes_data = camera_picture.getvalue()
-                
-                # Convert bytes to numpy array for OpenCV processing
-                nparr = np.frombuffer(bytes_data, np.uint8)
-                img_array = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                # Convert to grayscale
-                test_img = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
-                
-                # Resize to 48x48 as required by the model
-                test_img = cv2.resize(test_img, (48, 48))
-                
-                # Reshape for model input
-                test_input = test_img.reshape((1, 48, 48, 1))
-                
-                # Normalize pixel values
-                test_input = test_input.astype('float32') / 255.0
-                
-                # Make prediction
-                prediction = model.predict(test_input)
-                predicted_emotion_index = prediction[0].argmax()
-                predicted_emotion = label(predicted_emotion_index)
-                confidence = prediction[0][predicted_emotion_index] * 100
-                
-                # Create emotion emoji mapping
-                emotion_emojis = {
-                    'Angry': '😠',
-                    'Disgust': '🤢',
-                    'Fear': '😨',
-                    'Happy': '😊',
-                    'Neutral': '😐',
-                    'Sad': '😢',
-                    'Surprise': '😲'
+        rows = []
+        for uploaded, faces in zip(uploaded_files, results):
+            for face_number, face in enumerate(faces or [], 1):
+                prediction = face['probabilities']
+                ranked = prediction.argsort()[::-1][:top_k]
+                row = {
+                    'File': uploaded.name,
+                    'Face': face_number if face['box'] is not None else None,
+                    'Box (x, y, w, h)': str(face['box']) if face['box'] is not None else 'whole image',
+                    'Emotion': f"{EMOTION_EMOJIS[EMOTIONS[ranked[0]]]} {EMOTIONS[ranked[0]]}",
+                    'Confidence': float(prediction[ranked[0]]) * 100,
+                    f'Top {top_k}': ", ".join(f"{EMOTIONS[j]} {prediction[j] * 100:.1f}%" for j in ranked),
                 }
-                
-                emotion_emoji = emotion_emojis.get(predicted_emotion, '😐')
-                
-                # Display prediction result
-                st.markdown("### 🎯 Prediction")
-                st.success(f"{emotion_emoji} **{predicted_emotion}**")
-                st.metric("Confidence", f"{confidence:.1f}%")
+                row.update({emotion: round(float(prob) * 100, 1) for emotion, prob in zip(EMOTIONS, prediction)})
+                rows.append(row)
         
-        # Show horizontal probability bars below the image
-        st.markdown("### 📊 All Emotions")
-        emotions = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
-        probabilities = prediction[0] * 100
-        emotion_emojis = {
-            'Angry': '😠', 'Disgust': '🤢', 'Fear': '😨', 'Happy': '😊',
-            'Neutral': '😐', 'Sad': '😢', 'Surprise': '😲'
-        }
-        
-        for emotion, prob in zip(emotions, probabilities):
-            emoji = emotion_emojis[emotion]
-            st.progress(float(prob)/100, text=f"{emoji} {emotion}: {prob:.1f}%")
+        if rows:
+            st.markdown(f"### 🎯 Results for {len(rows)} faces in {len(uploaded_files) - len(failed)} images")
+            st.dataframe(
+                rows,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    'Confidence': st.column_config.ProgressColumn('Confidence', format="%.1f%%", min_value=0, max_value=100),
+                },
+            )
+            
+            csv_buffer = io.StringIO()
+            writer = csv.DictWriter(csv_buffer, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+            st.download_button("⬇️ Download results (CSV)", csv_buffer.getvalue(),
+                               file_name="emotion_results.csv", mime="text/csv")
+
+with tab4:
+    st.subheader("🎥 Continuous Video")
+    st.caption("Frames are read, searched for faces and classified on separate threads. "
+               "Frames are skipped to hold the target FPS, and tracked faces reuse their last prediction between keyframes.")
+    
+    source_type = st.radio("Source", ["Video file", "Webcam device"], horizontal=True)
+    video_source = video_file = None
+    if source_type == "Video file":
+        video_file = st.file_uploader("Choose a video...", type=["mp4", "avi", "mov", "mkv"], key="video_upload")
+        video_source = video_file
+    else:
+        # A camera attached to the machine running the app
+        video_source = st.number_input("Device index", min_value=0, max_value=10, value=0)
+    
+    target_fps = st.slider("Target FPS", 1, 30, 10)
+    keyframe_interval = st.slider("Re-predict tracked faces every N frames", 1, 30, 5)
+    run_video = st.toggle("▶️ Run", key="run_video", disabled=video_source is None)
+    
+    if run_video and video_source is not None:
+        video_path = None
+        if video_file is not None:
+            # OpenCV needs a real file; it is removed once the run ends or is interrupted
+            with tempfile.NamedTemporaryFile(suffix=os.path.splitext(video_file.name)[1], delete=False) as f:
+                f.write(video_file.getvalue())
+            video_path = video_source = f.name
+        pipeline = VideoEmotionPipeline(video_source, model, spec, detector, target_fps=target_fps,
+                                        keyframe_interval=keyframe_interval)
+        frame_slot = st.empty()
+        stats_slot = st.empty()
+        try:
+            for result in pipeline.run():
+                frame_slot.image(annotate(result), channels="BGR", use_container_width=True)
+                stats_slot.caption(f"⏱️ {pipeline.fps():.1f} FPS · {len(result['faces'])} face(s) · "
+                                   f"latency {result['timings']['latency_ms']:.0f} ms")
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.markdown("### 📈 Run Summary")
+            st.json(pipeline.report())
+        finally:
+            if video_path is not None:
+                os.remove(video_path)
 
 # Add some sample images section
 st.markdown("---")
@@ -241,7 +303,7 @@ st.subheader("💡 Tips for Better Results")
 st.markdown("""
 - **Face visibility**: Ensure the face is clearly visible and well-lit
 - **Image quality**: Higher resolution images generally work better
-- **Single face**: The model works best with images containing one clear face
+- **Multiple faces**: Every detected face is analyzed separately; turn off face detection in the sidebar to analyze the whole image
 - **Frontal view**: Face looking towards the camera gives better results
 - **Natural expressions**: Genuine emotions are detected more accurately
 """)
@@ -0,0 +1,122 @@
+import os
+import pickle
+
+import numpy as np
+
+from face_detection import crop
+from model_store import is_exported_model, load_exported_model, model_backend
+from numpy_runtime import NumpyModel
+from preprocess import decode, decode_pool, get_spec, load_contract, preprocess_into, shared_preprocessor
+from tflite_export import TFLiteModel
+
+EMOTIONS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
+
+def find_emotion_artifact(backend=None):
+    """
+    Return the path of the emotion model artifact to use: a quantized
+    TFLite model, the exported weights store, or emotion.pkl, in that
+    order, narrowed by the backend as in find_catdog_artifact. Returns
+    None if there is none.
+    """
+    backend = backend or model_backend()
+    if backend in ('auto', 'tflite') and os.path.exists('emotion.tflite'):
+        return 'emotion.tflite'
+    if backend == 'tflite':
+        return None
+    if is_exported_model('emotion_model'):
+        return 'emotion_model'
+    if backend == 'numpy':
+        return None
+    if os.path.exists('emotion.pkl'):
+        return 'emotion.pkl'
+    return None
+
+def load_emotion_model(backend=None):
+    """Load the emotion model from the artifact find_emotion_artifact picks."""
+    backend = backend or model_backend()
+    artifact = find_emotion_artifact(backend)
+    if artifact == 'emotion.tflite':
+        return TFLiteModel(artifact)
+    if artifact == 'emotion_model':
+        return NumpyModel(artifact) if backend == 'numpy' else load_exported_model(artifact)
+    if artifact == 'emotion.pkl':
+        with open(artifact, 'rb') as f:
+            return pickle.load(f)
+    raise FileNotFoundError(f"emotion.pkl not found (backend: {backend})")
+
+def load_emotion_spec():
+    """The preprocessing contract stored with the model, or the training defaults."""
+    return load_contract(find_emotion_artifact(), default='emotion')
+
+def predict_emotions(images, model=None, spec=None, batch_size=64, workers=None):
+    """
+    Predict emotions for many images at once.
+    images may be file paths, encoded bytes, or arrays.
+    Returns an (N, 7) array of probabilities in EMOTIONS order and the
+    indices of the images that decoded.
+    """
+    if model is None:
+        model = load_emotion_model()
+    preprocessor = shared_preprocessor(spec or load_emotion_spec(), workers)
+    batch, decoded = preprocessor.batch(images, skip_errors=True)
+    probabilities = np.empty((len(batch), len(EMOTIONS)), dtype=np.float32)
+    for start in range(0, len(batch), batch_size):
+        probabilities[start:start + batch_size] = model.predict_on_batch(batch[start:start + batch_size])
+    return probabilities, decoded
+
+def predict_faces_batch(images, detector, model=None, spec=None, margin=0.0, whole_image_fallback=True,
+                        batch_size=64, workers=None):
+    """
+    Detect every face in every image and classify all the crops together
+    in one batch, instead of shrinking each whole image to 48x48.
+    images may be file paths, encoded bytes, or grayscale/BGR arrays.
+    Returns one list per image of {'box', 'probabilities'} dicts, largest
+    face first. When no face is found the whole image is used with box
+    None, unless whole_image_fallback is False. Images that fail to decode
+    get None. Decoding and detection run on a thread pool of workers.
+    """
+    if model is None:
+        model = load_emotion_model()
+    spec = get_spec(spec or load_emotion_spec())
+
+    def locate(image):
+        try:
+            decoded = decode(image, spec)
+        except ValueError:
+            return None
+        faces = detector.detect(decoded) if detector is not None else []
+        if not faces and whole_image_fallback:
+            faces = [None]
+        return decoded, faces
+
+    images = list(images)
+    if workers == 1 or len(images) <= 1:
+        located = [locate(image) for image in images]
+    else:
+        located = list(decode_pool(workers).map(locate, images))
+
+    crops, owners, boxes = [], [], []
+    results = []
+    for index, found in enumerate(located):
+        if found is None:
+            results.append(None)
+            continue
+        results.append([])
+        decoded, faces = found
+        for box in faces:
+            crops.append(decoded if box is None else crop(decoded, box, margin))
+            owners.append(index)
+            boxes.append(box)
+
+    batch = np.empty((len(crops),) + spec.shape, dtype=spec.dtype)
+    for i, face in enumerate(crops):
+        preprocess_into(face, batch[i], spec)
+    for start in range(0, len(batch), batch_size):
+        probabilities = model.predict_on_batch(batch[start:start + batch_size])
+        for i, p in enumerate(np.asarray(probabilities), start):
+            results[owners[i]].append({'box': boxes[i], 'probabilities': p})
+    return results
+
+def predict_faces(image, detector, model=None, spec=None, margin=0.0, whole_image_fallback=True):
+    """predict_faces_batch for a single image."""
+    return predict_faces_batch([image], detector, model, spec, margin, whole_image_fallback, workers=1)[0]
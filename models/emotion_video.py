@@ -0,0 +1,329 @@
+import argparse
+import json
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from emotion_inference import EMOTIONS, load_emotion_model, load_emotion_spec
+from face_detection import FaceDetector, crop, draw_boxes
+from preprocess import get_spec, preprocess_into
+
+STAGES = ('decode_ms', 'detect_ms', 'infer_ms', 'latency_ms')
+_END = object()
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    overlap = w * h
+    return overlap / (aw * ah + bw * bh - overlap)
+
+class FaceTracker:
+    """
+    Match each frame's face boxes to the faces of earlier frames by overlap,
+    so a face keeps its id and last prediction while it stays roughly in
+    place. Faces unseen for more than max_missed frames are forgotten.
+    """
+
+    def __init__(self, min_iou=0.3, max_missed=5):
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.tracks = {}
+        self.next_id = 0
+
+    def update(self, boxes):
+        """Return (track, is_new) for every box, in order. A track is a dict with id, box and probabilities."""
+        unmatched = set(self.tracks)
+        matches = []
+        for box in boxes:
+            best, best_iou = None, self.min_iou
+            for track_id in unmatched:
+                overlap = _iou(box, self.tracks[track_id]['box'])
+                if overlap >= best_iou:
+                    best, best_iou = track_id, overlap
+            if best is None:
+                track = {'id': self.next_id, 'box': box, 'missed': 0, 'probabilities': None}
+                self.tracks[self.next_id] = track
+                self.next_id += 1
+                matches.append((track, True))
+            else:
+                unmatched.discard(best)
+                self.tracks[best].update(box=box, missed=0)
+                matches.append((self.tracks[best], False))
+        for track_id in unmatched:
+            self.tracks[track_id]['missed'] += 1
+            if self.tracks[track_id]['missed'] > self.max_missed:
+                del self.tracks[track_id]
+        return matches
+
+class VideoEmotionPipeline:
+    """
+    Continuous emotion detection on a webcam device (an int) or a video file.
+    Decoding, face detection + cropping, and inference run on three threads
+    joined by small queues. Frames are skipped to hold target_fps, and when
+    detection or inference fall behind, stale frames are dropped instead of
+    queued, so the processed rate adapts to what the machine sustains.
+    The model only sees new faces and every face on keyframes (every
+    keyframe_interval processed frames); in between, tracked faces reuse
+    their last prediction. Iterate run() for results; not reentrant.
+    """
+
+    def __init__(self, source, model=None, spec=None, detector=None, target_fps=15, keyframe_interval=5,
+                 realtime=True, max_batch_frames=8, queue_size=2, margin=0.0):
+        self.source = int(source) if str(source).isdigit() else source
+        self.live = isinstance(self.source, int)
+        self.model = model if model is not None else load_emotion_model()
+        self.spec = get_spec(spec or load_emotion_spec())
+        self.detector = detector
+        self.target_fps = target_fps
+        self.keyframe_interval = max(1, keyframe_interval)
+        # Files are paced at their own frame rate unless realtime is False,
+        # in which case every due frame is processed as fast as possible
+        self.realtime = realtime or self.live
+        self.max_batch_frames = max_batch_frames
+        self.queue_size = queue_size
+        self.margin = margin
+        self._stop = threading.Event()
+        self._error = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.timings = {stage: [] for stage in STAGES}
+        self.counts = {'frames_read': 0, 'frames_skipped': 0, 'frames_dropped': 0, 'frames_processed': 0,
+                       'faces_predicted': 0, 'faces_reused': 0, 'inference_calls': 0}
+        self.started = self.finished = None
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _offer(self, q, item):
+        """Put item, dropping the oldest queued frame if the next stage is behind."""
+        if not self.realtime:
+            return self._put(q, item)
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    self.counts['frames_dropped'] += 1
+                except queue.Empty:
+                    pass
+
+    def _guard(self, stage, *args):
+        try:
+            stage(*args)
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+
+    def _read(self, capture, frames):
+        source_fps = capture.get(cv2.CAP_PROP_FPS)
+        if not source_fps or np.isnan(source_fps):
+            source_fps = 30.0
+        interval = 1.0 / self.target_fps if self.target_fps else 0.0
+        next_due = 0.0
+        index = 0
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            ok, frame = capture.read()
+            if not ok:
+                break
+            decode_ms = (time.perf_counter() - start) * 1000
+            self.counts['frames_read'] += 1
+            timestamp = start - self.started if self.live else index / source_fps
+            index += 1
+            if self.realtime and not self.live:
+                delay = self.started + timestamp - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if timestamp < next_due - 1e-6:
+                self.counts['frames_skipped'] += 1
+                continue
+            next_due = max(next_due, timestamp - interval) + interval
+            self.timings['decode_ms'].append(decode_ms)
+            self._offer(frames, {'index': index - 1, 'timestamp': timestamp, 'frame': frame,
+                                 'captured': time.perf_counter(), 'timings': {'decode_ms': decode_ms}})
+        self._put(frames, _END)
+
+    def _detect(self, frames, crops):
+        tracker = FaceTracker()
+        processed = 0
+        while True:
+            item = self._get(frames)
+            if item is _END:
+                break
+            start = time.perf_counter()
+            frame = item['frame']
+            gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if self.detector is not None:
+                boxes = self.detector.detect(gray)
+            else:
+                boxes = [(0, 0, gray.shape[1], gray.shape[0])]
+            keyframe = processed % self.keyframe_interval == 0
+            faces, inputs = [], []
+            for track, is_new in tracker.update(boxes):
+                fresh = keyframe or is_new
+                if fresh:
+                    out = np.empty(self.spec.shape, dtype=self.spec.dtype)
+                    inputs.append(preprocess_into(crop(gray, track['box'], self.margin), out, self.spec))
+                faces.append((track, track['box'], fresh))
+            processed += 1
+            item.update(faces=faces, inputs=inputs)
+            item['timings']['detect_ms'] = (time.perf_counter() - start) * 1000
+            self.timings['detect_ms'].append(item['timings']['detect_ms'])
+            self._put(crops, item)
+        self._put(crops, _END)
+
+    def _infer(self, crops, results):
+        done = False
+        while not done:
+            item = self._get(crops)
+            if item is _END:
+                break
+            # Whatever else is already waiting goes into the same model call
+            items = [item]
+            while len(items) < self.max_batch_frames:
+                try:
+                    item = crops.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _END:
+                    done = True
+                    break
+                items.append(item)
+
+            start = time.perf_counter()
+            inputs = [model_input for item in items for model_input in item['inputs']]
+            outputs = iter(np.asarray(self.model.predict_on_batch(np.stack(inputs))) if inputs else ())
+            infer_ms = (time.perf_counter() - start) * 1000
+            if inputs:
+                self.counts['inference_calls'] += 1
+                self.timings['infer_ms'].append(infer_ms)
+
+            for item in items:
+                faces = []
+                for track, box, fresh in item.pop('faces'):
+                    if fresh:
+                        track['probabilities'] = next(outputs)
+                        self.counts['faces_predicted'] += 1
+                    else:
+                        self.counts['faces_reused'] += 1
+                    faces.append({'track_id': track['id'], 'box': box, 'probabilities': track['probabilities'],
+                                  'fresh': fresh})
+                del item['inputs']
+                item['faces'] = faces
+                item['timings']['infer_ms'] = infer_ms
+                item['timings']['latency_ms'] = (time.perf_counter() - item.pop('captured')) * 1000
+                self.timings['latency_ms'].append(item['timings']['latency_ms'])
+                self._put(results, item)
+        self._put(results, _END)
+
+    def run(self, max_frames=None):
+        """
+        Yield one dict per processed frame: index, timestamp (seconds into
+        the source), frame (BGR), faces ({'track_id', 'box', 'probabilities',
+        'fresh'} dicts) and per-stage timings in ms.
+        """
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            raise ValueError(f"Could not open video source: {self.source}")
+        self._stop.clear()
+        self._error = None
+        self._reset_stats()
+        frames, crops, results = (queue.Queue(maxsize=self.queue_size) for _ in range(3))
+        threads = [
+            threading.Thread(target=self._guard, args=(self._read, capture, frames), daemon=True),
+            threading.Thread(target=self._guard, args=(self._detect, frames, crops), daemon=True),
+            threading.Thread(target=self._guard, args=(self._infer, crops, results), daemon=True),
+        ]
+        self.started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            while max_frames is None or self.counts['frames_processed'] < max_frames:
+                item = self._get(results)
+                if item is _END:
+                    break
+                self.counts['frames_processed'] += 1
+                yield item
+        finally:
+            self.finished = time.perf_counter()
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            capture.release()
+        if self._error is not None:
+            raise self._error
+
+    def fps(self):
+        """Processed frames per second so far."""
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return self.counts['frames_processed'] / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        """Sustained FPS, frame and face counts, and per-stage latency percentiles."""
+        stages = {}
+        for stage, values in self.timings.items():
+            if values:
+                p50, p95 = np.percentile(values, [50, 95])
+                stages[stage] = {'mean_ms': round(float(np.mean(values)), 3), 'p50_ms': round(float(p50), 3),
+                                 'p95_ms': round(float(p95), 3)}
+        return {'sustained_fps': round(self.fps(), 2), 'target_fps': self.target_fps, **self.counts, 'stages': stages}
+
+def annotate(result):
+    """The result's frame with every face box labelled with its track id and emotion."""
+    if not result['faces']:
+        return result['frame']
+    boxes = [face['box'] for face in result['faces']]
+    labels = [f"#{face['track_id']} {EMOTIONS[int(face['probabilities'].argmax())]}" for face in result['faces']]
+    return draw_boxes(result['frame'], boxes, labels)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run emotion detection on a webcam or a recorded video and report FPS.")
+    parser.add_argument('source', help="webcam device index or video file path")
+    parser.add_argument('--target-fps', type=float, default=15)
+    parser.add_argument('--keyframe-interval', type=int, default=5, help="re-predict every tracked face this often")
+    parser.add_argument('--max-side', type=int, default=320, help="downscale frames to this size for detection")
+    parser.add_argument('--no-detect', action='store_true', help="classify the whole frame instead of faces")
+    parser.add_argument('--no-realtime', action='store_true', help="process a file as fast as possible")
+    parser.add_argument('--max-frames', type=int)
+    parser.add_argument('--output', help="write the annotated frames to this video file")
+    args = parser.parse_args()
+
+    detector = None if args.no_detect else FaceDetector(max_side=args.max_side)
+    pipeline = VideoEmotionPipeline(args.source, detector=detector, target_fps=args.target_fps,
+                                    keyframe_interval=args.keyframe_interval, realtime=not args.no_realtime)
+    writer = None
+    for result in pipeline.run(args.max_frames):
+        if args.output:
+            frame = annotate(result)
+            if writer is None:
+                writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*'mp4v'), args.target_fps,
+                                         (frame.shape[1], frame.shape[0]))
+            writer.write(frame)
+    if writer is not None:
+        writer.release()
+    print(json.dumps(pipeline.report(), indent=2))
@@ -0,0 +1,68 @@
+import os
+
+import cv2
+import numpy as np
+
+DEFAULT_CASCADE = 'haarcascade_frontalface_default.xml'
+
+class FaceDetector:
+    """
+    Find faces with one of the Haar cascades that ship with opencv-python.
+    Large images are downscaled so their longest side is at most max_side
+    before detection, which keeps detection cost roughly constant no
+    matter how big the photo is; boxes are mapped back to full resolution.
+    """
+
+    def __init__(self, cascade_path=None, max_side=640, scale_factor=1.1, min_neighbors=5, min_size=24):
+        if cascade_path is None:
+            cascade_path = os.path.join(cv2.data.haarcascades, DEFAULT_CASCADE)
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        if self.classifier.empty():
+            raise FileNotFoundError(f"Could not load face cascade: {cascade_path}")
+        self.max_side = max_side
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, image):
+        """
+        Return face boxes as (x, y, w, h) in the coordinates of image,
+        largest first. image may be grayscale or BGR.
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        scale = 1.0
+        if self.max_side and max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+            gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+        boxes = self.classifier.detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size),
+        )
+        if len(boxes) == 0:
+            return []
+        boxes = np.round(np.asarray(boxes, dtype=np.float64) / scale).astype(int)
+        boxes[:, 2] = np.minimum(boxes[:, 2], width - boxes[:, 0])
+        boxes[:, 3] = np.minimum(boxes[:, 3], height - boxes[:, 1])
+        order = np.argsort(-(boxes[:, 2] * boxes[:, 3]))
+        return [tuple(int(v) for v in boxes[i]) for i in order]
+
+def crop(image, box, margin=0.0):
+    """Crop a box out of image, grown by margin (a fraction of its size) and clipped to the image."""
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(image.shape[1], x + w + dx), min(image.shape[0], y + h + dy)
+    return image[y0:y1, x0:x1]
+
+def draw_boxes(image, boxes, labels=None, color=(0, 200, 0)):
+    """Return a copy of image with each box and its label drawn on it."""
+    annotated = image.copy()
+    thickness = max(2, round(max(image.shape[:2]) / 300))
+    for i, (x, y, w, h) in enumerate(boxes):
+        cv2.rectangle(annotated, (x, y), (x + w, y + h), color, thickness)
+        if labels:
+            cv2.putText(annotated, labels[i], (x, max(0, y - 2 * thickness)), cv2.FONT_HERSHEY_SIMPLEX,
+                        thickness / 3, color, max(1, thickness // 2), cv2.LINE_AA)
+    return annotated
@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from packed_dataset import list_class_files
+from preprocess import Preprocessor, get_spec, save_contract
+
+CACHE_VERSION = 1
+FEATURES_NAME = 'features.bin'
+INDEX_NAME = 'features_index.json'
+CACHE_ROOT = "features"
+
+def build_vgg16(weights='imagenet', input_size=224):
+    """The frozen convolutional base of transfer_learning.ipynb."""
+    import keras
+    from keras.applications.vgg16 import VGG16
+
+    if weights is None:
+        # Random weights are only for smoke tests; seed them so runs share a fingerprint
+        keras.utils.set_random_seed(0)
+    conv_base = VGG16(weights=weights, include_top=False, input_shape=(input_size, input_size, 3))
+    conv_base.trainable = False
+    return conv_base
+
+def build_head(feature_shape, classes=26):
+    """The notebook's Flatten/Dense(256)/Dense(classes) head, on its own."""
+    import keras
+    from keras.layers import Dense, Flatten
+
+    return keras.Sequential([
+        keras.Input(shape=feature_shape),
+        Flatten(),
+        Dense(256, activation='relu'),
+        Dense(classes, activation='softmax'),
+    ], name='head')
+
+def attach_head(backbone, head):
+    """backbone followed by a head trained on its cached features: the notebook's full model."""
+    import keras
+
+    return keras.Sequential([keras.Input(shape=backbone.input_shape[1:]), backbone, head])
+
+def backbone_fingerprint(backbone, spec):
+    """
+    A short hash of the backbone's architecture, weights and input
+    preprocessing. Features are only reused while all three are unchanged.
+    """
+    digest = hashlib.sha256(backbone.to_json().encode())
+    digest.update(json.dumps(get_spec(spec).to_dict(), sort_keys=True).encode())
+    for value in backbone.get_weights():
+        digest.update(np.ascontiguousarray(value).tobytes())
+    return digest.hexdigest()[:16]
+
+class FeatureCache:
+    """
+    Bottleneck features of a frozen backbone, computed once per image and
+    stored under root/<name>-<fingerprint>/ as one append-only array
+    (features.bin, float16 by default to halve the footprint) plus
+    features_index.json mapping each image's SHA-256 to its row. Renamed
+    or re-scraped copies of an image hit the same row, and a different
+    backbone or preprocessing gets a separate directory.
+    """
+
+    def __init__(self, backbone, spec='cricketer', name='vgg16', root=CACHE_ROOT, dtype='float16',
+                 batch_size=32, workers=8):
+        self.backbone = backbone
+        self.spec = get_spec(spec)
+        self.batch_size = batch_size
+        self.preprocessor = Preprocessor(self.spec, capacity=batch_size, workers=workers)
+        self.fingerprint = backbone_fingerprint(backbone, self.spec)
+        self.path = os.path.join(root, f"{name}-{self.fingerprint}")
+        os.makedirs(self.path, exist_ok=True)
+
+        index_path = os.path.join(self.path, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+            if self.index.get('version') != CACHE_VERSION:
+                raise ValueError(f"Unsupported feature cache version: {self.index.get('version')}")
+        else:
+            self.index = {
+                'version': CACHE_VERSION,
+                'backbone': name,
+                'fingerprint': self.fingerprint,
+                'spec': self.spec.to_dict(),
+                'shape': [int(d) for d in backbone.output_shape[1:]],
+                'dtype': dtype,
+                'count': 0,
+                'rows': {},
+            }
+        self.shape = tuple(self.index['shape'])
+        self.dtype = np.dtype(self.index['dtype'])
+        self._features = None
+
+    def __len__(self):
+        return self.index['count']
+
+    @property
+    def features(self):
+        """Every cached feature map as a read-only memmap, (rows,) + shape."""
+        if self._features is None or len(self._features) != len(self):
+            if len(self):
+                self._features = np.memmap(os.path.join(self.path, FEATURES_NAME), dtype=self.dtype, mode='r',
+                                           shape=(len(self),) + self.shape)
+            else:
+                self._features = np.empty((0,) + self.shape, dtype=self.dtype)
+        return self._features
+
+    def _save_index(self):
+        path = os.path.join(self.path, INDEX_NAME)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(path + '.tmp', path)
+
+    def extract(self, paths):
+        """
+        Rows of paths' features, running the backbone only on images not
+        cached yet. Images that fail to decode get row -1.
+        """
+        rows = self.index['rows']
+        hashes, missing = [], {}
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            hashes.append(digest)
+            if digest not in rows:
+                missing.setdefault(digest, data)
+
+        pending = list(missing.items())
+        start = time.perf_counter()
+        row_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        with open(os.path.join(self.path, FEATURES_NAME), 'ab') as f_features:
+            # Drop rows an interrupted run wrote after its last index save, so
+            # new rows land where the index numbers them
+            f_features.truncate(self.index['count'] * row_bytes)
+            for offset in range(0, len(pending), self.batch_size):
+                chunk = pending[offset:offset + self.batch_size]
+                batch, decoded = self.preprocessor.batch([data for _, data in chunk], skip_errors=True)
+                if len(decoded):
+                    features = self.backbone.predict_on_batch(batch)
+                    f_features.write(np.asarray(features, dtype=self.dtype).tobytes())
+                    f_features.flush()
+                # Undecodable images are recorded as -1 so they are not retried every run
+                for digest, _ in chunk:
+                    rows[digest] = -1
+                for i in decoded:
+                    rows[chunk[i][0]] = self.index['count']
+                    self.index['count'] += 1
+                # Saved after every batch: the index never claims rows the file lacks
+                self._save_index()
+        if pending:
+            print(f"Extracted features for {len(pending)} new images in {time.perf_counter() - start:.1f}s "
+                  f"({len(paths) - len(pending)} cached)")
+        return np.array([rows[digest] for digest in hashes], dtype=np.int64)
+
+    def extract_directory(self, source):
+        """Feature rows, labels and class names of a class-per-folder tree; undecodable images are dropped."""
+        classes, files = list_class_files(source)
+        rows = self.extract([os.path.join(source, path) for path, _ in files])
+        labels = np.array([label for _, label in files], dtype=np.int32)
+        keep = rows >= 0
+        return rows[keep], labels[keep], classes
+
+    def batches(self, rows, labels, classes, batch_size=32, shuffle=True, seed=None):
+        """Yield (float32 features, one-hot labels) batches for one epoch."""
+        order = np.random.default_rng(seed).permutation(len(rows)) if shuffle else np.arange(len(rows))
+        features = self.features
+        for start in range(0, len(order), batch_size):
+            picked = order[start:start + batch_size]
+            # Sorted memmap reads are sequential; the labels follow the same order
+            picked = picked[np.argsort(rows[picked])]
+            yield (features[rows[picked]].astype(np.float32),
+                   np.eye(classes, dtype=np.float32)[labels[picked]])
+
+    def to_tf_dataset(self, rows, labels, classes, batch_size=32, shuffle=True, seed=None):
+        """A prefetching tf.data.Dataset over batches(), reshuffled every epoch."""
+        import tensorflow as tf
+
+        epoch = iter(range(2 ** 31))
+
+        def generator():
+            epoch_seed = None if seed is None else seed + next(epoch)
+            yield from self.batches(rows, labels, classes, batch_size, shuffle, epoch_seed)
+
+        dataset = tf.data.Dataset.from_generator(generator, output_signature=(
+            tf.TensorSpec((None,) + self.shape, tf.float32),
+            tf.TensorSpec((None, classes), tf.float32),
+        ))
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+def train_head(cache, train_dir, validation_dir=None, epochs=10, batch_size=32, seed=0):
+    """
+    The notebook's first phase (frozen backbone, Adam, categorical
+    cross-entropy) trained on cached features: each epoch is a pass over
+    the small Dense head only. Returns the head, the class names and the
+    training history. No augmentation is possible here, since the
+    features are fixed per image.
+    """
+    import keras
+
+    rows, labels, classes = cache.extract_directory(train_dir)
+    validation = None
+    if validation_dir:
+        val_rows, val_labels, val_classes = cache.extract_directory(validation_dir)
+        if val_classes != classes:
+            raise ValueError(f"{validation_dir} has different classes from {train_dir}")
+        validation = cache.to_tf_dataset(val_rows, val_labels, len(classes), batch_size, shuffle=False)
+
+    keras.utils.set_random_seed(seed)
+    head = build_head(cache.shape, len(classes))
+    head.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    history = head.fit(cache.to_tf_dataset(rows, labels, len(classes), batch_size, seed=seed),
+                       epochs=epochs, validation_data=validation)
+    return head, classes, history
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache frozen VGG16 features and train the cricketer head on them.")
+    parser.add_argument('--root', default=CACHE_ROOT, help="feature cache directory")
+    parser.add_argument('--weights', default='imagenet', help="VGG16 weights: 'imagenet', a file, or 'none'")
+    parser.add_argument('--batch-size', type=int, default=32)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser('extract', help="run the backbone over images not cached yet")
+    extract_parser.add_argument('dirs', nargs='+', help="class-per-folder trees, e.g. players/train players/validation")
+
+    train_parser = subparsers.add_parser('train', help="train the Dense head from the cache")
+    train_parser.add_argument('train_dir', nargs='?', default="players/train")
+    train_parser.add_argument('validation_dir', nargs='?', default="players/validation")
+    train_parser.add_argument('--epochs', type=int, default=10)
+    train_parser.add_argument('--output', default="cricketer_model", help="export directory for backbone + head")
+
+    args = parser.parse_args()
+    backbone = build_vgg16(None if args.weights == 'none' else args.weights)
+    cache = FeatureCache(backbone, root=args.root, batch_size=args.batch_size)
+    print(f"Feature cache {cache.path}: {len(cache)} images")
+    if args.command == 'extract':
+        for directory in args.dirs:
+            rows, _, classes = cache.extract_directory(directory)
+            print(f"{directory}: {len(rows)} images in {len(classes)} classes")
+    else:
+        from model_store import export_model
+
+        head, classes, history = train_head(cache, args.train_dir, args.validation_dir, args.epochs, args.batch_size)
+        export_model(attach_head(backbone, head), args.output)
+        save_contract(cache.spec, args.output)
+        with open(os.path.join(args.output, 'classes.json'), 'w') as f:
+            json.dump(classes, f)
+        print(f"Saved backbone + head and {len(classes)} class names to {args.output}")
@@ -0,0 +1,279 @@
+import argparse
+import collections
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import pickle
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+# Stay well below GitHub's 100 MB hard limit per file
+DEFAULT_CHUNK_SIZE = 48 * 1024 * 1024
+# Decompressed bytes ArchiveReader keeps in flight by default
+LOOKAHEAD_BYTES = 256 * 1024 * 1024
+
+def _zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+# codec name -> (compress(data, level), decompress(data), default level)
+CODECS = {
+    'gzip': (lambda data, level: gzip.compress(data, compresslevel=level), gzip.decompress, 6),
+    'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress, 6),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 6),
+}
+if zstandard is not None:
+    CODECS['zstd'] = (_zstd_compress, _zstd_decompress, 3)
+
+def _get_codec(name):
+    if name not in CODECS:
+        hint = " (install the 'zstandard' package)" if name == 'zstd' else ""
+        raise ValueError(f"Unknown or unavailable codec '{name}'{hint}. Available: {', '.join(sorted(CODECS))}")
+    return CODECS[name]
+
+def _compress_chunk(input_file_path, offset, size, chunk_path, codec, level):
+    """
+    Compress one slice of the input file into its own chunk file.
+    Runs in a worker process, so it reads its slice itself instead of
+    having the data pickled across the process boundary.
+    """
+    with open(input_file_path, 'rb') as f_in:
+        f_in.seek(offset)
+        data = f_in.read(size)
+    compressed = _get_codec(codec)[0](data, level)
+    with open(chunk_path, 'wb') as f_out:
+        f_out.write(compressed)
+    return {
+        'file': os.path.basename(chunk_path),
+        'offset': offset,
+        'size': len(data),
+        'compressed_size': len(compressed),
+        'sha256': hashlib.sha256(data).hexdigest(),
+    }
+
+def _decompress_chunk(archive_dir, chunk, codec):
+    """Decompress one chunk and check it against the manifest."""
+    with open(os.path.join(archive_dir, chunk['file']), 'rb') as f_in:
+        data = _get_codec(codec)[1](f_in.read())
+    if len(data) != chunk['size'] or hashlib.sha256(data).hexdigest() != chunk['sha256']:
+        raise ValueError(f"Checksum mismatch in {chunk['file']}")
+    return data
+
+def _decompress_chunk_into_file(archive_dir, chunk, codec, output_file_path):
+    data = _decompress_chunk(archive_dir, chunk, codec)
+    with open(output_file_path, 'r+b') as f_out:
+        f_out.seek(chunk['offset'])
+        f_out.write(data)
+    return chunk['size']
+
+def _make_executor(workers, n_tasks):
+    """Return a process pool, or None when running inline is cheaper."""
+    if workers == 1 or n_tasks <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, n_tasks))
+
+def read_manifest(archive_dir):
+    """Read and sanity-check an archive manifest."""
+    with open(os.path.join(archive_dir, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported archive version: {manifest.get('version')}")
+    _get_codec(manifest['codec'])
+    return manifest
+
+def is_archive(path):
+    """True if path is a directory holding an archive manifest."""
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+def compress_file_to_archive(input_file_path, archive_dir, chunk_size=DEFAULT_CHUNK_SIZE, codec='gzip', level=None, workers=None):
+    """
+    Split a file into fixed-size chunks and compress them in parallel.
+    Writes the chunks plus a manifest with per-chunk checksums to archive_dir.
+    Returns the manifest.
+    """
+    _, _, default_level = _get_codec(codec)
+    level = default_level if level is None else level
+    total_size = os.path.getsize(input_file_path)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    offsets = list(range(0, total_size, chunk_size)) or [0]
+    width = max(5, len(str(len(offsets))))
+    tasks = [
+        (input_file_path, offset, min(chunk_size, total_size - offset),
+         os.path.join(archive_dir, f"chunk_{i:0{width}d}.{codec}"), codec, level)
+        for i, offset in enumerate(offsets)
+    ]
+
+    print(f"Compressing {input_file_path} ({total_size:,} bytes) into {len(tasks)} {codec} chunk(s)...")
+    executor = _make_executor(workers, len(tasks))
+    if executor is None:
+        chunks = [_compress_chunk(*task) for task in tasks]
+    else:
+        with executor:
+            chunks = list(executor.map(_compress_chunk, *zip(*tasks)))
+
+    manifest = {
+        'version': ARCHIVE_VERSION,
+        'source': os.path.basename(input_file_path),
+        'codec': codec,
+        'level': level,
+        'chunk_size': chunk_size,
+        'total_size': total_size,
+        'chunks': chunks,
+    }
+    with open(os.path.join(archive_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    compressed = sum(c['compressed_size'] for c in chunks)
+    print(f"Compressed size: {compressed:,} bytes ({compressed / max(total_size, 1):.1%})")
+    print(f"Successfully created {archive_dir}")
+    return manifest
+
+def decompress_archive_to_file(archive_dir, output_file_path, workers=None):
+    """
+    Restore the original file. Workers write their chunks straight into
+    a preallocated output file at the chunk's offset.
+    """
+    manifest = read_manifest(archive_dir)
+    chunks = manifest['chunks']
+    with open(output_file_path, 'wb') as f_out:
+        f_out.truncate(manifest['total_size'])
+
+    executor = _make_executor(workers, len(chunks))
+    args = ([archive_dir] * len(chunks), chunks, [manifest['codec']] * len(chunks), [output_file_path] * len(chunks))
+    if executor is None:
+        written = sum(map(_decompress_chunk_into_file, *args))
+    else:
+        with executor:
+            written = sum(executor.map(_decompress_chunk_into_file, *args))
+
+    print(f"Successfully decompressed {archive_dir} to {output_file_path}")
+    print(f"Final size: {written:,} bytes")
+
+def verify_archive(archive_dir, workers=None):
+    """Decompress every chunk and check its checksum. Raises on mismatch."""
+    with open_archive(archive_dir, workers=workers) as stream:
+        while stream.read(1024 * 1024):
+            pass
+    return True
+
+class ArchiveReader(io.RawIOBase):
+    """
+    Stream an archive's decompressed bytes in order. Chunks are
+    decompressed ahead on a process pool, with at most `lookahead`
+    of them in flight. The default is one per worker plus one, capped so
+    the chunks in flight stay within LOOKAHEAD_BYTES (but at least two),
+    so memory stays bounded by a few chunks whatever the core count.
+    """
+
+    def __init__(self, archive_dir, workers=None, lookahead=None):
+        manifest = read_manifest(archive_dir)
+        self._archive_dir = archive_dir
+        self._codec = manifest['codec']
+        self._pending = collections.deque(manifest['chunks'])
+        self._executor = _make_executor(workers, len(self._pending))
+        if lookahead is None and self._executor is not None:
+            chunk_size = max((chunk['size'] for chunk in manifest['chunks']), default=1) or 1
+            lookahead = min((workers or os.cpu_count() or 1) + 1, max(2, LOOKAHEAD_BYTES // chunk_size))
+        self._lookahead = lookahead or 1
+        self._futures = collections.deque()
+        self._buffer = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        if self._executor is None:
+            if not self._pending:
+                return None
+            return _decompress_chunk(self._archive_dir, self._pending.popleft(), self._codec)
+        while self._pending and len(self._futures) < self._lookahead:
+            chunk = self._pending.popleft()
+            self._futures.append(self._executor.submit(_decompress_chunk, self._archive_dir, chunk, self._codec))
+        if not self._futures:
+            return None
+        return self._futures.popleft().result()
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            data = self._next_chunk()
+            if data is None:
+                return 0
+            self._buffer = memoryview(data)
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        if self._executor is not None:
+            for future in self._futures:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        super().close()
+
+def open_archive(archive_dir, workers=None, buffer_size=1024 * 1024):
+    """Open an archive as a buffered, file-like stream of the original bytes."""
+    return io.BufferedReader(ArchiveReader(archive_dir, workers=workers), buffer_size=buffer_size)
+
+def load_model_from_archive(archive_dir='model_archive', workers=None):
+    """
+    Load a pickled model from an archive, decompressing chunks in parallel
+    and streaming them into the unpickler.
+    Returns the loaded model object.
+    """
+    if not is_archive(archive_dir):
+        raise FileNotFoundError(f"Model archive not found: {archive_dir}")
+    with open_archive(archive_dir, workers=workers) as stream:
+        return pickle.load(stream)
+
+def _parse_size(text):
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    text = text.strip().lower().rstrip('b')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked, checksummed model archives.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pack = subparsers.add_parser('pack', help="compress a file into an archive")
+    pack.add_argument('input', nargs='?', default='model.pkl')
+    pack.add_argument('archive', nargs='?', default='model_archive')
+    pack.add_argument('--chunk-size', type=_parse_size, default=DEFAULT_CHUNK_SIZE, help="e.g. 48M (default)")
+    pack.add_argument('--codec', default='gzip', choices=sorted(['gzip', 'zlib', 'lzma', 'zstd']))
+    pack.add_argument('--level', type=int)
+    pack.add_argument('--workers', type=int)
+
+    unpack = subparsers.add_parser('unpack', help="restore the original file")
+    unpack.add_argument('archive', nargs='?', default='model_archive')
+    unpack.add_argument('output', nargs='?', default='model.pkl')
+    unpack.add_argument('--workers', type=int)
+
+    verify = subparsers.add_parser('verify', help="check every chunk against the manifest")
+    verify.add_argument('archive', nargs='?', default='model_archive')
+    verify.add_argument('--workers', type=int)
+
+    args = parser.parse_args()
+    if args.command == 'pack':
+        compress_file_to_archive(args.input, args.archive, args.chunk_size, args.codec, args.level, args.workers)
+        print(f"You can now commit the {args.archive}/ directory to GitHub")
+    elif args.command == 'unpack':
+        decompress_archive_to_file(args.archive, args.output, args.workers)
+    else:
+        verify_archive(args.archive, args.workers)
+        print(f"{args.archive} is intact")
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import pickle
+
+import numpy as np
+
+STORE_VERSION = 1
+ARCHITECTURE_NAME = 'architecture.json'
+WEIGHTS_NAME = 'weights.bin'
+INDEX_NAME = 'weights_index.json'
+# Cache-line aligned so every tensor view starts on a clean boundary
+ALIGNMENT = 64
+# How the apps and the server run models, set through MODEL_BACKEND:
+# auto = fastest artifact present, keras = never TFLite, numpy = the exported
+# store through numpy_runtime (no TensorFlow import), tflite = the .tflite file
+BACKENDS = ('auto', 'keras', 'numpy', 'tflite')
+BACKEND_ENV = 'MODEL_BACKEND'
+
+def _align(offset, alignment=ALIGNMENT):
+    return (offset + alignment - 1) // alignment * alignment
+
+def model_backend():
+    """The configured inference backend, 'auto' unless MODEL_BACKEND says otherwise."""
+    backend = os.environ.get(BACKEND_ENV, '').strip().lower() or 'auto'
+    if backend not in BACKENDS:
+        raise ValueError(f"{BACKEND_ENV} must be one of {BACKENDS}, not '{backend}'")
+    return backend
+
+def is_exported_model(path):
+    """True if path is a directory written by export_model."""
+    return all(os.path.isfile(os.path.join(path, name)) for name in (ARCHITECTURE_NAME, WEIGHTS_NAME, INDEX_NAME))
+
+def export_model(model, export_dir):
+    """
+    Write a Keras model as its JSON architecture plus one flat weights file.
+    Every tensor is stored contiguously in little-endian order at an
+    aligned offset, and weights_index.json records where each one lives.
+    Returns the index.
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    names = [getattr(w, 'path', None) or w.name for w in model.weights]
+    values = model.get_weights()
+
+    tensors = []
+    offset = 0
+    with open(os.path.join(export_dir, WEIGHTS_NAME), 'wb') as f_out:
+        for name, value in zip(names, values):
+            value = np.ascontiguousarray(value, dtype=value.dtype.newbyteorder('<'))
+            aligned = _align(offset)
+            f_out.write(b'\0' * (aligned - offset))
+            f_out.write(value.tobytes())
+            tensors.append({
+                'name': name,
+                'shape': list(value.shape),
+                'dtype': value.dtype.str,
+                'offset': aligned,
+                'nbytes': value.nbytes,
+            })
+            offset = aligned + value.nbytes
+
+    index = {'version': STORE_VERSION, 'alignment': ALIGNMENT, 'total_size': offset, 'tensors': tensors}
+    with open(os.path.join(export_dir, INDEX_NAME), 'w') as f:
+        json.dump(index, f, indent=2)
+    with open(os.path.join(export_dir, ARCHITECTURE_NAME), 'w') as f:
+        f.write(model.to_json())
+
+    print(f"Exported {len(tensors)} tensors ({offset:,} bytes) to {export_dir}")
+    return index
+
+def read_index(export_dir):
+    """Read and sanity-check a weights index."""
+    with open(os.path.join(export_dir, INDEX_NAME), 'r') as f:
+        index = json.load(f)
+    if index.get('version') != STORE_VERSION:
+        raise ValueError(f"Unsupported weights store version: {index.get('version')}")
+    return index
+
+def load_architecture(export_dir):
+    """Return the model architecture as a parsed JSON dict."""
+    with open(os.path.join(export_dir, ARCHITECTURE_NAME), 'r') as f:
+        return json.load(f)
+
+def load_weights(export_dir, mmap=True):
+    """
+    Return the stored weights as a list of read-only arrays, in the order
+    model.get_weights() produced them. With mmap=True the arrays are views
+    into one shared, read-only mapping of weights.bin, so processes on the
+    same host share the page cache instead of each holding a private copy.
+    """
+    index = read_index(export_dir)
+    weights_path = os.path.join(export_dir, WEIGHTS_NAME)
+    if mmap:
+        if index['total_size'] == 0:
+            buffer = np.empty(0, dtype=np.uint8)
+        else:
+            buffer = np.memmap(weights_path, dtype=np.uint8, mode='r', shape=(index['total_size'],))
+    else:
+        buffer = np.fromfile(weights_path, dtype=np.uint8, count=index['total_size'])
+        buffer.flags.writeable = False
+
+    return [
+        np.ndarray(tuple(t['shape']), dtype=np.dtype(t['dtype']), buffer=buffer, offset=t['offset'])
+        for t in index['tensors']
+    ]
+
+def load_exported_model(export_dir):
+    """
+    Rebuild a Keras model from its architecture and fill in the weights.
+    The weights come straight from the memory-mapped file, so nothing is
+    unpickled and no intermediate copy of the file is made; Keras still
+    copies each tensor once into its own variables.
+    """
+    import keras
+
+    if not is_exported_model(export_dir):
+        raise FileNotFoundError(f"Exported model not found: {export_dir}")
+    with open(os.path.join(export_dir, ARCHITECTURE_NAME), 'r') as f:
+        model = keras.models.model_from_json(f.read())
+    model.set_weights(load_weights(export_dir, mmap=True))
+    return model
+
+def load_pickled_model(source):
+    """Load a pickled model from model.pkl, a model archive, or 'part1,part2'."""
+    from model_archive import is_archive, load_model_from_archive
+    from model_utils import load_model_from_parts
+
+    if ',' in source:
+        return load_model_from_parts(*source.split(','))
+    if is_archive(source):
+        return load_model_from_archive(source)
+    with open(source, 'rb') as f:
+        return pickle.load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export pickled Keras models to a memory-mappable weights store.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser('export', help="convert a pickled model")
+    export.add_argument('source', help="model.pkl, an archive directory, or 'part1.pkl.gz,part2.pkl.gz'")
+    export.add_argument('export_dir')
+    export.add_argument('--spec', help="preprocessing contract to store with the model, e.g. catdog or emotion")
+
+    info = subparsers.add_parser('info', help="list the tensors in an exported model")
+    info.add_argument('export_dir')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_model(load_pickled_model(args.source), args.export_dir)
+        from preprocess import load_contract, save_contract
+        # Carry over a contract stored with the source, unless one is named
+        spec = args.spec or load_contract(args.source.split(',')[0])
+        if spec:
+            print(f"Wrote {save_contract(spec, args.export_dir)}")
+    else:
+        index = read_index(args.export_dir)
+        for t in index['tensors']:
+            print(f"{t['name']:<50} {str(tuple(t['shape'])):<22} {t['dtype']:<5} @ {t['offset']:,}")
+        print(f"Total: {index['total_size']:,} bytes")
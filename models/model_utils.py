@@ -1,6 +1,17 @@
+import argparse
 import gzip
+import io
+import json
 import os
 import pickle
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 def compress_file_into_two_parts(input_file_path, output_part1_path, output_part2_path):
     """
@@ -56,36 +67,163 @@ def decompress_two_parts_to_file(input_part1_path, input_part2_path, output_file
     print(f"Successfully decompressed to {output_file_path}")
     print(f"Final size: {len(combined_data):,} bytes")
 
-def load_model_from_parts(part1_path='model_part1.pkl.gz', part2_path='model_part2.pkl.gz', temp_model_path='temp_model.pkl'):
+class ChainedGzipReader(io.RawIOBase):
+    """
+    Read several gzip files back to back as one uncompressed stream.
+    Only one part is open at a time and nothing is buffered beyond the
+    reader's own chunk, so the decompressed data is never held in full.
+    """
+
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return 0
+                self._current = gzip.open(self._paths.pop(0), 'rb')
+            n = self._current.readinto(buffer)
+            if n:
+                return n
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+def open_parts_stream(*part_paths, buffer_size=1024 * 1024):
     """
-    Load a model by first decompressing it from two parts.
+    Open compressed parts as a single buffered, file-like stream.
+    """
+    return io.BufferedReader(ChainedGzipReader(part_paths), buffer_size=buffer_size)
+
+def load_model_from_parts(part1_path='model_part1.pkl.gz', part2_path='model_part2.pkl.gz', temp_model_path=None):
+    """
+    Load a model by streaming its compressed parts straight into the unpickler.
+    No temporary file is written; temp_model_path is accepted only for
+    backwards compatibility and ignored.
     Returns the loaded model object.
     """
     if not os.path.exists(part1_path) or not os.path.exists(part2_path):
         raise FileNotFoundError(f"Model parts not found: {part1_path} or {part2_path}")
     
-    # Decompress to temporary file
+    with open_parts_stream(part1_path, part2_path) as stream:
+        return pickle.load(stream)
+
+def _load_model_via_temp_file(part1_path, part2_path, temp_model_path='temp_model.pkl'):
+    """
+    The original loader: decompress everything to disk, then unpickle.
+    Kept only so profile_model_load can compare against it.
+    """
     decompress_two_parts_to_file(part1_path, part2_path, temp_model_path)
-    
-    # Load the model
     with open(temp_model_path, 'rb') as f:
         model = pickle.load(f)
-    
-    # Clean up temporary file
     os.remove(temp_model_path)
-    
     return model
 
+def _load_model_from_archive(archive_dir):
+    from model_archive import load_model_from_archive
+    return load_model_from_archive(archive_dir)
+
+_LOADERS = {
+    'streaming': load_model_from_parts,
+    'temp_file': _load_model_via_temp_file,
+    'archive': _load_model_from_archive,
+}
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def measure_model_load(loader, *paths):
+    """
+    Load a model twice with the named loader: once untraced for the load
+    time and peak RSS, then again under tracemalloc for the peak Python
+    heap allocation, since tracing slows the allocation-heavy unpickle down.
+    """
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    model = _LOADERS[loader](*paths)
+    seconds = time.perf_counter() - start
+    peak_rss = _peak_rss_mb()
+    del model
+
+    tracemalloc.start()
+    _LOADERS[loader](*paths)
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'loader': loader,
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': None if peak_rss is None else round(peak_rss, 1),
+        'rss_before_mb': None if rss_before is None else round(rss_before, 1),
+        'peak_alloc_mb': round(peak_alloc / (1024 * 1024), 1),
+    }
+
+def profile_model_load(part1_path='model_part1.pkl.gz', part2_path='model_part2.pkl.gz', archive_dir=None):
+    """
+    Compare cold-start cost of each loader. Every loader runs in a fresh
+    interpreter because peak RSS can only grow within a process.
+    """
+    import subprocess
+
+    runs = [('streaming', [part1_path, part2_path]), ('temp_file', [part1_path, part2_path])]
+    if archive_dir:
+        runs.append(('archive', [archive_dir]))
+
+    results = []
+    for loader, paths in runs:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure', loader, *paths],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'loader':<10} {'seconds':>8} {'peak RSS MB':>12} {'peak alloc MB':>14}")
+    for r in results:
+        print(f"{r['loader']:<10} {r['seconds']:>8} {str(r['peak_rss_mb']):>12} {r['peak_alloc_mb']:>14}")
+    return results
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress model.pkl into two parts or profile loading them.")
+    parser.add_argument('--profile', action='store_true', help="compare load time and peak memory of each loader")
+    parser.add_argument('--archive', help="also profile loading this model_archive.py archive")
+    parser.add_argument('--measure', choices=sorted(_LOADERS), help=argparse.SUPPRESS)
+    parser.add_argument('parts', nargs='*', default=["model_part1.pkl.gz", "model_part2.pkl.gz"])
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_model_load(args.measure, *args.parts)))
+        sys.exit(0)
+    if len(args.parts) != 2:
+        parser.error(f"expected two part files, got {len(args.parts)}")
+    if args.profile:
+        profile_model_load(*args.parts, archive_dir=args.archive)
+        sys.exit(0)
+
     # Script to compress the existing model.pkl
     input_file = "model.pkl"
-    part1_file = "model_part1.pkl.gz"
-    part2_file = "model_part2.pkl.gz"
+    part1_file, part2_file = args.parts
     
     if os.path.exists(input_file):
         compress_file_into_two_parts(input_file, part1_file, part2_file)
         print(f"\nCompression complete!")
         print(f"You can now commit {part1_file} and {part2_file} to GitHub")
         print(f"Original file {input_file} can be deleted or added to .gitignore")
+        print("Tip: 'python model_archive.py pack' writes a chunked, checksummed archive that loads in parallel")
     else:
         print(f"Error: {input_file} not found")
@@ -0,0 +1,237 @@
+import argparse
+import math
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from model_store import load_architecture, load_weights
+
+# Largest im2col patch matrix conv2d builds at once
+IM2COL_BYTES = 64 * 1024 * 1024
+
+def _pair(value):
+    return tuple(value) if isinstance(value, (list, tuple)) else (value, value)
+
+def _same_padding(size, kernel, stride):
+    """TensorFlow's 'same' padding: (before, after) for one spatial axis."""
+    out = math.ceil(size / stride)
+    total = max((out - 1) * stride + kernel - size, 0)
+    return total // 2, total - total // 2
+
+def _activate(x, activation):
+    if activation in (None, 'linear'):
+        return x
+    if activation == 'relu':
+        return np.maximum(x, 0, out=x)
+    if activation == 'sigmoid':
+        return np.reciprocal(1 + np.exp(-x, out=x), out=x)
+    if activation == 'softmax':
+        x -= x.max(axis=-1, keepdims=True)
+        np.exp(x, out=x)
+        x /= x.sum(axis=-1, keepdims=True)
+        return x
+    raise ValueError(f"Unsupported activation '{activation}'")
+
+def conv2d(x, kernel, bias, strides=(1, 1), padding='valid'):
+    """
+    NHWC convolution as im2col plus one matrix product, with the patch
+    matrix built for a few images at a time to bound memory.
+    """
+    kh, kw = kernel.shape[:2]
+    sh, sw = strides
+    if padding == 'same':
+        pads = (_same_padding(x.shape[1], kh, sh), _same_padding(x.shape[2], kw, sw))
+        if any(p for pair in pads for p in pair):
+            x = np.pad(x, ((0, 0), pads[0], pads[1], (0, 0)))
+    oh = (x.shape[1] - kh) // sh + 1
+    ow = (x.shape[2] - kw) // sw + 1
+    cout = kernel.shape[3]
+    columns = kh * kw * x.shape[3]
+    weights = kernel.reshape(columns, cout)
+    out = np.empty((x.shape[0], oh, ow, cout), dtype=np.float32)
+    # im2col a few images at a time, so each chunk is one large BLAS call
+    # while the patch matrix stays under IM2COL_BYTES
+    step = max(1, IM2COL_BYTES // (oh * ow * columns * 4))
+    for start in range(0, len(x), step):
+        chunk = x[start:start + step]
+        patches = np.concatenate([chunk[:, i:i + (oh - 1) * sh + 1:sh, j:j + (ow - 1) * sw + 1:sw]
+                                  for i in range(kh) for j in range(kw)], axis=3)
+        np.matmul(patches.reshape(-1, columns), weights, out=out[start:start + step].reshape(-1, cout))
+    if bias is not None:
+        out += bias
+    return out
+
+def max_pool2d(x, pool_size=(2, 2), strides=(2, 2), padding='valid'):
+    """NHWC max pooling as a running maximum over the pool's strided views."""
+    ph, pw = pool_size
+    sh, sw = strides
+    if padding == 'same':
+        pads = (_same_padding(x.shape[1], ph, sh), _same_padding(x.shape[2], pw, sw))
+        x = np.pad(x, ((0, 0), pads[0], pads[1], (0, 0)), constant_values=-np.inf)
+    oh = (x.shape[1] - ph) // sh + 1
+    ow = (x.shape[2] - pw) // sw + 1
+    out = x[:, 0:(oh - 1) * sh + 1:sh, 0:(ow - 1) * sw + 1:sw].copy()
+    for i in range(ph):
+        for j in range(pw):
+            if i or j:
+                np.maximum(out, x[:, i:i + (oh - 1) * sh + 1:sh, j:j + (ow - 1) * sw + 1:sw], out=out)
+    return out
+
+class NumpyModel:
+    """
+    Runs an exported Sequential CNN (model_store.export_model) with NumPy
+    alone, so neither TensorFlow nor Keras is imported. Supports the layers
+    the notebooks use: Conv2D, BatchNormalization, MaxPooling2D, Flatten,
+    Dense, Dropout and Activation. Weights stay memory-mapped, and
+    BatchNormalization is reduced to one precomputed scale and shift.
+    Exposes predict_on_batch like a Keras model.
+    """
+
+    def __init__(self, export_dir):
+        architecture = load_architecture(export_dir)
+        if architecture.get('class_name') != 'Sequential':
+            raise ValueError(f"Only Sequential models are supported, not {architecture.get('class_name')}")
+        weights = iter(load_weights(export_dir, mmap=True))
+        layers = architecture['config']['layers'] if isinstance(architecture['config'], dict) \
+            else architecture['config']
+        self.input_shape = None
+        self.layers = []
+        for layer in layers:
+            kind, config = layer['class_name'], layer['config']
+            shape = config.get('batch_shape') or config.get('batch_input_shape')
+            if shape and self.input_shape is None:
+                self.input_shape = tuple(shape[1:])
+            if kind == 'InputLayer':
+                continue
+            if kind == 'Conv2D':
+                if config.get('data_format', 'channels_last') != 'channels_last' \
+                        or _pair(config.get('dilation_rate', 1)) != (1, 1) or config.get('groups', 1) != 1:
+                    raise ValueError(f"Unsupported Conv2D configuration in {config['name']}")
+                kernel = next(weights)
+                bias = next(weights) if config.get('use_bias', True) else None
+                self.layers.append(('conv2d', kernel, bias, _pair(config['strides']), config['padding'],
+                                    config.get('activation')))
+            elif kind == 'BatchNormalization':
+                if config.get('axis', -1) not in (-1, 3, [3], [-1]):
+                    raise ValueError(f"Unsupported BatchNormalization axis in {config['name']}")
+                gamma = next(weights) if config.get('scale', True) else 1.0
+                beta = next(weights) if config.get('center', True) else 0.0
+                mean, variance = next(weights), next(weights)
+                scale = (gamma / np.sqrt(variance + config.get('epsilon', 1e-3))).astype(np.float32)
+                self.layers.append(('affine', scale, (beta - mean * scale).astype(np.float32)))
+            elif kind in ('MaxPooling2D', 'MaxPool2D'):
+                pool_size = _pair(config.get('pool_size', 2))
+                strides = _pair(config.get('strides') or pool_size)
+                self.layers.append(('max_pool2d', pool_size, strides, config.get('padding', 'valid')))
+            elif kind == 'Flatten':
+                self.layers.append(('flatten',))
+            elif kind == 'Dense':
+                kernel = next(weights)
+                bias = next(weights) if config.get('use_bias', True) else None
+                self.layers.append(('dense', kernel, bias, config.get('activation')))
+            elif kind == 'Activation':
+                self.layers.append(('activation', config['activation']))
+            elif kind == 'Dropout':
+                continue  # identity at inference
+            else:
+                raise ValueError(f"Unsupported layer type {kind} ({config.get('name')})")
+        if next(weights, None) is not None:
+            raise ValueError(f"{export_dir} has more weights than its architecture uses")
+
+    def predict_on_batch(self, batch):
+        x = np.asarray(batch, dtype=np.float32)
+        for op, *params in self.layers:
+            if op == 'conv2d':
+                kernel, bias, strides, padding, activation = params
+                x = _activate(conv2d(x, kernel, bias, strides, padding), activation)
+            elif op == 'affine':
+                scale, shift = params
+                x = x * scale
+                x += shift
+            elif op == 'max_pool2d':
+                x = max_pool2d(x, *params)
+            elif op == 'flatten':
+                x = x.reshape(len(x), -1)
+            elif op == 'dense':
+                kernel, bias, activation = params
+                x = x @ kernel
+                if bias is not None:
+                    x += bias
+                x = _activate(x, activation)
+            elif op == 'activation':
+                x = _activate(x, params[0])
+        return x
+
+    def predict(self, batch, batch_size=32, verbose=0):
+        return np.concatenate([self.predict_on_batch(batch[start:start + batch_size])
+                               for start in range(0, len(batch), batch_size)])
+
+def verify(model, export_dir, batch_size=8, seed=0, tolerance=1e-4):
+    """
+    Compare NumpyModel on export_dir with the Keras model it was exported
+    from on a random batch. Returns the max absolute output difference,
+    label agreement and the per-batch time of each.
+    """
+    runtime = NumpyModel(export_dir)
+    batch = np.random.default_rng(seed).random((batch_size,) + runtime.input_shape, dtype=np.float32)
+    expected = np.asarray(model.predict_on_batch(batch))
+    start = time.perf_counter()
+    expected = np.asarray(model.predict_on_batch(batch))
+    keras_ms = (time.perf_counter() - start) * 1000
+    runtime.predict_on_batch(batch)  # page in the memory-mapped weights
+    start = time.perf_counter()
+    actual = runtime.predict_on_batch(batch)
+    numpy_ms = (time.perf_counter() - start) * 1000
+    flat_expected, flat_actual = expected.reshape(len(batch), -1), actual.reshape(len(batch), -1)
+    if flat_expected.shape[1] == 1:
+        agreement = ((flat_expected >= 0.5) == (flat_actual >= 0.5)).mean()
+    else:
+        agreement = (flat_expected.argmax(axis=1) == flat_actual.argmax(axis=1)).mean()
+    max_diff = float(np.abs(expected - actual).max())
+    return {
+        'max_abs_diff': max_diff,
+        'agreement': float(agreement),
+        'keras_ms': round(keras_ms, 2),
+        'numpy_ms': round(numpy_ms, 2),
+        'ok': max_diff <= tolerance,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run exported CNNs with NumPy alone, or check them against Keras.")
+    parser.add_argument('--verify', nargs='*', metavar='MODEL',
+                        help="check the NumPy runtime against Keras on stand-ins of these models "
+                             "(default: every model with a builder), or on exported directories")
+    parser.add_argument('--width', type=float, default=0.25, help="stand-in width")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--predict', metavar='EXPORT_DIR', help="time loading and one batch without TensorFlow")
+    args = parser.parse_args()
+
+    if args.predict:
+        start = time.perf_counter()
+        runtime = NumpyModel(args.predict)
+        load_s = time.perf_counter() - start
+        batch = np.random.default_rng(0).random((args.batch_size,) + runtime.input_shape, dtype=np.float32)
+        start = time.perf_counter()
+        output = runtime.predict_on_batch(batch)
+        print(f"Loaded in {load_s:.3f}s, batch of {args.batch_size} in {time.perf_counter() - start:.3f}s, "
+              f"output {output.shape}; tensorflow imported: {'tensorflow' in sys.modules}")
+    elif args.verify is not None:
+        from architectures import BUILDERS, build_standin_model
+        from model_store import export_model, is_exported_model, load_exported_model
+
+        failed = False
+        for name in args.verify or sorted(BUILDERS):
+            with tempfile.TemporaryDirectory() as directory:
+                if is_exported_model(name):
+                    model, export_dir = load_exported_model(name), name
+                else:
+                    model, export_dir = build_standin_model(name, width=args.width), directory
+                    export_model(model, export_dir)
+                result = verify(model, export_dir, args.batch_size)
+            failed |= not result['ok']
+            print(f"{name}: {'OK' if result['ok'] else 'MISMATCH'} {result}")
+        sys.exit(1 if failed else 0)
+    else:
+        parser.print_help()
@@ -0,0 +1,212 @@
+import argparse
+import dataclasses
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from preprocess import SPECS, PreprocessSpec, get_spec, preprocess_into
+
+PACK_VERSION = 1
+IMAGES_NAME = 'images.bin'
+LABELS_NAME = 'labels.bin'
+INDEX_NAME = 'dataset_index.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+LABEL_MODES = ('int', 'categorical', 'binary')
+
+def is_packed_dataset(path):
+    """True if path is a directory written by pack_directory."""
+    return all(os.path.isfile(os.path.join(path, name)) for name in (IMAGES_NAME, LABELS_NAME, INDEX_NAME))
+
+def list_class_files(source):
+    """
+    Class names and (relative path, label) pairs of a class-per-folder tree,
+    both in the alphanumeric order image_dataset_from_directory uses.
+    """
+    classes = sorted(d for d in os.listdir(source) if os.path.isdir(os.path.join(source, d)))
+    files = []
+    for label, name in enumerate(classes):
+        for root, _, filenames in sorted(os.walk(os.path.join(source, name))):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    files.append((os.path.relpath(os.path.join(root, filename), source), label))
+    return classes, files
+
+def pack_directory(source, output, spec, workers=8, chunk_size=256):
+    """
+    Decode and resize every image of a class-per-folder tree once, using the
+    model's preprocessing spec, and store them as one fixed-shape uint8
+    array (images.bin, N x size x size x channels, C order) with an int32
+    label array (labels.bin) and dataset_index.json describing both.
+    Scaling is left to the loader, so stored pixels stay uint8. Images that
+    fail to decode are skipped and listed in the index. Returns the index.
+    """
+    spec = get_spec(spec)
+    # Store pixels as the resize produced them, in the spec's channel order
+    stored_spec = dataclasses.replace(spec, scale=1.0, dtype='uint8')
+    classes, files = list_class_files(source)
+    os.makedirs(output, exist_ok=True)
+
+    def load(item):
+        out = np.empty(stored_spec.shape, dtype=np.uint8)
+        try:
+            return preprocess_into(os.path.join(source, item[0]), out, stored_spec)
+        except ValueError:
+            return None
+
+    kept, skipped, labels = [], [], []
+    start = time.perf_counter()
+    with open(os.path.join(output, IMAGES_NAME), 'wb') as f_images, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        # Chunked so only chunk_size decoded images are in memory at a time
+        for offset in range(0, len(files), chunk_size):
+            chunk = files[offset:offset + chunk_size]
+            for (path, label), image in zip(chunk, executor.map(load, chunk)):
+                if image is None:
+                    skipped.append(path)
+                    continue
+                f_images.write(image.tobytes())
+                kept.append(path)
+                labels.append(label)
+    np.asarray(labels, dtype='<i4').tofile(os.path.join(output, LABELS_NAME))
+
+    index = {
+        'version': PACK_VERSION,
+        'count': len(kept),
+        'shape': list(stored_spec.shape),
+        'dtype': 'uint8',
+        'classes': classes,
+        'spec': spec.to_dict(),
+        'files': kept,
+        'skipped': skipped,
+    }
+    with open(os.path.join(output, INDEX_NAME), 'w') as f:
+        json.dump(index, f, indent=2)
+    size = len(kept) * int(np.prod(stored_spec.shape))
+    print(f"Packed {len(kept)} images in {len(classes)} classes ({size:,} bytes) to {output} "
+          f"in {time.perf_counter() - start:.1f}s; skipped {len(skipped)}")
+    return index
+
+class PackedDataset:
+    """
+    A packed dataset opened with np.memmap: nothing is read until a batch
+    touches it, and every epoch after the first is served from the page
+    cache with no decoding or resizing. Batches are scaled and cast to the
+    stored spec, so they equal what Preprocessor produces for the model.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, INDEX_NAME)) as f:
+            index = json.load(f)
+        if index.get('version') != PACK_VERSION:
+            raise ValueError(f"Unsupported packed dataset version: {index.get('version')}")
+        self.path = path
+        self.index = index
+        self.classes = index['classes']
+        self.spec = PreprocessSpec.from_dict(index['spec'])
+        count, shape = index['count'], tuple(index['shape'])
+        if count:
+            self.images = np.memmap(os.path.join(path, IMAGES_NAME), dtype=np.uint8, mode='r', shape=(count,) + shape)
+        else:
+            self.images = np.empty((0,) + shape, dtype=np.uint8)
+        self.labels = np.fromfile(os.path.join(path, LABELS_NAME), dtype='<i4')
+        if len(self.labels) != count:
+            raise ValueError(f"{path}: {len(self.labels)} labels for {count} images")
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _targets(self, labels, label_mode):
+        if label_mode == 'int':
+            return labels.astype(np.int32)
+        if label_mode == 'categorical':
+            return np.eye(len(self.classes), dtype=np.float32)[labels]
+        if label_mode == 'binary':
+            return labels.astype(np.float32).reshape(-1, 1)
+        raise ValueError(f"label_mode must be one of {LABEL_MODES}")
+
+    def batches(self, batch_size=32, shuffle=True, seed=None, label_mode='int', scale=True, drop_remainder=False,
+                augment=None):
+        """
+        Yield (images, labels) NumPy batches for one epoch. Shuffled batches
+        read their rows in sorted order, which keeps memmap reads sequential.
+        augment (e.g. an augment.Augmenter) is applied to each uint8 batch
+        before scaling. With scale=False images stay uint8.
+        """
+        order = np.random.default_rng(seed).permutation(len(self)) if shuffle else np.arange(len(self))
+        stop = len(order) - len(order) % batch_size if drop_remainder else len(order)
+        for start in range(0, stop, batch_size):
+            rows = np.sort(order[start:start + batch_size])
+            images = self.images[rows]
+            if augment is not None:
+                images = augment(images, out=images)
+            if scale:
+                images = np.multiply(images, self.spec.scale, dtype=self.spec.dtype, casting='unsafe')
+            yield images, self._targets(self.labels[rows], label_mode)
+
+    def as_numpy(self, label_mode='int', scale=True):
+        """The whole dataset as arrays in stored order; fine for 48x48 sets that fit in memory."""
+        return next(self.batches(len(self), shuffle=False, label_mode=label_mode, scale=scale))
+
+    def to_tf_dataset(self, batch_size=32, shuffle=True, seed=None, label_mode='int', scale=True, augment=None):
+        """
+        A prefetching tf.data.Dataset over batches(), reshuffled every
+        epoch, as a drop-in for image_dataset_from_directory followed by the
+        notebooks' /255 map. Pass augment for the training set only.
+        TensorFlow is imported lazily.
+        """
+        import tensorflow as tf
+
+        dtype = tf.as_dtype(self.spec.dtype) if scale else tf.uint8
+        label_shape = {'int': (None,), 'categorical': (None, len(self.classes)), 'binary': (None, 1)}[label_mode]
+        label_dtype = tf.int32 if label_mode == 'int' else tf.float32
+        epoch = iter(range(2 ** 31))
+
+        def generator():
+            epoch_seed = None if seed is None else seed + next(epoch)
+            yield from self.batches(batch_size, shuffle, epoch_seed, label_mode, scale, augment=augment)
+
+        dataset = tf.data.Dataset.from_generator(generator, output_signature=(
+            tf.TensorSpec((None,) + self.spec.shape, dtype),
+            tf.TensorSpec(label_shape, label_dtype),
+        ))
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a class-per-folder image tree into a memory-mappable array file.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pack_parser = subparsers.add_parser('pack', help="decode and resize every image once")
+    pack_parser.add_argument('source', help="e.g. players/train, with one folder per class")
+    pack_parser.add_argument('output')
+    pack_parser.add_argument('--spec', choices=sorted(SPECS), help="a served model's preprocessing")
+    pack_parser.add_argument('--size', type=int, help="instead of --spec: square size")
+    pack_parser.add_argument('--channels', type=int, default=3, choices=[1, 3])
+    pack_parser.add_argument('--workers', type=int, default=8)
+
+    info_parser = subparsers.add_parser('info', help="describe a packed dataset and time one epoch")
+    info_parser.add_argument('path')
+    info_parser.add_argument('--batch-size', type=int, default=32)
+
+    args = parser.parse_args()
+    if args.command == 'pack':
+        if args.spec:
+            spec = SPECS[args.spec]
+        elif args.size:
+            spec = PreprocessSpec(size=args.size, channels=args.channels, scale=1 / 255.0)
+        else:
+            parser.error("pass --spec or --size")
+        pack_directory(args.source, args.output, spec, workers=args.workers)
+    else:
+        dataset = PackedDataset(args.path)
+        counts = np.bincount(dataset.labels, minlength=len(dataset.classes))
+        print(f"{len(dataset)} images of shape {dataset.images.shape[1:]}, spec {dataset.spec}")
+        for name, count in zip(dataset.classes, counts):
+            print(f"  {name}: {count}")
+        start = time.perf_counter()
+        for _ in dataset.batches(args.batch_size, seed=0):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"One shuffled epoch: {elapsed:.2f}s ({len(dataset) / max(elapsed, 1e-9):,.0f} images/s)")
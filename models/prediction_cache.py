@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_ENV = 'PREDICTION_CACHE'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predictions_used_at ON predictions (used_at);
+"""
+
+def artifact_version(path, *extra):
+    """
+    A short version string for a model artifact: its path, size and mtime
+    (the index files for directory artifacts), plus anything else that
+    changes the output, such as the preprocessing spec or detector settings.
+    Retraining or re-exporting the model therefore invalidates old entries.
+    """
+    parts = [str(path)]
+    if path and os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            stat = os.stat(os.path.join(path, name))
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    elif path and os.path.exists(path):
+        stat = os.stat(path)
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    parts.extend(json.dumps(item, sort_keys=True, default=str) for item in extra)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+class PredictionCache:
+    """
+    Predictions keyed by the SHA-256 of the input bytes and the model
+    version. Entries live in a bounded in-process LRU (capacity entries,
+    each valid for ttl seconds) shared by every caller in the process, and
+    optionally in a SQLite file (path) that survives restarts and holds up
+    to disk_capacity entries, evicting the least recently used. Values are
+    anything picklable. Safe to share between threads.
+    """
+
+    def __init__(self, capacity=1024, ttl=24 * 3600, path=None, disk_capacity=100_000):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.disk_capacity = disk_capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.evictions = self.expired = 0
+        self.db = None
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.executescript(SCHEMA)
+
+    @staticmethod
+    def key(data, version):
+        """Cache key of encoded input bytes for one model version."""
+        return hashlib.sha256(version.encode() + b'\0' + bytes(data)).hexdigest()
+
+    def _remember(self, key, value, created_at):
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """The cached value for key, or None. Counts a hit or a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expired += 1
+            if self.db is not None:
+                row = self.db.execute("SELECT value, created_at FROM predictions WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    self.db.execute("UPDATE predictions SET used_at = ? WHERE key = ?", (now, key))
+                    self.db.commit()
+                    value = pickle.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now, now))
+                count = self.db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+                if count > self.disk_capacity:
+                    self.db.execute("DELETE FROM predictions WHERE key IN "
+                                    "(SELECT key FROM predictions ORDER BY used_at LIMIT ?)",
+                                    (count - self.disk_capacity,))
+                self.db.commit()
+
+    def get_many(self, items, version, compute):
+        """
+        Cached results for a list of encoded inputs. Misses are passed to
+        compute(list of inputs) together, so they still share one batch;
+        it must return one result per input. Results that are None (e.g.
+        unreadable images) are returned but not cached.
+        """
+        keys = [self.key(item, version) for item in items]
+        results = [self.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, result in zip(missing, compute([items[i] for i in missing])):
+                results[i] = result
+                if result is not None:
+                    self.put(keys[i], result)
+        return results
+
+    def get_or_compute(self, item, version, compute):
+        """Cached result for one encoded input, calling compute(item) on a miss."""
+        return self.get_many([item], version, lambda items: [compute(items[0])])[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM predictions")
+                self.db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'capacity': self.capacity,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'ttl_s': self.ttl,
+            }
+            if self.db is not None:
+                stats['disk_size'] = self.db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            return stats
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+def default_cache(capacity=1024, ttl=24 * 3600):
+    """A cache persisted to the SQLite file named by PREDICTION_CACHE, or memory-only if it is unset."""
+    return PredictionCache(capacity=capacity, ttl=ttl, path=os.environ.get(CACHE_ENV) or None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear an on-disk prediction cache.")
+    parser.add_argument('path', nargs='?', default=os.environ.get(CACHE_ENV), help=f"SQLite file (default: ${CACHE_ENV})")
+    parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+    if not args.path:
+        parser.error(f"pass a cache file or set {CACHE_ENV}")
+
+    cache = PredictionCache(path=args.path)
+    if args.clear:
+        cache.clear()
+    count, oldest, newest = cache.db.execute(
+        "SELECT COUNT(*), MIN(created_at), MAX(used_at) FROM predictions").fetchone()
+    print(f"{args.path}: {count} cached predictions, {os.path.getsize(args.path):,} bytes")
+    if count:
+        print(f"oldest entry {time.ctime(oldest)}, last used {time.ctime(newest)}")
+    cache.close()
@@ -0,0 +1,333 @@
+import argparse
+import dataclasses
+import glob
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+CONTRACT_NAME = 'preprocess.json'
+
+# Names match tf.image.resize methods; OpenCV's versions agree to within 1/255
+INTERPOLATIONS = {
+    'nearest': cv2.INTER_NEAREST,
+    'bilinear': cv2.INTER_LINEAR,
+    'bicubic': cv2.INTER_CUBIC,
+    'area': cv2.INTER_AREA,
+}
+
+@dataclass(frozen=True)
+class PreprocessSpec:
+    """How one model expects its input images."""
+    size: int
+    channels: int                  # 1 = grayscale, 3 = color
+    color_order: str = 'RGB'       # channel order for color models: 'BGR' or 'RGB'
+    scale: float = 1.0             # multiplier applied after resizing, e.g. 1/255
+    dtype: str = 'float32'
+    interpolation: str = 'bilinear'
+
+    @property
+    def shape(self):
+        return (self.size, self.size, self.channels)
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        fields = {f.name for f in dataclasses.fields(cls)}
+        unknown = set(data) - fields
+        if unknown:
+            raise ValueError(f"Unknown preprocessing contract fields: {', '.join(sorted(unknown))}")
+        spec = cls(**data)
+        if spec.interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation '{spec.interpolation}'")
+        return spec
+
+# What each model saw during training: image_dataset_from_directory yields
+# RGB (or single-channel) images resized bilinearly, then the notebooks divide by 255
+SPECS = {
+    'catdog': PreprocessSpec(size=256, channels=3, color_order='RGB', scale=1 / 255.0),
+    'emotion': PreprocessSpec(size=48, channels=1, scale=1 / 255.0),
+    'cricketer': PreprocessSpec(size=224, channels=3, color_order='RGB', scale=1 / 255.0),
+}
+
+def get_spec(spec):
+    """Accept a PreprocessSpec or the name of one in SPECS."""
+    return SPECS[spec] if isinstance(spec, str) else spec
+
+def contract_path(artifact_path):
+    """
+    Where the preprocessing contract for a model artifact lives:
+    preprocess.json inside directory artifacts, <name>.preprocess.json
+    next to single-file ones (model.pkl -> model.preprocess.json).
+    """
+    if os.path.isdir(artifact_path):
+        return os.path.join(artifact_path, CONTRACT_NAME)
+    directory, name = os.path.split(artifact_path)
+    return os.path.join(directory, name.split('.')[0] + '.' + CONTRACT_NAME)
+
+def save_contract(spec, artifact_path):
+    """Store a spec next to its model artifact."""
+    path = contract_path(artifact_path)
+    with open(path, 'w') as f:
+        json.dump(get_spec(spec).to_dict(), f, indent=2)
+    return path
+
+def load_contract(artifact_path, default=None):
+    """Read the spec stored next to a model artifact, or return default."""
+    path = contract_path(artifact_path) if artifact_path else None
+    if path is None or not os.path.exists(path):
+        return get_spec(default) if default is not None else None
+    with open(path, 'r') as f:
+        return PreprocessSpec.from_dict(json.load(f))
+
+def decode(image, spec):
+    """
+    Decode a path or encoded bytes straight into the spec's color space.
+    Grayscale models decode with IMREAD_GRAYSCALE, so no color image is
+    ever materialized. Arrays are passed through untouched.
+    """
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (str, os.PathLike)):
+        image = np.fromfile(os.fspath(image), dtype=np.uint8)
+    flag = cv2.IMREAD_GRAYSCALE if spec.channels == 1 else cv2.IMREAD_COLOR
+    decoded = cv2.imdecode(np.frombuffer(image, np.uint8), flag)
+    if decoded is None:
+        raise ValueError("Could not decode image")
+    return decoded
+
+def _match_channels(image, spec, source_order):
+    """Coerce a decoded or user-supplied array to the spec's channel count."""
+    if spec.channels == 1:
+        if image.ndim == 3:
+            code = {
+                ('BGR', 3): cv2.COLOR_BGR2GRAY, ('RGB', 3): cv2.COLOR_RGB2GRAY,
+                ('BGR', 4): cv2.COLOR_BGRA2GRAY, ('RGB', 4): cv2.COLOR_RGBA2GRAY,
+            }.get((source_order, image.shape[2]))
+            image = image[:, :, 0] if code is None else cv2.cvtColor(image, code)
+        return image, None
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), 'BGR'
+    if image.shape[2] == 4:
+        # Drops alpha and keeps the channel order either way
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR), source_order
+    return image, source_order
+
+def preprocess_into(image, out, spec, scratch=None, source_order='BGR'):
+    """
+    Preprocess one image into out, an existing (size, size, channels) array.
+    Resizing writes into out (or a reused uint8 scratch buffer when a cast,
+    scale or channel swap is still needed), and the channel swap, cast and
+    scale then happen in one fused pass into out. Channel order is fixed
+    on the small resized image rather than with a full-size cvtColor.
+    source_order is the channel order of array inputs; decoded bytes are BGR.
+    """
+    spec = get_spec(spec)
+    if not isinstance(image, np.ndarray):
+        source_order = 'BGR'
+    image, order = _match_channels(decode(image, spec), spec, source_order)
+    swap = spec.channels == 3 and order != spec.color_order
+    dsize = (spec.size, spec.size)
+    interpolation = INTERPOLATIONS[spec.interpolation]
+
+    if out.dtype == np.uint8 and spec.scale == 1.0 and not swap:
+        target = out if spec.channels == 3 else out.reshape(dsize)
+        cv2.resize(image, dsize, dst=target, interpolation=interpolation)
+        return out
+
+    if scratch is None:
+        scratch = np.empty(spec.shape if spec.channels == 3 else dsize, dtype=np.uint8)
+    cv2.resize(image, dsize, dst=scratch, interpolation=interpolation)
+    source = scratch[:, :, ::-1] if swap else scratch
+    target = out if spec.channels == 3 else out.reshape(dsize)
+    if spec.scale == 1.0:
+        np.copyto(target, source, casting='unsafe')
+    else:
+        np.multiply(source, spec.scale, out=target, casting='unsafe')
+    return out
+
+class Preprocessor:
+    """
+    Preprocess batches for one model while reusing buffers across calls.
+    The output batch grows as needed and is handed out as a view, so
+    consumers that finish with a batch before the next call allocate nothing
+    per image. Each worker thread keeps its own resize scratch buffer.
+    Batches decode on executor if given (e.g. a shared decode_pool), else
+    on a thread pool that lives as long as the instance.
+    An instance is not safe to share between concurrent callers, since
+    they would overwrite each other's batch.
+    """
+
+    def __init__(self, spec, capacity=1, workers=None, executor=None):
+        self.spec = get_spec(spec)
+        self.workers = workers
+        self._batch = np.empty((capacity,) + self.spec.shape, dtype=self.spec.dtype)
+        self._local = threading.local()
+        self._executor = executor
+        self._owns_executor = executor is None
+
+    def _scratch(self):
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None:
+            shape = self.spec.shape if self.spec.channels == 3 else (self.spec.size, self.spec.size)
+            scratch = self._local.scratch = np.empty(shape, dtype=np.uint8)
+        return scratch
+
+    def _reserve(self, n):
+        if len(self._batch) < n:
+            self._batch = np.empty((n,) + self.spec.shape, dtype=self.spec.dtype)
+        return self._batch[:n]
+
+    def __call__(self, image, source_order='BGR'):
+        """Preprocess a single image into a (1, size, size, channels) view."""
+        batch = self._reserve(1)
+        preprocess_into(image, batch[0], self.spec, self._scratch(), source_order)
+        return batch
+
+    def batch(self, images, source_order='BGR', skip_errors=False):
+        """
+        Preprocess many images. Returns a view of the reused output buffer
+        and the indices of the images it holds. With skip_errors, images
+        that fail to decode are left out instead of raising.
+        """
+        images = list(images)
+        batch = self._reserve(len(images))
+
+        def fill(i):
+            try:
+                preprocess_into(images[i], batch[i], self.spec, self._scratch(), source_order)
+                return True
+            except ValueError:
+                if not skip_errors:
+                    raise
+                return False
+
+        if self.workers == 1 or len(images) <= 1:
+            ok = [fill(i) for i in range(len(images))]
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            ok = list(self._executor.map(fill, range(len(images))))
+
+        decoded = [i for i, good in enumerate(ok) if good]
+        if len(decoded) == len(images):
+            return batch, decoded
+        # Compact the good images to the front of the buffer
+        for slot, i in enumerate(decoded):
+            if slot != i:
+                batch[slot] = batch[i]
+        return batch[:len(decoded)], decoded
+
+    def close(self):
+        """Shut down the instance's own decode thread pool; a shared executor is left running."""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+_pools = {}
+_pools_lock = threading.Lock()
+_shared = threading.local()
+
+def decode_pool(workers=None):
+    """
+    The process-wide decode thread pool with workers threads, started on
+    first use and shared by every caller, so short-lived threads (such as
+    Streamlit's per-rerun script threads) never start pools of their own.
+    """
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decode')
+        return _pools[workers]
+
+def shared_preprocessor(spec, workers=None):
+    """
+    A Preprocessor for spec kept for the calling thread, so repeated calls
+    from the inference helpers reuse its buffer. Each thread gets its own
+    buffer, since one instance cannot serve concurrent callers, and it is
+    freed with the thread; all of them decode on the shared decode_pool.
+    """
+    spec = get_spec(spec)
+    preprocessors = getattr(_shared, 'preprocessors', None)
+    if preprocessors is None:
+        preprocessors = _shared.preprocessors = {}
+    key = (spec, workers)
+    if key not in preprocessors:
+        preprocessors[key] = Preprocessor(spec, capacity=0, workers=workers,
+                                          executor=None if workers == 1 else decode_pool(workers))
+    return preprocessors[key]
+
+def training_pipeline(path, spec):
+    """
+    Preprocess a file the way the training notebooks do: tf.io decoding and
+    tf.image.resize as in image_dataset_from_directory, then the notebooks'
+    division by 255. Only used to check the contract, so TensorFlow is
+    imported lazily.
+    """
+    import tensorflow as tf
+
+    image = tf.image.decode_image(tf.io.read_file(path), channels=spec.channels, expand_animations=False)
+    image = tf.image.resize(image, (spec.size, spec.size), method=spec.interpolation)
+    image = image.numpy()
+    if spec.channels == 3 and spec.color_order == 'BGR':
+        image = image[:, :, ::-1]
+    return (image * spec.scale).astype(spec.dtype)
+
+def check_contract(spec, fixture_paths, model=None, tolerance=2 / 255.0, output_tolerance=1e-2):
+    """
+    Compare the app's preprocessing against the training pipeline on
+    fixture images, and optionally the model outputs for both.
+    Returns a list of per-image results; raises AssertionError on mismatch.
+    """
+    spec = get_spec(spec)
+    preprocessor = Preprocessor(spec)
+    results = []
+    for path in fixture_paths:
+        app_input = preprocessor(path).copy()
+        train_input = training_pipeline(path, spec)[None]
+        result = {'image': path, 'max_input_diff': float(np.abs(app_input.astype(np.float32) - train_input).max())}
+        if model is not None:
+            outputs = model.predict_on_batch(np.concatenate([app_input, train_input]))
+            result['max_output_diff'] = float(np.abs(np.asarray(outputs[0]) - np.asarray(outputs[1])).max())
+        results.append(result)
+
+    failures = [r for r in results if r['max_input_diff'] > tolerance
+                or r.get('max_output_diff', 0.0) > output_tolerance]
+    if failures:
+        raise AssertionError(f"Preprocessing differs from training pipeline: {failures}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocessing contracts stored next to model artifacts.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    write = subparsers.add_parser('write-contract', help="store a model's training spec next to its artifact")
+    write.add_argument('artifact', help="e.g. catdog_model, model_archive or emotion.pkl")
+    write.add_argument('spec', choices=sorted(SPECS))
+
+    check = subparsers.add_parser('check', help="compare app preprocessing with the training pipeline")
+    check.add_argument('spec', choices=sorted(SPECS))
+    check.add_argument('fixtures', nargs='*', help="image files (default: the repo screenshots)")
+    check.add_argument('--artifact', help="use the contract stored with this artifact")
+    check.add_argument('--model', help="also compare model outputs (a pickled model or exported directory)")
+
+    args = parser.parse_args()
+    if args.command == 'write-contract':
+        print(f"Wrote {save_contract(args.spec, args.artifact)}")
+    else:
+        spec = load_contract(args.artifact, args.spec)
+        here = os.path.dirname(os.path.abspath(__file__))
+        fixtures = args.fixtures or sorted(glob.glob(os.path.join(here, '..', '*', 'screenshots', '*.png')))
+        model = None
+        if args.model:
+            from model_store import is_exported_model, load_exported_model, load_pickled_model
+            model = load_exported_model(args.model) if is_exported_model(args.model) else load_pickled_model(args.model)
+        for r in check_contract(spec, fixtures, model=model):
+            extra = f", output diff {r['max_output_diff']:.2e}" if 'max_output_diff' in r else ""
+            print(f"{os.path.basename(r['image'])}: input diff {r['max_input_diff']:.2e}{extra}")
+        print("Preprocessing matches the training pipeline")
@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from emotion_inference import EMOTIONS
+from preprocess import preprocess_into
+from warmup import MODELS, ModelWarmup, served_batch_sizes
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+class DynamicBatcher:
+    """
+    Collect concurrent requests for one model into micro-batches.
+    A batch is sent to the model as soon as it holds max_batch_size inputs,
+    or max_wait_ms after its first input arrived, whichever comes first.
+    Model calls run one at a time on a dedicated thread, so the event loop
+    keeps accepting requests while a batch is in flight.
+    """
+
+    def __init__(self, model, input_shape, dtype, max_batch_size=32, max_wait_ms=5):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._buffer = np.empty((max_batch_size,) + tuple(input_shape), dtype=dtype)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def predict(self, model_input):
+        """Queue one preprocessed input and wait for its model output."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((model_input, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _predict_batch(self, inputs):
+        n = len(inputs)
+        for i, model_input in enumerate(inputs):
+            self._buffer[i] = model_input
+        return np.asarray(self.model.predict_on_batch(self._buffer[:n]))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            inputs, futures = zip(*batch)
+            try:
+                outputs = await loop.run_in_executor(self._executor, self._predict_batch, inputs)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for future, output in zip(futures, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
+
+def _catdog_response(output):
+    probability = float(output.reshape(-1)[0])
+    return {
+        'label': 'dog' if round(probability) == 1 else 'cat',
+        'probability': probability,
+        'confidence': abs(probability - 0.5) * 200,
+    }
+
+def _emotion_response(output):
+    index = int(output.argmax())
+    return {
+        'emotion': EMOTIONS[index],
+        'confidence': float(output[index]) * 100,
+        'probabilities': {emotion: float(p) for emotion, p in zip(EMOTIONS, output)},
+    }
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        if not message.get('more_body', False):
+            return bytes(body)
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+class InferenceServer:
+    """
+    ASGI app serving both models.
+    POST /predict/catdog and /predict/emotion take the raw image bytes as
+    the request body. GET /healthz reports readiness and warm-up progress,
+    GET /stats batching.
+    Models load and warm up in the background at startup, with a blank
+    batch at every size the batcher can send, so the server accepts
+    connections at once and answers 503 until the first request can be
+    served at full speed. Set warmup=False to only load them.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait_ms=5, decode_workers=4, warmup=True):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._decode_executor = ThreadPoolExecutor(max_workers=decode_workers)
+        self.warmup = ModelWarmup(MODELS, served_batch_sizes(max_batch_size) if warmup else ())
+        self._warmup_task = None
+        self.routes = {}
+        self.ready = False
+
+    async def _serve_when_warm(self):
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        # Woken from the warm-up thread, so cancelling this task at shutdown
+        # leaves no executor thread blocked on a slow or hung load
+        self.warmup.add_done_callback(lambda _: loop.call_soon_threadsafe(done.set))
+        self.warmup.start()
+        await done.wait()
+        if not self.warmup.ready.is_set():
+            return
+        routes = {}
+        for name, respond in [('catdog', _catdog_response), ('emotion', _emotion_response)]:
+            model, spec = self.warmup.models[name]
+            batcher = DynamicBatcher(model, spec.shape, spec.dtype, self.max_batch_size, self.max_wait_ms)
+            batcher.start()
+            routes[f'/predict/{name}'] = (spec, batcher, respond)
+        self.routes = routes
+        self.ready = True
+
+    async def startup(self):
+        self._warmup_task = asyncio.get_running_loop().create_task(self._serve_when_warm())
+
+    async def shutdown(self):
+        self.ready = False
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+        for _, batcher, _ in self.routes.values():
+            await batcher.stop()
+        self._decode_executor.shutdown(wait=True)
+
+    def _preprocess(self, spec, data):
+        # A fresh output per request: it is held until the batch runs
+        out = np.empty(spec.shape, dtype=spec.dtype)
+        return preprocess_into(data, out, spec)
+
+    async def _predict(self, path, receive, send):
+        spec, batcher, respond = self.routes[path]
+        try:
+            data = await _read_body(receive)
+        except ValueError as e:
+            return await _send_json(send, 413, {'error': str(e)})
+        if not data:
+            return await _send_json(send, 400, {'error': "Send the image bytes as the request body"})
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            model_input = await loop.run_in_executor(self._decode_executor, self._preprocess, spec, data)
+        except ValueError as e:
+            return await _send_json(send, 400, {'error': str(e)})
+        output = await batcher.predict(model_input)
+        result = respond(output)
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        await _send_json(send, 200, result)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        path, method = scope['path'], scope['method']
+        if path == '/healthz' and method == 'GET':
+            return await _send_json(send, 200 if self.ready else 503, {**self.warmup.status(), 'ready': self.ready})
+        if path == '/stats' and method == 'GET':
+            stats = {p.rsplit('/', 1)[-1]: batcher.stats() for p, (_, batcher, _) in self.routes.items()}
+            stats['warmup'] = self.warmup.status()
+            return await _send_json(send, 200, stats)
+        if path in ('/predict/catdog', '/predict/emotion'):
+            if method != 'POST':
+                return await _send_json(send, 405, {'error': "Use POST"})
+            if not self.ready:
+                return await _send_json(send, 503, {'error': "Models are still loading"})
+            return await self._predict(path, receive, send)
+        await _send_json(send, 404, {'error': f"Not found: {path}"})
+
+def create_app(max_batch_size=32, max_wait_ms=5, decode_workers=4, warmup=True):
+    return InferenceServer(max_batch_size, max_wait_ms, decode_workers, warmup)
+
+# For `uvicorn server:app`
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="HTTP inference server for the cat/dog and emotion models.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--decode-workers', type=int, default=4)
+    parser.add_argument('--no-warmup', action='store_true', help="load the models without running blank batches")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.max_batch_size, args.max_wait_ms, args.decode_workers, not args.no_warmup),
+                host=args.host, port=args.port)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules under models/ import each other as siblings, as the apps run from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+import pytest
+
+from embedding_index import LABELS_NAME, VECTORS_NAME, EmbeddingIndex
+
+def test_add_after_torn_write_keeps_rows_aligned(tmp_path):
+    path = str(tmp_path / "gallery")
+    rng = np.random.default_rng(0)
+    index = EmbeddingIndex(path, dim=8)
+    index.add('a', rng.normal(size=(3, 8)))
+
+    # A crash after the appends but before the index save: a stray vector in
+    # vectors.bin and a stray label in labels.bin
+    with open(os.path.join(path, VECTORS_NAME), 'ab') as f:
+        f.write(np.ones((2, 8), dtype='<f4').tobytes())
+    with open(os.path.join(path, LABELS_NAME), 'ab') as f:
+        f.write(np.zeros(1, dtype='<i4').tobytes())
+
+    index = EmbeddingIndex(path)
+    added = rng.normal(size=(2, 8))
+    index.add('b', added)
+    assert len(index) == 5
+    assert list(index.labels) == [0, 0, 0, 1, 1]
+    _, rows = index.search(added, k=1)
+    assert list(rows[:, 0]) == [3, 4]
+    assert os.path.getsize(os.path.join(path, VECTORS_NAME)) == 5 * 8 * 4
+    assert os.path.getsize(os.path.join(path, LABELS_NAME)) == 5 * 4
+
+def test_train_ivf_on_empty_gallery_raises(tmp_path):
+    index = EmbeddingIndex(str(tmp_path / "gallery"), dim=8)
+    with pytest.raises(ValueError, match="empty"):
+        index.train_ivf()
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+import pytest
+
+from emotion_inference import EMOTIONS
+from emotion_video import VideoEmotionPipeline
+from preprocess import SPECS
+
+class CountingModel:
+    """Returns the same probabilities for every input and counts the inputs it saw."""
+
+    def __init__(self):
+        self.inputs = 0
+
+    def predict_on_batch(self, batch):
+        self.inputs += len(batch)
+        return np.tile(np.eye(len(EMOTIONS), dtype=np.float32)[3], (len(batch), 1))
+
+@pytest.fixture
+def clip(tmp_path):
+    """A 12-frame, 10 FPS clip of a square sliding across a gray background."""
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("no MJPG video writer in this OpenCV build")
+    for i in range(12):
+        frame = np.full((48, 64, 3), 128, dtype=np.uint8)
+        cv2.rectangle(frame, (2 + 3 * i, 10), (22 + 3 * i, 30), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def test_keyframes_are_predicted_and_tracked_faces_reuse_them(clip):
+    model = CountingModel()
+    pipeline = VideoEmotionPipeline(clip, model, SPECS['emotion'], target_fps=100, keyframe_interval=3,
+                                    realtime=False)
+    results = list(pipeline.run())
+
+    assert [result['index'] for result in results] == list(range(12))
+    assert all(len(result['faces']) == 1 for result in results)
+    assert [result['faces'][0]['fresh'] for result in results] == [i % 3 == 0 for i in range(12)]
+    assert all(result['faces'][0]['probabilities'].argmax() == 3 for result in results)
+    assert model.inputs == pipeline.counts['faces_predicted'] == 4
+    assert pipeline.counts['faces_reused'] == 8
+    assert set(pipeline.report()['stages']) == {'decode_ms', 'detect_ms', 'infer_ms', 'latency_ms'}
+
+def test_frames_are_skipped_to_hold_the_target_fps(clip):
+    pipeline = VideoEmotionPipeline(clip, CountingModel(), SPECS['emotion'], target_fps=5, realtime=False)
+    results = list(pipeline.run())
+
+    assert [result['index'] for result in results] == list(range(0, 12, 2))
+    assert pipeline.counts['frames_read'] == 12
+    assert pipeline.counts['frames_skipped'] == 6
+
+def test_missing_source_raises(tmp_path):
+    pipeline = VideoEmotionPipeline(str(tmp_path / "missing.avi"), CountingModel(), SPECS['emotion'])
+    with pytest.raises(ValueError):
+        list(pipeline.run())
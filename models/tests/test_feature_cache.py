@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+import pytest
+
+from feature_cache import FeatureCache
+from preprocess import PreprocessSpec
+
+SPEC = PreprocessSpec(32, 3, 'RGB', 1 / 255.0)
+
+class Interrupted(Exception):
+    pass
+
+class InterruptingBackbone:
+    """Delegates to a Keras model, but fails on the batch numbered interrupt_at, like a killed run."""
+
+    def __init__(self, model, interrupt_at=None):
+        self.model = model
+        self.interrupt_at = interrupt_at
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def predict_on_batch(self, batch):
+        self.calls += 1
+        if self.calls == self.interrupt_at:
+            raise Interrupted()
+        return self.model.predict_on_batch(batch)
+
+@pytest.fixture
+def backbone():
+    keras = pytest.importorskip('keras')
+    keras.utils.set_random_seed(0)
+    return keras.Sequential([keras.Input(SPEC.shape), keras.layers.Conv2D(4, 3, strides=4)])
+
+def _images(folder, count):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = str(folder / f"{i:02d}.png")
+        cv2.imwrite(path, rng.integers(0, 256, (40, 40, 3), dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+def test_interrupted_extraction_keeps_rows_aligned(tmp_path, backbone):
+    paths = _images(tmp_path, 10)
+    root = str(tmp_path / "features")
+
+    # Killed during the third batch, after two batches reached features.bin
+    interrupted = FeatureCache(InterruptingBackbone(backbone, interrupt_at=3), SPEC, root=root,
+                               dtype='float32', batch_size=2, workers=1)
+    with pytest.raises(Interrupted):
+        interrupted.extract(paths)
+
+    # Simulate orphan rows from a crash between a write and its index save
+    with open(f"{interrupted.path}/features.bin", 'ab') as f:
+        f.write(b'\xff' * 4 * int(np.prod(interrupted.shape)))
+
+    cache = FeatureCache(backbone, SPEC, root=root, dtype='float32', batch_size=2, workers=1)
+    assert len(cache) == 4
+    rows = cache.extract(paths)
+    assert sorted(rows) == list(range(len(paths)))
+
+    reference = FeatureCache(backbone, SPEC, root=str(tmp_path / "reference"), dtype='float32', batch_size=2,
+                             workers=1)
+    reference_rows = reference.extract(paths)
+    expected = reference.features[reference_rows]
+    np.testing.assert_allclose(cache.features[rows], expected, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from numpy_runtime import NumpyModel
+
+@pytest.mark.parametrize('name', ['catdog', 'emotion'])
+def test_numpy_runtime_matches_keras(name, tmp_path):
+    pytest.importorskip('tensorflow')
+    from architectures import build_standin_model
+    from model_store import export_model
+
+    model = build_standin_model(name, width=0.25)
+    export_model(model, str(tmp_path))
+    runtime = NumpyModel(str(tmp_path))
+    batch = np.random.default_rng(0).random((4,) + runtime.input_shape, dtype=np.float32)
+
+    expected = np.asarray(model.predict_on_batch(batch))
+    actual = runtime.predict_on_batch(batch)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, atol=1e-4)
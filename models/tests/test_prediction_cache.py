@@ -0,0 +1,74 @@
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prediction_cache.time, 'time', clock)
+    return clock
+
+def test_lru_evicts_the_least_recently_used():
+    cache = PredictionCache(capacity=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    stats = cache.stats()
+    assert (stats['size'], stats['evictions'], stats['hits'], stats['misses']) == (2, 1, 3, 1)
+
+def test_entries_expire_after_ttl(clock, tmp_path):
+    cache = PredictionCache(ttl=10, path=str(tmp_path / "cache.db"))
+    cache.put('a', 1)
+    clock.now += 10
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is None
+    assert cache.stats()['expired'] == 1
+
+def test_sqlite_survives_restart_and_evicts_least_recently_used(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = PredictionCache(path=path, disk_capacity=2)
+    cache.put('a', [0.1, 0.9])
+    clock.now += 1
+    cache.put('b', [0.2, 0.8])
+    clock.now += 1
+    cache.close()
+
+    restarted = PredictionCache(path=path, disk_capacity=2)
+    assert restarted.get('a') == [0.1, 0.9]
+    clock.now += 1
+    restarted.put('c', [0.3, 0.7])
+    assert restarted.stats()['disk_size'] == 2
+    restarted.close()
+
+    cold = PredictionCache(path=path, disk_capacity=2)
+    assert cold.get('b') is None
+    assert (cold.get('a'), cold.get('c')) == ([0.1, 0.9], [0.3, 0.7])
+    assert cold.stats()['disk_hits'] == 2
+    cold.close()
+
+def test_get_many_computes_misses_in_one_batch():
+    cache = PredictionCache()
+    batches = []
+
+    def compute(items):
+        batches.append(list(items))
+        return [None if item == b'broken' else len(item) for item in items]
+
+    assert cache.get_many([b'a', b'bb'], 'v1', compute) == [1, 2]
+    assert cache.get_many([b'a', b'ccc', b'broken', b'dddd'], 'v1', compute) == [1, 3, None, 4]
+    assert cache.get_many([b'broken', b'bb'], 'v1', compute) == [None, 2]
+    assert cache.get_many([b'a'], 'v2', compute) == [1]
+    assert batches == [[b'a', b'bb'], [b'ccc', b'broken', b'dddd'], [b'broken'], [b'a']]
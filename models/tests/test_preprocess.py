@@ -0,0 +1,19 @@
+import glob
+import os
+
+import pytest
+
+from preprocess import check_contract
+
+REPO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCREENSHOTS = sorted(glob.glob(os.path.join(REPO, '*', 'screenshots', '*.png')))
+
+@pytest.mark.parametrize('name', ['catdog', 'emotion'])
+def test_app_preprocessing_matches_training_pipeline(name):
+    pytest.importorskip('tensorflow')
+    from architectures import build_standin_model
+
+    assert SCREENSHOTS, "the repo screenshots are the contract fixtures"
+    model = build_standin_model(name, width=0.25)
+    results = check_contract(name, SCREENSHOTS, model=model)
+    assert len(results) == len(SCREENSHOTS)
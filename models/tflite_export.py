@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from architectures import BUILDERS
+from packed_dataset import list_class_files
+from preprocess import SPECS, Preprocessor, get_spec, load_contract, save_contract
+
+MODES = ('float32', 'float16', 'dynamic', 'int8')
+
+def _interpreter_class():
+    """The lightest TFLite interpreter installed: tflite-runtime, LiteRT, then TensorFlow's."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+def calibration_images(source, spec, count=200, seed=0):
+    """
+    A seeded sample of count images from a class-per-folder tree (or a
+    flat folder), preprocessed with spec, for int8 calibration and for
+    accuracy checks. Returns the batch and the labels (None if flat).
+    """
+    spec = get_spec(spec)
+    classes, files = list_class_files(source)
+    if files:
+        paths = [os.path.join(source, path) for path, _ in files]
+        labels = np.array([label for _, label in files])
+    else:
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source))
+        labels = None
+    picked = np.sort(np.random.default_rng(seed).permutation(len(paths))[:count])
+    batch, decoded = Preprocessor(spec, capacity=0).batch([paths[i] for i in picked], skip_errors=True)
+    return batch.copy(), None if labels is None else labels[picked][decoded]
+
+def convert(model, mode='dynamic', calibration=None):
+    """
+    Convert a Keras model to a TFLite flatbuffer.
+    float16 stores weights as fp16, dynamic quantizes weights to int8 and
+    activations on the fly, and int8 also quantizes activations using
+    ranges measured on calibration, a preprocessed batch. Inputs and
+    outputs stay float32 in every mode, so callers feed the same batches.
+    """
+    import tensorflow as tf
+
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if mode != 'float32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        if calibration is None or not len(calibration):
+            raise ValueError("int8 quantization needs calibration images")
+        converter.representative_dataset = lambda: ([calibration[i:i + 1]] for i in range(len(calibration)))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+def export_tflite(model, path, spec, mode='dynamic', calibration=None):
+    """Write model as a .tflite file with its preprocessing contract next to it. Returns the file size."""
+    flatbuffer = convert(model, mode, calibration)
+    with open(path, 'wb') as f:
+        f.write(flatbuffer)
+    save_contract(spec, path)
+    print(f"Exported {mode} TFLite model ({len(flatbuffer):,} bytes) to {path}")
+    return len(flatbuffer)
+
+class TFLiteModel:
+    """
+    A .tflite model behind the predict_on_batch interface the apps and the
+    server already call. Batches are zero-padded up to the next power of
+    two and each of those sizes gets its own interpreter, allocated once,
+    so variable batch sizes (tail batches, the server's micro-batches)
+    never resize tensors. Calls are serialized since an interpreter cannot
+    be shared by concurrent callers.
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.num_threads = num_threads
+        self._lock = threading.Lock()
+        self._interpreters = {}
+        interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        interpreter.allocate_tensors()
+        details = interpreter.get_input_details()[0]
+        self.input_shape = tuple(int(d) for d in details['shape'][1:])
+        self._dtype = details['dtype']
+        if int(details['shape'][0]) == 1:
+            self._interpreters[1] = self._prepare(interpreter, 1)
+
+    def _prepare(self, interpreter, size):
+        """(interpreter, input index, output index, padded input buffer) for batches of size."""
+        details = interpreter.get_input_details()[0]
+        if tuple(details['shape']) != (size,) + self.input_shape:
+            interpreter.resize_tensor_input(details['index'], (size,) + self.input_shape)
+            interpreter.allocate_tensors()
+        buffer = np.zeros((size,) + self.input_shape, dtype=self._dtype)
+        return interpreter, details['index'], interpreter.get_output_details()[0]['index'], buffer
+
+    def _interpreter(self, size):
+        if size not in self._interpreters:
+            interpreter = _interpreter_class()(model_path=self.path, num_threads=self.num_threads)
+            self._interpreters[size] = self._prepare(interpreter, size)
+        return self._interpreters[size]
+
+    def predict_on_batch(self, batch):
+        n = len(batch)
+        size = 1 << (n - 1).bit_length()
+        with self._lock:
+            interpreter, input_index, output_index, buffer = self._interpreter(size)
+            buffer[:n] = batch
+            interpreter.set_tensor(input_index, buffer)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index)[:n].copy()
+
+    def predict(self, batch, batch_size=32, verbose=0):
+        return np.concatenate([self.predict_on_batch(batch[start:start + batch_size])
+                               for start in range(0, len(batch), batch_size)])
+
+def _labels_of(outputs):
+    """Predicted class per row: argmax, or a 0.5 threshold for a single sigmoid output."""
+    outputs = np.asarray(outputs).reshape(len(outputs), -1)
+    return (outputs[:, 0] >= 0.5).astype(int) if outputs.shape[1] == 1 else outputs.argmax(axis=1)
+
+def _median_ms(fn, repeats):
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+def compare(model, artifacts, images, labels=None, batch_sizes=(1, 32), repeats=20, reference_size=None):
+    """
+    Size, load time, per-batch latency and output deltas of each TFLite
+    artifact ({mode: path}) against the original Keras model on images.
+    With labels, accuracy is reported for every variant.
+    """
+    reference = np.asarray(model.predict(images, batch_size=32, verbose=0))
+    predicted = _labels_of(reference)
+    rows = {'keras': {
+        'bytes': reference_size or sum(w.nbytes for w in model.get_weights()),
+        'latency_ms': {b: _median_ms(lambda: model.predict_on_batch(images[:b]), repeats) for b in batch_sizes},
+        'accuracy': None if labels is None else round(float((predicted == labels).mean()), 4),
+    }}
+    for mode, path in artifacts.items():
+        start = time.perf_counter()
+        runtime = TFLiteModel(path)
+        load_s = time.perf_counter() - start
+        outputs = runtime.predict(images)
+        runtime_labels = _labels_of(outputs)
+        rows[mode] = {
+            'bytes': os.path.getsize(path),
+            'load_s': round(load_s, 3),
+            'latency_ms': {b: _median_ms(lambda: runtime.predict_on_batch(images[:b]), repeats) for b in batch_sizes},
+            'max_abs_diff': round(float(np.abs(outputs - reference).max()), 6),
+            'mean_abs_diff': round(float(np.abs(outputs - reference).mean()), 6),
+            'agreement': round(float((runtime_labels == predicted).mean()), 4),
+            'accuracy': None if labels is None else round(float((runtime_labels == labels).mean()), 4),
+        }
+    return {'images': len(images), 'results': rows}
+
+def _load_source(args):
+    """The Keras model to export, its spec and its on-disk size."""
+    if args.standin:
+        from architectures import build_standin_model
+
+        return build_standin_model(args.standin, width=args.width), SPECS[args.standin], None
+    from model_store import is_exported_model, load_exported_model, load_pickled_model
+
+    if is_exported_model(args.source):
+        model = load_exported_model(args.source)
+        size = sum(os.path.getsize(os.path.join(args.source, name)) for name in os.listdir(args.source))
+    else:
+        model = load_pickled_model(args.source)
+        size = sum(os.path.getsize(path) for path in args.source.split(','))
+    spec = get_spec(args.spec) if args.spec else load_contract(args.source.split(',')[0])
+    if spec is None:
+        raise SystemExit("No preprocessing contract stored with the model; pass --spec")
+    return model, spec, size
+
+def _synthetic_tree(root, spec, count):
+    """Two classes of photo-like JPEGs, for stand-in runs without a dataset."""
+    from bench_augment import make_tree
+
+    make_tree(root, 2, max(1, count // 2), spec.size * 2, spec.size * 2)
+    return root
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export quantized TFLite models and compare them to the Keras original.")
+    parser.add_argument('source', nargs='?', help="model.pkl, an archive, 'part1,part2' or an exported model directory")
+    parser.add_argument('--standin', choices=sorted(BUILDERS),
+                        help="use a generated stand-in instead of source")
+    parser.add_argument('--width', type=float, default=0.25, help="stand-in width")
+    parser.add_argument('--spec', choices=sorted(SPECS), help="preprocessing, if no contract is stored with source")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=['dynamic', 'int8'])
+    parser.add_argument('--calibration', help="class-per-folder images for int8 ranges, e.g. a training folder")
+    parser.add_argument('--eval', help="class-per-folder images for the accuracy comparison (default: --calibration)")
+    parser.add_argument('--samples', type=int, default=200, help="images sampled for calibration and evaluation")
+    parser.add_argument('--output', required=True, help="output prefix, e.g. catdog -> catdog.dynamic.tflite")
+    parser.add_argument('--report', help="also write the comparison as JSON here")
+    args = parser.parse_args()
+    if not args.source and not args.standin:
+        parser.error("pass a model source or --standin")
+
+    model, spec, size = _load_source(args)
+    with tempfile.TemporaryDirectory() as scratch:
+        calibration_dir = args.calibration or _synthetic_tree(os.path.join(scratch, 'images'), spec, args.samples)
+        calibration, _ = calibration_images(calibration_dir, spec, args.samples)
+        images, labels = calibration_images(args.eval or calibration_dir, spec, args.samples, seed=1)
+
+    artifacts = {}
+    for mode in args.modes:
+        path = f"{args.output}.{mode}.tflite"
+        export_tflite(model, path, spec, mode, calibration)
+        artifacts[mode] = path
+    report = compare(model, artifacts, images, labels if args.eval or args.calibration else None, reference_size=size)
+
+    print(f"{'variant':<9} {'bytes':>13} {'load s':>7} {'ms b1':>10} {'ms b32':>8} {'max diff':>9} "
+          f"{'agree':>6} {'acc':>6}")
+    for name, row in report['results'].items():
+        latency = row['latency_ms']
+        print(f"{name:<9} {str(row['bytes'] or '-'):>13} {str(row.get('load_s', '-')):>7} {latency[1]:>10} "
+              f"{latency[32]:>8} {str(row.get('max_abs_diff', '-')):>9} {str(row.get('agreement', '-')):>6} "
+              f"{str(row['accuracy'] if row['accuracy'] is not None else '-'):>6}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,154 @@
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+
+from catdog_inference import load_catdog_model, load_catdog_spec
+from emotion_inference import load_emotion_model, load_emotion_spec
+
+MODELS = {
+    'catdog': (load_catdog_model, load_catdog_spec),
+    'emotion': (load_emotion_model, load_emotion_spec),
+}
+
+def served_batch_sizes(max_batch_size):
+    """The powers of two below max_batch_size and max_batch_size itself: 32 -> (1, 2, 4, 8, 16, 32)."""
+    sizes = [1]
+    while sizes[-1] * 2 < max_batch_size:
+        sizes.append(sizes[-1] * 2)
+    if max_batch_size > 1:
+        sizes.append(max_batch_size)
+    return tuple(sizes)
+
+def warm_up(model, spec, batch_sizes=(1,)):
+    """
+    Run a blank batch of each size through model, so graph tracing,
+    kernel selection and tensor allocation happen now rather than on the
+    first request. Returns the milliseconds each size took.
+    """
+    if not batch_sizes:
+        return {}
+    batch = np.zeros((max(batch_sizes),) + spec.shape, dtype=spec.dtype)
+    timings = {}
+    for size in batch_sizes:
+        start = time.perf_counter()
+        model.predict_on_batch(batch[:size])
+        timings[size] = round((time.perf_counter() - start) * 1000, 2)
+    return timings
+
+class ModelWarmup:
+    """
+    Loads models and warms them up on a background thread, so a process
+    can start serving (or at least answering health checks) at once.
+    loaders maps a name to (load_model, load_spec). ready is set once
+    every model has loaded and warmed up, and status() reports progress,
+    load and warm-up timings and any error per model.
+    """
+
+    def __init__(self, loaders=None, batch_sizes=(1,)):
+        self.loaders = loaders or MODELS
+        self.batch_sizes = tuple(batch_sizes)
+        self.models = {}
+        self.ready = threading.Event()
+        self.failed = False
+        self._status = {name: {'state': 'pending'} for name in self.loaders}
+        self._thread = None
+        self._started_at = None
+        self._finished_at = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Begin loading in the background. Returns self, so it can be chained."""
+        if self._thread is None:
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name='model-warmup', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        for name, (load_model, load_spec) in self.loaders.items():
+            status = self._status[name]
+            try:
+                status['state'] = 'loading'
+                start = time.perf_counter()
+                spec = load_spec()
+                model = load_model()
+                status['load_s'] = round(time.perf_counter() - start, 3)
+                status['state'] = 'warming'
+                status['warmup_ms'] = warm_up(model, spec, self.batch_sizes)
+                self.models[name] = (model, spec)
+                status['state'] = 'ready'
+            except Exception as e:
+                status['state'] = 'failed'
+                status['error'] = f"{type(e).__name__}: {e}"
+                self.failed = True
+        if not self.failed:
+            self.ready.set()
+        with self._lock:
+            self._finished_at = time.perf_counter()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """
+        Call callback(self) from the warm-up thread once loading finishes,
+        or right away if it already has. Lets an event loop wait without
+        holding a thread.
+        """
+        with self._lock:
+            if self._finished_at is None:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout=None):
+        """Block until loading finishes. Returns True if every model is ready."""
+        self.start()
+        self._thread.join(timeout)
+        return self.ready.is_set()
+
+    def get(self, name, timeout=None):
+        """The (model, spec) pair of name, waiting for it to be ready."""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # Checked first, so a finished thread's results are all visible below
+            finished = not self._thread.is_alive()
+            if name in self.models:
+                return self.models[name]
+            if self._status[name]['state'] == 'failed':
+                raise RuntimeError(f"Loading {name} failed: {self._status[name]['error']}")
+            if finished:
+                raise RuntimeError(f"Warm-up finished without loading {name}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"{name} is not loaded yet")
+            self._thread.join(0.05)
+
+    def status(self):
+        end = self._finished_at or time.perf_counter()
+        return {
+            'ready': self.ready.is_set(),
+            'elapsed_s': round(end - self._started_at, 3) if self._started_at else 0.0,
+            'batch_sizes': list(self.batch_sizes),
+            'models': {name: dict(status) for name, status in self._status.items()},
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load and warm up the models, reporting timings; "
+                                                 "exits non-zero if any fails (usable as a deploy check).")
+    parser.add_argument('models', nargs='*', help=f"any of {', '.join(MODELS)} (default: all)")
+    parser.add_argument('--max-batch-size', type=int, default=32, help="warm every power of two up to this")
+    args = parser.parse_args()
+    unknown = set(args.models) - set(MODELS)
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+
+    warmup = ModelWarmup({name: MODELS[name] for name in args.models or MODELS},
+                         served_batch_sizes(args.max_batch_size)).start()
+    ok = warmup.wait()
+    print(json.dumps(warmup.status(), indent=2))
+    raise SystemExit(0 if ok else 1)